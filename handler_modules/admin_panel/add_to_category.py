@@ -8,19 +8,18 @@ from telegram.ext import (
 	filters,
 )
 
-from utils import fixed_keyboards
+from utils import async_storage, fixed_keyboards
 from utils.strings import (
 	CATEGORY_ERROR_REPLY,
 	ADD_TO_CATEGORY_SELECT_PROMPT,
 	ADD_TO_CATEGORY_USER_LIST_PROMPT,
 	ADD_TO_CATEGORY_CONFIRM,
 	ADD_TO_CATEGORY_SUCCESS,
+	ADD_TO_CATEGORY_SUMMARY,
 )
 from handler_modules.basic_handlers import cancel_operation
 from utils.utilities import (
 	admin_required,
-	get_category_label_by_id,
-	add_user_list_to_category,
 	handle_telegram_errors,
 )
 
@@ -48,8 +47,10 @@ async def get_user_list_from_reply(update: Update, context: CallbackContext):
 	context.user_data['user_list_to_add'] = user_ids
 
 	# Prompt user to select category
+	category_id_list = await async_storage.get_category_id_list()
 	await update.message.reply_text(
-		ADD_TO_CATEGORY_SELECT_PROMPT, reply_markup=fixed_keyboards.CATEGORIES
+		ADD_TO_CATEGORY_SELECT_PROMPT,
+		reply_markup=fixed_keyboards.create_categories_keyboard(category_id_list),
 	)
 
 	return 'GET_CATEGORY_ID_TO_ADD'
@@ -90,8 +91,10 @@ async def set_user_list(update: Update, context: CallbackContext):
 	user_ids = update.message.text.split()
 	context.user_data['user_list_to_add'] = user_ids
 
+	category_id_list = await async_storage.get_category_id_list()
 	await update.message.reply_text(
-		ADD_TO_CATEGORY_SELECT_PROMPT, reply_markup=fixed_keyboards.CATEGORIES
+		ADD_TO_CATEGORY_SELECT_PROMPT,
+		reply_markup=fixed_keyboards.create_categories_keyboard(category_id_list),
 	)
 	return 'GET_CATEGORY_ID_TO_ADD'
 
@@ -116,8 +119,9 @@ async def get_category_id(update: Update, context: CallbackContext):
 	await update.callback_query.answer()
 
 	# Show confirmation prompt
+	category_label = await async_storage.get_category_label_by_id(category_id)
 	await update.callback_query.edit_message_text(
-		ADD_TO_CATEGORY_CONFIRM.format(category=get_category_label_by_id(category_id)),
+		ADD_TO_CATEGORY_CONFIRM.format(category=category_label),
 		reply_markup=fixed_keyboards.ADMIN_CONFIRMATION,
 	)
 
@@ -149,13 +153,16 @@ async def confirm(update: Update, context: CallbackContext):
 	user_list = context.user_data['user_list_to_add']
 
 	# Add users to category
-	add_user_list_to_category(category_id, user_list)
+	summary = await async_storage.add_user_list_to_category(category_id, user_list)
 
 	await update.callback_query.answer()
 
 	# Show success message
+	category_label = await async_storage.get_category_label_by_id(category_id)
 	await update.callback_query.edit_message_text(
-		ADD_TO_CATEGORY_SUCCESS.format(category=get_category_label_by_id(category_id)),
+		ADD_TO_CATEGORY_SUCCESS.format(category=category_label)
+		+ '\n\n'
+		+ ADD_TO_CATEGORY_SUMMARY.format(**summary),
 		reply_markup=fixed_keyboards.ADMIN_RETURN_TO_MAIN_MENU,
 	)
 
@@ -163,22 +170,24 @@ async def confirm(update: Update, context: CallbackContext):
 	return ConversationHandler.END
 
 
-add_to_category_handler = ConversationHandler(
-	entry_points=[
-		CommandHandler('addtocategory', get_user_list_from_reply),
-		CallbackQueryHandler(
-			callback=get_user_list_from_user_update, pattern='START_ADD_TO_CATEGORY'
-		),
-	],
-	states={
-		'SET_USER_LIST': [
-			MessageHandler(filters=~filters.COMMAND, callback=set_user_list)
+def create_add_to_category_handler() -> ConversationHandler:
+	"""Create the handler of the /addtocategory conversation."""
+	return ConversationHandler(
+		entry_points=[
+			CommandHandler('addtocategory', get_user_list_from_reply),
+			CallbackQueryHandler(
+				callback=get_user_list_from_user_update, pattern='START_ADD_TO_CATEGORY'
+			),
 		],
-		'GET_CATEGORY_ID_TO_ADD': [CallbackQueryHandler(get_category_id)],
-		'CONFIRM_ADD_CATEGORY': [CallbackQueryHandler(callback=confirm)],
-	},
-	fallbacks=[
-		CommandHandler('cancel', cancel_operation),
-		CallbackQueryHandler(cancel_operation, pattern='CANCEL'),
-	],
-)
+		states={
+			'SET_USER_LIST': [
+				MessageHandler(filters=~filters.COMMAND, callback=set_user_list)
+			],
+			'GET_CATEGORY_ID_TO_ADD': [CallbackQueryHandler(get_category_id)],
+			'CONFIRM_ADD_CATEGORY': [CallbackQueryHandler(callback=confirm)],
+		},
+		fallbacks=[
+			CommandHandler('cancel', cancel_operation),
+			CallbackQueryHandler(cancel_operation, pattern='CANCEL'),
+		],
+	)
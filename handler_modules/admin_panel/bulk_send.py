@@ -1,7 +1,8 @@
 """
 Bulk Send Module
 
-This module handles sending messages to all users in a specified category.
+This module handles sending messages to all users in a specified category, or in a segment
+combining several categories with union, intersection and exclusion.
 Messages can be selected either by:
 1. Replying to another message with a command
 2. Sending/forwarding a message to the bot after selecting the Bulk Send option from the main menu
@@ -17,20 +18,30 @@ from telegram.ext import (
 	filters,
 )
 
-from utils import fixed_keyboards
+from utils import async_storage, bulk_campaigns, bulk_schedules, fixed_keyboards
+from utils.segments import SEGMENT_OPERATORS
 from utils.strings import (
 	BULK_SEND_MESSAGE_SELECTED,
 	BULK_SEND_ERROR_REPLY,
 	BULK_SEND_PROMPT,
 	BULK_SEND_CATEGORY_SELECTED,
-	BULK_SEND_ERROR_USER,
-	BULK_SEND_SUCCESS,
+	BULK_SEND_NOT_RUNNING,
+	BULK_SEND_SEGMENT_EXCEPT,
+	BULK_SEND_SEGMENT_HINT,
+	BULK_SEND_SEGMENT_INTERSECT,
+	BULK_SEND_SEGMENT_SELECTED,
+	BULK_SEND_SEGMENT_UNION,
+	BULK_SEND_AUDIENCE_PROMPT,
+	AUDIENCE_JOINED_WITHIN,
+	AUDIENCE_LANGUAGE,
+	BULK_SEND_SCHEDULE_PROMPT,
+	BULK_SEND_SCHEDULE_INVALID,
+	BULK_SEND_SCHEDULED,
+	BULK_SEND_UNREACHABLE_SKIPPED,
 )
 from handler_modules.basic_handlers import cancel_operation
 from utils.utilities import (
 	admin_required,
-	get_category_label_by_id,
-	get_users_by_category_id,
 	handle_telegram_errors,
 )
 
@@ -54,8 +65,10 @@ async def get_message_from_reply(update: Update, context: CallbackContext):
 
 	# If the command is used in reply to a previous message, that message will be forwarded to the recipients without the sender data.
 	if update.message.reply_to_message:
+		category_id_list = await async_storage.get_category_id_list()
 		await update.message.reply_text(
-			BULK_SEND_MESSAGE_SELECTED, reply_markup=fixed_keyboards.CATEGORIES
+			BULK_SEND_MESSAGE_SELECTED,
+			reply_markup=fixed_keyboards.create_categories_keyboard(category_id_list),
 		)
 
 		context.user_data['message_id'] = update.message.reply_to_message.message_id
@@ -112,19 +125,112 @@ async def set_message_id(update: Update, context: CallbackContext):
 	context.user_data['message_id'] = update.message.message_id
 	context.user_data['from_chat_id'] = update.effective_chat.id
 
+	category_id_list = await async_storage.get_category_id_list()
 	await update.message.reply_text(
-		BULK_SEND_MESSAGE_SELECTED, reply_markup=fixed_keyboards.CATEGORIES
+		BULK_SEND_MESSAGE_SELECTED,
+		reply_markup=fixed_keyboards.create_categories_keyboard(category_id_list),
 	)
 
 	return 'GET_CATEGORY_ID'
 
 
+async def get_segment_recipients(context: CallbackContext) -> list:
+	"""
+	Get the users in the selected segment who match its audience filters.
+
+	Args:
+	    context (CallbackContext): The callback context object
+
+	Returns:
+	    list: The IDs of the users in the segment, each of them once
+	"""
+	return await async_storage.get_segment_recipients(
+		context.user_data['category_id'],
+		context.user_data['segment_steps'],
+		context.user_data['audience'],
+	)
+
+
+async def describe_segment_recipients(context: CallbackContext) -> str:
+	"""
+	Describe the selected segment and its audience filters.
+
+	Args:
+	    context (CallbackContext): The callback context object
+
+	Returns:
+	    str: The description, e.g. 'VIP ∪ PROMO_X (joined in the last 7 days, language tr)'
+	"""
+	description = await async_storage.describe_segment(
+		context.user_data['category_id'], context.user_data['segment_steps']
+	)
+
+	audience = context.user_data['audience']
+	filters = []
+	if 'joined_within_days' in audience:
+		filters.append(
+			AUDIENCE_JOINED_WITHIN.format(days=audience['joined_within_days'])
+		)
+	if 'language' in audience:
+		filters.append(AUDIENCE_LANGUAGE.format(language=audience['language']))
+
+	if filters:
+		description += f' ({", ".join(filters)})'
+	return description
+
+
+async def show_segment_confirmation(update: Update, context: CallbackContext):
+	"""
+	Show the selected segment with its user count and prompt for confirmation.
+
+	Users flagged as unreachable are left out of the count, and the admin can choose to include
+	them. The keyboard also offers to combine the segment with another category, or to filter
+	its users by join date or language.
+
+	Args:
+	    update (Update): The Telegram update object
+	    context (CallbackContext): The callback context object
+
+	Returns:
+	    str: The next conversation state 'CONFIRM_BULK_SEND'
+	"""
+	is_segment = context.user_data['segment_steps'] or context.user_data['audience']
+
+	# Get user count for confirmation message, without the users who can't be reached
+	users_in_segment = await get_segment_recipients(context)
+	reachable_users, unreachable_users = await async_storage.split_unreachable_users(
+		users_in_segment
+	)
+
+	selected = BULK_SEND_SEGMENT_SELECTED if is_segment else BULK_SEND_CATEGORY_SELECTED
+	description = await describe_segment_recipients(context)
+	text = selected.format(category=description, count=len(reachable_users))
+	if unreachable_users:
+		text += '\n\n' + BULK_SEND_UNREACHABLE_SKIPPED.format(
+			count=len(unreachable_users)
+		)
+	text += '\n\n' + BULK_SEND_SEGMENT_HINT
+
+	await update.callback_query.answer()
+
+	# Prompt for confirmation before sending to multiple users
+	await update.callback_query.edit_message_text(
+		text,
+		reply_markup=fixed_keyboards.create_bulk_send_confirmation_keyboard(
+			len(unreachable_users)
+		),
+	)
+
+	return 'CONFIRM_BULK_SEND'
+
+
 @handle_telegram_errors
 async def get_category_id(update: Update, context: CallbackContext):
 	"""
 	Handler for processing the selected category for bulk message sending.
 
-	Gets the category ID from the callback query and prompts for confirmation.
+	Gets the category ID from the callback query and prompts for confirmation. The category is
+	the start of the segment the message is sent to.
 
 	Args:
 	    update (Update): The Telegram update object
@@ -141,22 +247,205 @@ async def get_category_id(update: Update, context: CallbackContext):
 		return await cancel_operation(update, context)
 
 	# Get the category id from the callback query
-	category_id = update.callback_query.data
-	context.user_data['category_id'] = category_id
+	context.user_data['category_id'] = update.callback_query.data
+	context.user_data['segment_steps'] = []
+	context.user_data['audience'] = {}
+
+	return await show_segment_confirmation(update, context)
+
+
+@handle_telegram_errors
+async def select_segment_operator(update: Update, context: CallbackContext):
+	"""
+	Handler for the segment buttons of the confirmation message.
 
-	# Get user count for confirmation message
-	user_count = len(get_users_by_category_id(category_id))
-	category_label = get_category_label_by_id(category_id)
+	Stores the selected set operation and prompts for the category to combine the segment with.
+
+	Args:
+	    update (Update): The Telegram update object
+	    context (CallbackContext): The callback context object
+
+	Returns:
+	    str: The next conversation state 'GET_SEGMENT_CATEGORY_ID'
+	"""
+	operator = update.callback_query.data.removeprefix('SEGMENT_')
+	context.user_data['segment_operator'] = operator
+
+	segment = await describe_segment_recipients(context)
+	prompts = {
+		'UNION': BULK_SEND_SEGMENT_UNION,
+		'INTERSECT': BULK_SEND_SEGMENT_INTERSECT,
+		'EXCEPT': BULK_SEND_SEGMENT_EXCEPT,
+	}
+
+	category_id_list = await async_storage.get_category_id_list()
 
 	await update.callback_query.answer()
+	await update.callback_query.edit_message_text(
+		prompts[operator].format(category=segment),
+		reply_markup=fixed_keyboards.create_categories_keyboard(category_id_list),
+	)
 
-	# Prompt for confirmation before sending to multiple users
+	return 'GET_SEGMENT_CATEGORY_ID'
+
+
+@handle_telegram_errors
+async def get_segment_category_id(update: Update, context: CallbackContext):
+	"""
+	Handler for processing the category the segment is combined with.
+
+	Adds the set operation to the segment and prompts for confirmation again with the new count.
+
+	Args:
+	    update (Update): The Telegram update object
+	    context (CallbackContext): The callback context object
+
+	Returns:
+	    str: The next conversation state 'CONFIRM_BULK_SEND' if successful
+	    int: ConversationHandler.END if the operation is canceled
+	"""
+
+	if update.callback_query.data == 'CANCEL':
+		await update.callback_query.answer()
+		context.user_data.clear()
+		return await cancel_operation(update, context)
+
+	context.user_data['segment_steps'].append(
+		(context.user_data.pop('segment_operator'), update.callback_query.data)
+	)
+
+	return await show_segment_confirmation(update, context)
+
+
+@handle_telegram_errors
+async def select_audience_filter(update: Update, context: CallbackContext):
+	"""
+	Handler for the audience filter button of the confirmation message.
+
+	Prompts for a join date range or one of the languages in the user history.
+
+	Args:
+	    update (Update): The Telegram update object
+	    context (CallbackContext): The callback context object
+
+	Returns:
+	    str: The next conversation state 'GET_AUDIENCE_FILTER'
+	"""
+	language_counts = await async_storage.get_language_counts()
+	description = await describe_segment_recipients(context)
+
+	await update.callback_query.answer()
 	await update.callback_query.edit_message_text(
-		BULK_SEND_CATEGORY_SELECTED.format(category=category_label, count=user_count),
-		reply_markup=fixed_keyboards.ADMIN_CONFIRMATION,
+		BULK_SEND_AUDIENCE_PROMPT.format(category=description),
+		reply_markup=fixed_keyboards.create_audience_filter_keyboard(language_counts),
 	)
 
-	return 'CONFIRM_BULK_SEND'
+	return 'GET_AUDIENCE_FILTER'
+
+
+@handle_telegram_errors
+async def get_audience_filter(update: Update, context: CallbackContext):
+	"""
+	Handler for processing the selected audience filter.
+
+	Adds the filter to the segment, replacing an earlier filter of the same kind, and prompts
+	for confirmation again with the new count.
+
+	Args:
+	    update (Update): The Telegram update object
+	    context (CallbackContext): The callback context object
+
+	Returns:
+	    str: The next conversation state 'CONFIRM_BULK_SEND' if successful
+	    int: ConversationHandler.END if the operation is canceled
+	"""
+
+	if update.callback_query.data == 'CANCEL':
+		await update.callback_query.answer()
+		context.user_data.clear()
+		return await cancel_operation(update, context)
+
+	kind, value = update.callback_query.data.split(':', 1)
+	if kind == 'AUDIENCE_JOINED':
+		context.user_data['audience']['joined_within_days'] = int(value)
+	else:
+		context.user_data['audience']['language'] = value
+
+	return await show_segment_confirmation(update, context)
+
+
+@handle_telegram_errors
+async def select_schedule(update: Update, context: CallbackContext):
+	"""
+	Handler for the schedule button of the confirmation message.
+
+	Prompts for the time to send the message at instead of sending it right away.
+
+	Args:
+	    update (Update): The Telegram update object
+	    context (CallbackContext): The callback context object
+
+	Returns:
+	    str: The next conversation state 'GET_SCHEDULE_TIME'
+	"""
+	await update.callback_query.answer()
+	await update.callback_query.edit_message_text(
+		BULK_SEND_SCHEDULE_PROMPT, reply_markup=fixed_keyboards.ADMIN_CANCEL_OPERATION
+	)
+
+	return 'GET_SCHEDULE_TIME'
+
+
+@handle_telegram_errors
+async def get_schedule_time(update: Update, context: CallbackContext):
+	"""
+	Handler for processing the time to send the message at.
+
+	Stores the scheduled send, which looks up the users of the segment when it runs and skips
+	the users flagged as unreachable at that time.
+
+	Args:
+	    update (Update): The Telegram update object
+	    context (CallbackContext): The callback context object
+
+	Returns:
+	    str: The same conversation state 'GET_SCHEDULE_TIME' if the time is invalid
+	    int: ConversationHandler.END once the send is scheduled
+	"""
+	try:
+		run_at, recurrence = bulk_schedules.parse_schedule(update.message.text)
+	except ValueError:
+		await update.message.reply_text(
+			BULK_SEND_SCHEDULE_INVALID,
+			reply_markup=fixed_keyboards.ADMIN_CANCEL_OPERATION,
+		)
+		return 'GET_SCHEDULE_TIME'
+
+	schedule = await bulk_schedules.schedule_send(
+		context.job_queue,
+		segment={
+			'category_id': context.user_data['category_id'],
+			'steps': context.user_data['segment_steps'],
+			'audience': context.user_data['audience'],
+		},
+		description=await describe_segment_recipients(context),
+		from_chat_id=context.user_data['from_chat_id'],
+		message_id=context.user_data['message_id'],
+		admin_chat_id=update.effective_chat.id,
+		run_at=run_at,
+		recurrence=recurrence,
+	)
+
+	await update.message.reply_text(
+		BULK_SEND_SCHEDULED.format(
+			category=schedule['description'],
+			time=bulk_schedules.format_schedule_time(schedule),
+		),
+		reply_markup=fixed_keyboards.ADMIN_RETURN_TO_MAIN_MENU,
+	)
+
+	context.user_data.clear()
+	return ConversationHandler.END
 
 
 @handle_telegram_errors
@@ -164,7 +453,10 @@ async def confirm(update: Update, context: CallbackContext):
 	"""
 	Handler for processing the confirmation of bulk message sending.
 
-	If confirmed, sends the message to all users in the selected category.
+	If confirmed, starts sending the message to every user in the selected segment once, in the
+	background. Users flagged as unreachable are skipped unless the admin chose to include them.
+	The confirmation message is turned into a progress message with a stop button, and the
+	conversation ends right away.
 
 	Args:
 	    update (Update): The Telegram update object
@@ -175,62 +467,103 @@ async def confirm(update: Update, context: CallbackContext):
 	"""
 
 	# Check if user confirmed the operation
-	if not update.callback_query.data == 'CONFIRM':
+	if update.callback_query.data not in ('CONFIRM', 'CONFIRM_INCLUDE_UNREACHABLE'):
 		await update.callback_query.answer()
 		context.user_data.clear()
 		return await cancel_operation(update, context)
 
 	# Retrieve stored data needed for message forwarding
-	category_id = context.user_data['category_id']
 	message_id = context.user_data['message_id']
 	from_chat_id = context.user_data['from_chat_id']
 
-	# Get all users in the selected category
-	users_in_category = get_users_by_category_id(category_id)
-	category_label = get_category_label_by_id(category_id)
-
-	# Send the message to every user in the category
-	# We continue even if some sends fail to ensure all users are attempted
-	for chat_id in users_in_category:
-		try:
-			await context.bot.copy_message(
-				chat_id=chat_id, from_chat_id=from_chat_id, message_id=message_id
-			)
-		except Exception as e:
-			# Log the error but continue with other users
-			await context.bot.send_message(
-				update.effective_chat.id,
-				BULK_SEND_ERROR_USER.format(user_id=chat_id, error=str(e)),
-			)
+	# Get all users in the selected segment, each of them once
+	users_in_segment = await get_segment_recipients(context)
+	if update.callback_query.data == 'CONFIRM':
+		# Users who blocked the bot would only fail again and use up the rate limit
+		users_in_segment, _ = await async_storage.split_unreachable_users(
+			users_in_segment
+		)
 
 	await update.callback_query.answer()
 
-	# Show success message and return to main menu
-	await update.callback_query.edit_message_text(
-		BULK_SEND_SUCCESS.format(category=category_label),
-		reply_markup=fixed_keyboards.ADMIN_RETURN_TO_MAIN_MENU,
+	# Send the message to every user in the segment in the background, as fast as the rate
+	# limit allows. The campaign keeps the progress message up to date and is checkpointed,
+	# so it resumes after a restart.
+	await bulk_campaigns.start_campaign(
+		context.bot,
+		await describe_segment_recipients(context),
+		users_in_segment,
+		from_chat_id=from_chat_id,
+		message_id=message_id,
+		admin_chat_id=update.effective_chat.id,
+		progress_message_id=update.callback_query.message.message_id,
 	)
 
 	context.user_data.clear()
 	return ConversationHandler.END
 
 
-bulk_send_handler = ConversationHandler(
-	entry_points=[
-		CommandHandler('bulksend', get_message_from_reply),
-		CallbackQueryHandler(
-			callback=get_message_from_user_update, pattern='START_BULK_SEND'
-		),
-	],
-	states={
-		'SET_MESSAGE_ID': [
-			MessageHandler(filters=~filters.COMMAND, callback=set_message_id)
+@admin_required
+@handle_telegram_errors
+async def stop_bulk_send(update: Update, context: CallbackContext):
+	"""
+	Handler for the stop button of a running bulk send's progress message.
+
+	Args:
+	    update (Update): The Telegram update object
+	    context (CallbackContext): The callback context object
+
+	Returns:
+	    None
+	"""
+	campaign_id = update.callback_query.data.removeprefix('STOP_BULK_SEND:')
+
+	if bulk_campaigns.stop_campaign(campaign_id):
+		# The campaign replaces the progress message with its final counts once it stopped
+		await update.callback_query.answer()
+	else:
+		await update.callback_query.answer(BULK_SEND_NOT_RUNNING, show_alert=True)
+
+
+def create_bulk_send_handler() -> ConversationHandler:
+	"""Create the handler of the /bulksend conversation."""
+	return ConversationHandler(
+		entry_points=[
+			CommandHandler('bulksend', get_message_from_reply),
+			CallbackQueryHandler(
+				callback=get_message_from_user_update, pattern='START_BULK_SEND'
+			),
+		],
+		states={
+			'SET_MESSAGE_ID': [
+				MessageHandler(filters=~filters.COMMAND, callback=set_message_id)
+			],
+			'GET_CATEGORY_ID': [CallbackQueryHandler(get_category_id)],
+			'CONFIRM_BULK_SEND': [
+				CallbackQueryHandler(
+					select_segment_operator,
+					pattern=f'^SEGMENT_({"|".join(SEGMENT_OPERATORS)})$',
+				),
+				CallbackQueryHandler(select_audience_filter, pattern='^AUDIENCE_FILTER$'),
+				CallbackQueryHandler(select_schedule, pattern='^SCHEDULE_BULK_SEND$'),
+				CallbackQueryHandler(confirm),
+			],
+			'GET_SEGMENT_CATEGORY_ID': [CallbackQueryHandler(get_segment_category_id)],
+			'GET_AUDIENCE_FILTER': [CallbackQueryHandler(get_audience_filter)],
+			'GET_SCHEDULE_TIME': [
+				MessageHandler(
+					filters=filters.TEXT & ~filters.COMMAND, callback=get_schedule_time
+				)
+			],
+		},
+		fallbacks=[
+			CommandHandler('cancel', cancel_operation),
+			CallbackQueryHandler(cancel_operation, pattern='CANCEL'),
 		],
-		'GET_CATEGORY_ID': [CallbackQueryHandler(get_category_id)],
-		'CONFIRM_BULK_SEND': [CallbackQueryHandler(confirm)],
-	},
-	fallbacks=[
-		CommandHandler('cancel', cancel_operation),
-		CallbackQueryHandler(cancel_operation, pattern='CANCEL'),
-	],
+	)
+
+
+# Added ahead of the conversation handlers, so the stop button works in the middle of a conversation
+stop_bulk_send_handler = CallbackQueryHandler(
+	callback=stop_bulk_send, pattern='^STOP_BULK_SEND:'
 )
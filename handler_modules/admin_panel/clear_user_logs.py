@@ -14,7 +14,7 @@ from telegram.ext import (
 	CommandHandler,
 )
 
-from utils import fixed_keyboards
+from utils import async_storage, fixed_keyboards, log_pipeline
 from utils.strings import (
 	CLEAR_USER_LOGS_CONFIRM,
 	CLEAR_USER_LOGS_SUCCESS,
@@ -44,7 +44,8 @@ async def clear_user_logs_confirm(update: Update, context: CallbackContext):
 		str: The next conversation state 'CONFIRM_CLEAR'
 	"""
 	# Define log file path based on current locale
-	log_file = f'logs/user_panel_errors_{Config.get_locale().value}.log'
+	logger_name = log_pipeline.get_user_panel_errors_logger_name(Config.get_locale().value)
+	log_file = log_pipeline.get_log_file(logger_name)
 
 	# Check if log file exists
 	if not os.path.exists(log_file):
@@ -98,7 +99,8 @@ async def clear_user_logs(update: Update, context: CallbackContext):
 		return await cancel_operation(update, context)
 
 	# Define log file path based on current locale
-	log_file = f'logs/user_panel_errors_{Config.get_locale().value}.log'
+	logger_name = log_pipeline.get_user_panel_errors_logger_name(Config.get_locale().value)
+	log_file = log_pipeline.get_log_file(logger_name)
 
 	# Check if log file exists
 	if not os.path.exists(log_file):
@@ -112,8 +114,8 @@ async def clear_user_logs(update: Update, context: CallbackContext):
 
 		return ConversationHandler.END
 
-	# Clear the log file contents
-	open(log_file, 'w').close()
+	# Clear the log file contents, through its handler while the bot is writing to it
+	await async_storage.run_io(log_pipeline.truncate_log, logger_name)
 
 	# Show success message
 	await update.callback_query.edit_message_text(
@@ -129,19 +131,21 @@ async def clear_user_logs(update: Update, context: CallbackContext):
 	return ConversationHandler.END
 
 
-clear_user_logs_handler = ConversationHandler(
-	entry_points=[
-		CallbackQueryHandler(
-			callback=clear_user_logs_confirm, pattern='CLEAR_USER_LOGS'
-		),
-	],
-	states={
-		'CONFIRM_CLEAR': [
-			CallbackQueryHandler(callback=clear_user_logs, pattern='CONFIRM')
+def create_clear_user_logs_handler() -> ConversationHandler:
+	"""Create the handler of the conversation clearing the user logs."""
+	return ConversationHandler(
+		entry_points=[
+			CallbackQueryHandler(
+				callback=clear_user_logs_confirm, pattern='CLEAR_USER_LOGS'
+			),
 		],
-	},
-	fallbacks=[
-		CommandHandler('cancel', cancel_operation),
-		CallbackQueryHandler(cancel_operation, pattern='CANCEL'),
-	],
-)
+		states={
+			'CONFIRM_CLEAR': [
+				CallbackQueryHandler(callback=clear_user_logs, pattern='CONFIRM')
+			],
+		},
+		fallbacks=[
+			CommandHandler('cancel', cancel_operation),
+			CallbackQueryHandler(cancel_operation, pattern='CANCEL'),
+		],
+	)
@@ -1,10 +1,9 @@
-import json
 import csv
 import os
 from telegram import Update
 from telegram.ext import CallbackContext, CallbackQueryHandler
 
-from utils import fixed_keyboards
+from utils import async_storage, fixed_keyboards
 from utils.strings import (
 	EXPORT_HISTORY_ERROR,
 )
@@ -12,9 +11,61 @@ from utils.utilities import (
 	admin_required,
 	get_categories_for_user,
 	get_chat_id,
+	get_user_history,
 	handle_telegram_errors,
 )
-from utils.config import Config
+
+
+def write_history_csv(csv_path):
+	"""
+	Write the user history, with a 1/0 column for every category, to a CSV file.
+
+	Args:
+	    csv_path (str): The CSV file to write
+	"""
+	# Read user history from the storage backend
+	user_history = get_user_history()
+
+	# Get the categories of every user once, and all possible categories from them
+	user_categories = [
+		get_categories_for_user(entry.get('user_id', '')) for entry in user_history
+	]
+	all_categories = set()
+	for categories in user_categories:
+		all_categories.update(categories)
+
+	# Update fieldnames to include individual category columns
+	base_fields = [
+		'user_id',
+		'first_name',
+		'last_name',
+		'language',
+		'username',
+		'start_time',
+	]
+	fieldnames = base_fields + sorted(list(all_categories))
+
+	with open(csv_path, 'w', newline='', encoding='utf-8') as csvfile:
+		writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+		writer.writeheader()
+
+		# Process each user entry
+		for entry, categories_containing_user in zip(user_history, user_categories):
+			# Create row dict with base user data
+			row = {
+				'user_id': entry.get('user_id', ''),
+				'first_name': entry.get('first_name', ''),
+				'last_name': entry.get('last_name', ''),
+				'language': entry.get('language', ''),
+				'username': entry.get('username', ''),
+				'start_time': entry.get('start_time', ''),
+			}
+
+			# Add category columns with 1/0 values
+			for category in all_categories:
+				row[category] = 1 if category in categories_containing_user else 0
+
+			writer.writerow(row)
 
 
 @admin_required
@@ -23,8 +74,9 @@ async def export_history(update: Update, context: CallbackContext):
 	"""
 	Handler to export user history to CSV and send it to the admin.
 
-	Reads user history from JSON file, converts it to CSV format with user details
+	Reads user history from the storage backend, converts it to CSV format with user details
 	and their associated categories, then sends the CSV file to the admin via Telegram.
+	The CSV file is built on the I/O threads.
 
 	Args:
 	    update (Update): The Telegram update object
@@ -38,69 +90,10 @@ async def export_history(update: Update, context: CallbackContext):
 		chat_id = get_chat_id(update)
 
 		# Define file paths
-		history_file = 'data/user_history.json'
 		csv_path = 'data/user_history.csv'
 
-		# Read user history from JSON
-		with open(history_file, 'r', encoding='utf-8') as f:
-			user_history = json.load(f)
-
-		user_history = user_history[Config.get_locale().value]
-
-		# Define CSV structure and write data
-		fieldnames = [
-			'user_id',
-			'first_name',
-			'last_name',
-			'language',
-			'username',
-			'start_time',
-			'categories',
-		]
-
-		# Get all possible categories from all users
-		all_categories = set()
-		for entry in user_history:
-			categories = get_categories_for_user(entry.get('user_id', ''))
-			all_categories.update(categories)
-
-		# Update fieldnames to include individual category columns
-		base_fields = [
-			'user_id',
-			'first_name',
-			'last_name',
-			'language',
-			'username',
-			'start_time',
-		]
-		fieldnames = base_fields + sorted(list(all_categories))
-
-		with open(csv_path, 'w', newline='', encoding='utf-8') as csvfile:
-			writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-			writer.writeheader()
-
-			# Process each user entry
-			for entry in user_history:
-				# Get categories for current user
-				categories_containing_user = get_categories_for_user(
-					entry.get('user_id', '')
-				)
-
-				# Create row dict with base user data
-				row = {
-					'user_id': entry.get('user_id', ''),
-					'first_name': entry.get('first_name', ''),
-					'last_name': entry.get('last_name', ''),
-					'language': entry.get('language', ''),
-					'username': entry.get('username', ''),
-					'start_time': entry.get('start_time', ''),
-				}
-
-				# Add category columns with 1/0 values
-				for category in all_categories:
-					row[category] = 1 if category in categories_containing_user else 0
-
-				writer.writerow(row)
+		# Build the CSV on the I/O threads, so other chats aren't blocked meanwhile
+		await async_storage.run_io(write_history_csv, csv_path)
 
 		# Send CSV file to admin
 		with open(csv_path, 'rb') as file:
@@ -116,7 +109,7 @@ async def export_history(update: Update, context: CallbackContext):
 		)
 
 		# Cleanup temporary CSV file
-		os.remove(csv_path)
+		await async_storage.run_io(os.remove, csv_path)
 
 		# Acknowledge the callback query
 		await update.callback_query.answer()
@@ -0,0 +1,96 @@
+"""
+Export Unreachable Users Module
+
+This module handles exporting the users flagged as unreachable, e.g. because they blocked the bot.
+Bulk sends skip these users unless the admin chooses to include them.
+"""
+
+import csv
+import io
+from telegram import Update
+from telegram.ext import CallbackContext, CallbackQueryHandler
+
+from utils import async_storage, fixed_keyboards
+from utils.strings import (
+	EXPORT_UNREACHABLE_EMPTY,
+	EXPORT_UNREACHABLE_ERROR,
+	EXPORT_UNREACHABLE_SUCCESS,
+)
+from utils.utilities import (
+	admin_required,
+	get_chat_id,
+	handle_telegram_errors,
+)
+
+
+def build_unreachable_csv(unreachable_users):
+	"""
+	Build a CSV file of the unreachable users.
+
+	Args:
+	    unreachable_users (dict): Mapping of user IDs to their 'reason' and 'flagged_at'
+
+	Returns:
+	    bytes: CSV with the user ID, the reason of the failed send and when the user was flagged
+	"""
+	output = io.StringIO()
+	writer = csv.writer(output)
+	writer.writerow(['user_id', 'reason', 'flagged_at'])
+
+	for user_id, flag in unreachable_users.items():
+		writer.writerow([user_id, flag['reason'], flag['flagged_at']])
+
+	return output.getvalue().encode('utf-8')
+
+
+@admin_required
+@handle_telegram_errors
+async def export_unreachable(update: Update, context: CallbackContext):
+	"""
+	Handler to export the users flagged as unreachable to CSV and send it to the admin.
+
+	Args:
+	    update (Update): The Telegram update object
+	    context (CallbackContext): The callback context object
+
+	Returns:
+	    None
+	"""
+	try:
+		chat_id = get_chat_id(update)
+		unreachable_users = await async_storage.get_unreachable_users()
+
+		if not unreachable_users:
+			await context.bot.send_message(
+				chat_id=chat_id,
+				text=EXPORT_UNREACHABLE_EMPTY,
+				reply_markup=fixed_keyboards.ADMIN_RETURN_TO_MAIN_MENU,
+			)
+			await update.callback_query.answer()
+			return
+
+		await context.bot.send_document(
+			chat_id=chat_id,
+			document=build_unreachable_csv(unreachable_users),
+			filename='unreachable_users.csv',
+		)
+
+		await context.bot.send_message(
+			chat_id=chat_id,
+			text=EXPORT_UNREACHABLE_SUCCESS.format(count=len(unreachable_users)),
+			reply_markup=fixed_keyboards.ADMIN_RETURN_TO_MAIN_MENU,
+		)
+
+		await update.callback_query.answer()
+
+	except Exception as e:
+		await update.callback_query.message.reply_text(
+			EXPORT_UNREACHABLE_ERROR.format(error=str(e)),
+			reply_markup=fixed_keyboards.ADMIN_RETURN_TO_MAIN_MENU,
+		)
+		await update.callback_query.answer()
+
+
+export_unreachable_handler = CallbackQueryHandler(
+	callback=export_unreachable, pattern='EXPORT_UNREACHABLE'
+)
@@ -8,19 +8,18 @@ from telegram.ext import (
 	filters,
 )
 
-from utils import fixed_keyboards
+from utils import async_storage, fixed_keyboards
 from utils.strings import (
 	CATEGORY_ERROR_REPLY,
 	REMOVE_FROM_CATEGORY_SELECT_PROMPT,
 	REMOVE_FROM_CATEGORY_USER_LIST_PROMPT,
 	REMOVE_FROM_CATEGORY_CONFIRM,
 	REMOVE_FROM_CATEGORY_SUCCESS,
+	REMOVE_FROM_CATEGORY_SUMMARY,
 )
 from handler_modules.basic_handlers import cancel_operation
 from utils.utilities import (
 	admin_required,
-	get_category_label_by_id,
-	remove_user_list_from_category,
 	handle_telegram_errors,
 )
 
@@ -48,8 +47,10 @@ async def get_user_list_from_reply(update: Update, context: CallbackContext):
 	context.user_data['user_list_to_remove'] = user_ids
 
 	# Prompt user to select category
+	category_id_list = await async_storage.get_category_id_list()
 	await update.message.reply_text(
-		REMOVE_FROM_CATEGORY_SELECT_PROMPT, reply_markup=fixed_keyboards.CATEGORIES
+		REMOVE_FROM_CATEGORY_SELECT_PROMPT,
+		reply_markup=fixed_keyboards.create_categories_keyboard(category_id_list),
 	)
 
 	return 'GET_CATEGORY_ID_TO_REMOVE'
@@ -91,8 +92,10 @@ async def set_user_list(update: Update, context: CallbackContext):
 	user_ids = update.message.text.split()
 	context.user_data['user_list_to_remove'] = user_ids
 
+	category_id_list = await async_storage.get_category_id_list()
 	await update.message.reply_text(
-		REMOVE_FROM_CATEGORY_SELECT_PROMPT, reply_markup=fixed_keyboards.CATEGORIES
+		REMOVE_FROM_CATEGORY_SELECT_PROMPT,
+		reply_markup=fixed_keyboards.create_categories_keyboard(category_id_list),
 	)
 	return 'GET_CATEGORY_ID_TO_REMOVE'
 
@@ -117,10 +120,9 @@ async def get_category_id(update: Update, context: CallbackContext):
 	await update.callback_query.answer()
 
 	# Show confirmation prompt
+	category_label = await async_storage.get_category_label_by_id(category_id)
 	await update.callback_query.edit_message_text(
-		REMOVE_FROM_CATEGORY_CONFIRM.format(
-			category=get_category_label_by_id(category_id)
-		),
+		REMOVE_FROM_CATEGORY_CONFIRM.format(category=category_label),
 		reply_markup=fixed_keyboards.ADMIN_CONFIRMATION,
 	)
 
@@ -152,15 +154,16 @@ async def confirm(update: Update, context: CallbackContext):
 	user_list = context.user_data['user_list_to_remove']
 
 	# Remove users from category
-	remove_user_list_from_category(category_id, user_list)
+	summary = await async_storage.remove_user_list_from_category(category_id, user_list)
 
 	await update.callback_query.answer()
 
 	# Show success message
+	category_label = await async_storage.get_category_label_by_id(category_id)
 	await update.callback_query.edit_message_text(
-		REMOVE_FROM_CATEGORY_SUCCESS.format(
-			category=get_category_label_by_id(category_id)
-		),
+		REMOVE_FROM_CATEGORY_SUCCESS.format(category=category_label)
+		+ '\n\n'
+		+ REMOVE_FROM_CATEGORY_SUMMARY.format(**summary),
 		reply_markup=fixed_keyboards.ADMIN_RETURN_TO_MAIN_MENU,
 	)
 
@@ -169,23 +172,25 @@ async def confirm(update: Update, context: CallbackContext):
 	return ConversationHandler.END
 
 
-remove_from_category_handler = ConversationHandler(
-	entry_points=[
-		CommandHandler('removefromcategory', get_user_list_from_reply),
-		CallbackQueryHandler(
-			callback=get_user_list_from_user_update,
-			pattern='START_REMOVE_FROM_CATEGORY',
-		),
-	],
-	states={
-		'SET_USER_LIST': [
-			MessageHandler(filters=~filters.COMMAND, callback=set_user_list)
+def create_remove_from_category_handler() -> ConversationHandler:
+	"""Create the handler of the /removefromcategory conversation."""
+	return ConversationHandler(
+		entry_points=[
+			CommandHandler('removefromcategory', get_user_list_from_reply),
+			CallbackQueryHandler(
+				callback=get_user_list_from_user_update,
+				pattern='START_REMOVE_FROM_CATEGORY',
+			),
 		],
-		'GET_CATEGORY_ID_TO_REMOVE': [CallbackQueryHandler(get_category_id)],
-		'CONFIRM_REMOVE_CATEGORY': [CallbackQueryHandler(callback=confirm)],
-	},
-	fallbacks=[
-		CommandHandler('cancel', cancel_operation),
-		CallbackQueryHandler(cancel_operation, pattern='CANCEL'),
-	],
-)
+		states={
+			'SET_USER_LIST': [
+				MessageHandler(filters=~filters.COMMAND, callback=set_user_list)
+			],
+			'GET_CATEGORY_ID_TO_REMOVE': [CallbackQueryHandler(get_category_id)],
+			'CONFIRM_REMOVE_CATEGORY': [CallbackQueryHandler(callback=confirm)],
+		},
+		fallbacks=[
+			CommandHandler('cancel', cancel_operation),
+			CallbackQueryHandler(cancel_operation, pattern='CANCEL'),
+		],
+	)
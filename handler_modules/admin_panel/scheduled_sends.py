@@ -0,0 +1,107 @@
+"""
+Scheduled Sends Module
+
+This module handles listing the scheduled bulk sends and canceling them.
+Bulk sends are scheduled from the confirmation message of the bulk send dialog.
+"""
+
+from telegram import Update
+from telegram.ext import CallbackContext, CallbackQueryHandler
+
+from utils import bulk_schedules, fixed_keyboards
+from utils.strings import (
+	SCHEDULED_SEND_CANCELED,
+	SCHEDULED_SEND_NOT_FOUND,
+	SCHEDULED_SENDS_EMPTY,
+	SCHEDULED_SENDS_ENTRY,
+	SCHEDULED_SENDS_LIST,
+)
+from utils.utilities import (
+	admin_required,
+	handle_telegram_errors,
+)
+
+
+def format_scheduled_sends():
+	"""
+	Format the list of scheduled sends and the keyboard to cancel them.
+
+	Returns:
+	    tuple: The message text and its keyboard
+	"""
+	schedules = bulk_schedules.get_schedules()
+	if not schedules:
+		return SCHEDULED_SENDS_EMPTY, fixed_keyboards.ADMIN_RETURN_TO_MAIN_MENU
+
+	entries = [
+		(
+			schedule['schedule_id'],
+			schedule['description'],
+			bulk_schedules.format_schedule_time(schedule),
+		)
+		for schedule in schedules
+	]
+	text = SCHEDULED_SENDS_LIST.format(
+		schedules='\n'.join(
+			SCHEDULED_SENDS_ENTRY.format(category=description, time=time)
+			for _, description, time in entries
+		)
+	)
+	return text, fixed_keyboards.create_scheduled_sends_keyboard(entries)
+
+
+@admin_required
+@handle_telegram_errors
+async def show_scheduled_sends(update: Update, context: CallbackContext):
+	"""
+	Handler to show the scheduled bulk sends, with a button to cancel each of them.
+
+	Args:
+	    update (Update): The Telegram update object
+	    context (CallbackContext): The callback context object
+
+	Returns:
+	    None
+	"""
+	text, keyboard = format_scheduled_sends()
+
+	await update.callback_query.answer()
+	await update.callback_query.edit_message_text(text, reply_markup=keyboard)
+
+
+@admin_required
+@handle_telegram_errors
+async def cancel_scheduled_send(update: Update, context: CallbackContext):
+	"""
+	Handler for the cancel buttons of the scheduled sends list.
+
+	Args:
+	    update (Update): The Telegram update object
+	    context (CallbackContext): The callback context object
+
+	Returns:
+	    None
+	"""
+	schedule_id = update.callback_query.data.removeprefix('UNSCHEDULE_BULK_SEND:')
+	schedule = await bulk_schedules.cancel_schedule(context.job_queue, schedule_id)
+
+	if schedule is None:
+		await update.callback_query.answer(SCHEDULED_SEND_NOT_FOUND, show_alert=True)
+	else:
+		await update.callback_query.answer(
+			SCHEDULED_SEND_CANCELED.format(category=schedule['description'])
+		)
+
+	# Show the remaining scheduled sends
+	text, keyboard = format_scheduled_sends()
+	await update.callback_query.edit_message_text(text, reply_markup=keyboard)
+
+
+show_scheduled_sends_handler = CallbackQueryHandler(
+	callback=show_scheduled_sends, pattern='^SHOW_SCHEDULED_SENDS$'
+)
+
+# Added ahead of the conversation handlers, so the cancel buttons work in the middle of a conversation
+cancel_scheduled_send_handler = CallbackQueryHandler(
+	callback=cancel_scheduled_send, pattern='^UNSCHEDULE_BULK_SEND:'
+)
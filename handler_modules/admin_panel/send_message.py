@@ -11,7 +11,10 @@ from telegram.ext import (
 from utils import fixed_keyboards
 from utils.strings import SEND_MESSAGE_PROMPT, SEND_MESSAGE_SUCCESS, SEND_MESSAGE_ERROR
 from handler_modules.basic_handlers import cancel_operation
-from utils.utilities import admin_required, handle_telegram_errors
+from utils.utilities import (
+	admin_required,
+	handle_telegram_errors,
+)
 
 
 @admin_required
@@ -126,20 +129,22 @@ async def set_message_id(update: Update, context: CallbackContext):
 	return ConversationHandler.END
 
 
-send_message_handler = ConversationHandler(
-	entry_points=[
-		CommandHandler('send', get_message_from_reply),
-		CallbackQueryHandler(
-			callback=get_message_from_user_update, pattern='START_SEND_MESSAGE'
-		),
-	],
-	states={
-		'SET_MESSAGE_ID': [
-			MessageHandler(filters=~filters.COMMAND, callback=set_message_id)
-		]
-	},
-	fallbacks=[
-		CommandHandler('cancel', cancel_operation),
-		CallbackQueryHandler(cancel_operation, pattern='CANCEL'),
-	],
-)
+def create_send_message_handler() -> ConversationHandler:
+	"""Create the handler of the /send conversation."""
+	return ConversationHandler(
+		entry_points=[
+			CommandHandler('send', get_message_from_reply),
+			CallbackQueryHandler(
+				callback=get_message_from_user_update, pattern='START_SEND_MESSAGE'
+			),
+		],
+		states={
+			'SET_MESSAGE_ID': [
+				MessageHandler(filters=~filters.COMMAND, callback=set_message_id)
+			]
+		},
+		fallbacks=[
+			CommandHandler('cancel', cancel_operation),
+			CallbackQueryHandler(cancel_operation, pattern='CANCEL'),
+		],
+	)
@@ -8,19 +8,20 @@ from telegram.ext import (
 	filters,
 )
 
-from utils import fixed_keyboards
+from utils import async_storage, fixed_keyboards
+from utils.persistence import StaleVersionError
 from utils.strings import (
 	CATEGORY_ERROR_REPLY,
 	CATEGORY_SELECT_PROMPT,
 	CATEGORY_USER_LIST_PROMPT,
 	CATEGORY_CONFIRM_SET,
 	CATEGORY_SET_SUCCESS,
+	CATEGORY_SET_CHANGED,
+	CATEGORY_SET_SUMMARY,
 )
 from handler_modules.basic_handlers import cancel_operation
 from utils.utilities import (
 	admin_required,
-	get_category_label_by_id,
-	set_category_user_list,
 	handle_telegram_errors,
 )
 
@@ -48,8 +49,10 @@ async def get_user_list_from_reply(update: Update, context: CallbackContext):
 	context.user_data['user_list_to_set'] = user_ids
 
 	# Prompt user to select category
+	category_id_list = await async_storage.get_category_id_list()
 	await update.message.reply_text(
-		CATEGORY_SELECT_PROMPT, reply_markup=fixed_keyboards.CATEGORIES
+		CATEGORY_SELECT_PROMPT,
+		reply_markup=fixed_keyboards.create_categories_keyboard(category_id_list),
 	)
 
 	return 'GET_CATEGORY_ID_TO_SET'
@@ -91,8 +94,10 @@ async def set_user_list(update: Update, context: CallbackContext):
 	context.user_data['user_list_to_set'] = user_ids
 
 	# Prompt user to select category
+	category_id_list = await async_storage.get_category_id_list()
 	await update.message.reply_text(
-		CATEGORY_SELECT_PROMPT, reply_markup=fixed_keyboards.CATEGORIES
+		CATEGORY_SELECT_PROMPT,
+		reply_markup=fixed_keyboards.create_categories_keyboard(category_id_list),
 	)
 
 	return 'GET_CATEGORY_ID_TO_SET'
@@ -115,11 +120,17 @@ async def get_category_id(update: Update, context: CallbackContext):
 	category_id = update.callback_query.data
 	context.user_data['category_id_to_set'] = category_id
 
+	# Remember the version the admin confirms, so later changes aren't overwritten silently
+	context.user_data['category_version'] = (
+		await async_storage.get_category_version(category_id)
+	)
+
 	await update.callback_query.answer()
 
 	# Show confirmation prompt with category name
+	category_label = await async_storage.get_category_label_by_id(category_id)
 	await update.callback_query.edit_message_text(
-		CATEGORY_CONFIRM_SET.format(category=get_category_label_by_id(category_id)),
+		CATEGORY_CONFIRM_SET.format(category=category_label),
 		reply_markup=fixed_keyboards.ADMIN_CONFIRMATION,
 	)
 
@@ -151,13 +162,36 @@ async def confirm(update: Update, context: CallbackContext):
 	user_list = context.user_data['user_list_to_set']
 
 	# Set the user list for the category
-	set_category_user_list(category_id, user_list)
+	try:
+		summary = await async_storage.set_category_user_list(
+			category_id,
+			user_list,
+			expected_version=context.user_data['category_version'],
+		)
+
+	except StaleVersionError:
+		# Ask again, against the current version of the category
+		context.user_data['category_version'] = (
+			await async_storage.get_category_version(category_id)
+		)
+
+		await update.callback_query.answer()
+		category_label = await async_storage.get_category_label_by_id(category_id)
+		await update.callback_query.edit_message_text(
+			CATEGORY_SET_CHANGED.format(category=category_label),
+			reply_markup=fixed_keyboards.ADMIN_CONFIRMATION,
+		)
+
+		return 'CONFIRM_SET_CATEGORY'
 
 	await update.callback_query.answer()
 
 	# Show success message
+	category_label = await async_storage.get_category_label_by_id(category_id)
 	await update.callback_query.edit_message_text(
-		CATEGORY_SET_SUCCESS.format(category=get_category_label_by_id(category_id)),
+		CATEGORY_SET_SUCCESS.format(category=category_label)
+		+ '\n\n'
+		+ CATEGORY_SET_SUMMARY.format(**summary),
 		reply_markup=fixed_keyboards.ADMIN_RETURN_TO_MAIN_MENU,
 	)
 
@@ -167,22 +201,24 @@ async def confirm(update: Update, context: CallbackContext):
 	return ConversationHandler.END
 
 
-set_category_handler = ConversationHandler(
-	entry_points=[
-		CommandHandler('setcategory', get_user_list_from_reply),
-		CallbackQueryHandler(
-			callback=get_user_list_from_user_update, pattern='START_SET_CATEGORY'
-		),
-	],
-	states={
-		'SET_USER_LIST': [
-			MessageHandler(filters=~filters.COMMAND, callback=set_user_list)
+def create_set_category_handler() -> ConversationHandler:
+	"""Create the handler of the /setcategory conversation."""
+	return ConversationHandler(
+		entry_points=[
+			CommandHandler('setcategory', get_user_list_from_reply),
+			CallbackQueryHandler(
+				callback=get_user_list_from_user_update, pattern='START_SET_CATEGORY'
+			),
 		],
-		'GET_CATEGORY_ID_TO_SET': [CallbackQueryHandler(get_category_id)],
-		'CONFIRM_SET_CATEGORY': [CallbackQueryHandler(callback=confirm)],
-	},
-	fallbacks=[
-		CommandHandler('cancel', cancel_operation),
-		CallbackQueryHandler(cancel_operation, pattern='CANCEL'),
-	],
-)
+		states={
+			'SET_USER_LIST': [
+				MessageHandler(filters=~filters.COMMAND, callback=set_user_list)
+			],
+			'GET_CATEGORY_ID_TO_SET': [CallbackQueryHandler(get_category_id)],
+			'CONFIRM_SET_CATEGORY': [CallbackQueryHandler(callback=confirm)],
+		},
+		fallbacks=[
+			CommandHandler('cancel', cancel_operation),
+			CallbackQueryHandler(cancel_operation, pattern='CANCEL'),
+		],
+	)
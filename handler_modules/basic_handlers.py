@@ -2,25 +2,18 @@ from telegram.ext import CallbackContext, ConversationHandler
 from telegram import Update
 from telegram.error import BadRequest
 
-from utils import fixed_keyboards
+from utils import async_storage, fixed_keyboards, strings
 from utils.strings import (
 	ADMIN_WELCOME,
 	ADMIN_WELCOME_BACK,
-	USER_WELCOME,
-	USER_WELCOME_BACK,
 	ADMIN_HELP,
-	OPERATION_CANCELED,
 	ADMIN_OPERATION_CANCELED,
 )
 from utils.utilities import (
-	add_user_to_category,
-	is_user_admin,
 	get_chat_id,
 	get_update_type,
+	get_user_context,
 	handle_telegram_errors,
-	register_user_start,
-	is_user_in_category,
-	is_user_in_non_interested_category,
 )
 
 
@@ -45,27 +38,35 @@ async def start(update: Update, context: CallbackContext):
 	"""
 	chat_id = get_chat_id(update)
 	update_type = get_update_type(update)
-	is_admin = is_user_admin(chat_id)
+	user_context = get_user_context(update, context)
 
 	# Handle regular users
-	if not is_admin:
+	if not user_context.is_admin:
 		keyboard = (
 			fixed_keyboards.USER_PANEL_MAIN_OLDVIP
-			if is_user_in_category(chat_id, 'OLDVIP')
+			if await user_context.is_in_category('OLDVIP')
 			else fixed_keyboards.USER_PANEL_MAIN
 		)
 		if update_type == 'MESSAGE':
 			# Register new user start and send welcome
-			register_user_start(update.message)
+			if not user_context.is_registered:
+				await async_storage.register_user_start(update.message)
+				user_context.invalidate()
 
 			await update.message.reply_text(
-				USER_WELCOME.format(name=update.message.from_user.first_name),
+				strings.USER_WELCOME.format(name=update.message.from_user.first_name),
 				reply_markup=keyboard,
 			)
 
+			# A user flagged as unreachable who starts the bot again can be reached again
+			await async_storage.record_delivery_success(chat_id)
+
 			# Add user to interested category if they are not in a non-INTERESTED category
-			if not is_user_in_non_interested_category(chat_id):
-				add_user_to_category(user_id=str(chat_id), category_id='0')
+			if not await user_context.is_in_non_interested_category():
+				await async_storage.add_user_to_category(
+					user_id=str(chat_id), category_id='0'
+				)
+				user_context.invalidate()
 
 		else:
 			# Handle callback query for returning users
@@ -74,13 +75,13 @@ async def start(update: Update, context: CallbackContext):
 			# If the edit fails, that means the message probably is a media message with a caption. Remove the media.
 			try:
 				await update.callback_query.edit_message_text(
-					USER_WELCOME_BACK, reply_markup=keyboard
+					strings.USER_WELCOME_BACK, reply_markup=keyboard
 				)
 			except BadRequest:
 				await update.callback_query.answer()
 				await context.bot.send_message(
 					chat_id=chat_id,
-					text=USER_WELCOME_BACK,
+					text=strings.USER_WELCOME_BACK,
 					reply_markup=keyboard,
 				)
 				await update.callback_query.delete_message()
@@ -115,10 +116,9 @@ async def show_help(update: Update, context: CallbackContext):
 	Returns:
 	    None
 	"""
-	chat_id = get_chat_id(update)
 	update_type = get_update_type(update)
 
-	if is_user_admin(chat_id):
+	if get_user_context(update, context).is_admin:
 		if update_type == 'MESSAGE':
 			await update.message.reply_text(
 				ADMIN_HELP, reply_markup=fixed_keyboards.RETURN_TO_MAIN_MENU
@@ -148,10 +148,10 @@ async def cancel_operation(update: Update, context: CallbackContext):
 	    int: ConversationHandler.END to end the conversation
 	"""
 	reply_markup = fixed_keyboards.RETURN_TO_MAIN_MENU
-	message_text = OPERATION_CANCELED
+	message_text = strings.OPERATION_CANCELED
 
 	# If the user is an admin, use the admin return to main menu and operation canceled text
-	if is_user_admin(get_chat_id(update)):
+	if get_user_context(update, context).is_admin:
 		reply_markup = fixed_keyboards.ADMIN_RETURN_TO_MAIN_MENU
 		message_text = ADMIN_OPERATION_CANCELED
 
@@ -11,10 +11,9 @@ from telegram.ext import (
 )
 
 from handler_modules.basic_handlers import cancel_operation
-from utils import fixed_keyboards, strings
+from utils import async_storage, fixed_keyboards, strings
 from utils.utilities import (
-	is_valid_promo_code,
-	add_user_to_category,
+	get_user_context,
 	log_user_interaction,
 	log_user_action_detail,
 )
@@ -50,9 +49,10 @@ async def check_promo_code(update: Update, context: CallbackContext):
 	user_id = str(update.effective_user.id)
 
 	# Check if the promo code is valid
-	if is_valid_promo_code(promo_code):
+	if await async_storage.is_valid_promo_code(promo_code):
 		# Add the user to a category with the same label as the promo code
-		add_user_to_category(user_id, category_label=promo_code)
+		await async_storage.add_user_to_category(user_id, category_label=promo_code)
+		get_user_context(update, context).invalidate()
 
 		await update.message.reply_text(
 			text=strings.PROMO_CODE_VALID,
@@ -67,19 +67,21 @@ async def check_promo_code(update: Update, context: CallbackContext):
 	return ConversationHandler.END
 
 
-check_promo_code_handler = ConversationHandler(
-	entry_points=[
-		CallbackQueryHandler(
-			callback=start_enter_promo_code, pattern='START_ENTER_PROMO_CODE'
-		)
-	],
-	states={
-		'PROMO_CODE_INPUT': [
-			MessageHandler(filters=~filters.COMMAND, callback=check_promo_code)
-		]
-	},
-	fallbacks=[
-		CommandHandler('cancel', cancel_operation),
-		CallbackQueryHandler(cancel_operation, pattern='CANCEL'),
-	],
-)
+def create_check_promo_code_handler() -> ConversationHandler:
+	"""Create the handler of the promo code conversation."""
+	return ConversationHandler(
+		entry_points=[
+			CallbackQueryHandler(
+				callback=start_enter_promo_code, pattern='START_ENTER_PROMO_CODE'
+			)
+		],
+		states={
+			'PROMO_CODE_INPUT': [
+				MessageHandler(filters=~filters.COMMAND, callback=check_promo_code)
+			]
+		},
+		fallbacks=[
+			CommandHandler('cancel', cancel_operation),
+			CallbackQueryHandler(cancel_operation, pattern='CANCEL'),
+		],
+	)
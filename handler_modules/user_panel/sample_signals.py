@@ -1,10 +1,11 @@
-from dotenv import dotenv_values
 from telegram import Update
 from telegram.ext import CallbackContext, CallbackQueryHandler
 
 from utils import fixed_keyboards
 from utils.utilities import (
 	get_chat_id,
+	get_secret,
+	get_user_context,
 	get_user_panel_message_id,
 	log_user_interaction,
 	log_user_action_detail,
@@ -20,11 +21,10 @@ async def start_sample_signals(update: Update, context: CallbackContext):
 	"""
 	user_id = get_chat_id(update)
 	message_id = get_user_panel_message_id(
-		'SAMPLE_SIGNALS_SELECT_TYPE', user_id=str(user_id)
+		'SAMPLE_SIGNALS_SELECT_TYPE',
+		user_categories=await get_user_context(update, context).get_categories(),
 	)
-	user_panel_messages_channel_id = dotenv_values('.env.secret')[
-		'USER_PANEL_MESSAGE_CHANNEL_ID'
-	]
+	user_panel_messages_channel_id = get_secret('USER_PANEL_MESSAGE_CHANNEL_ID')
 
 	# Use the sample signals keyboard
 	keyboard = fixed_keyboards.SAMPLE_SIGNALS_SELECT_TYPE
@@ -60,11 +60,10 @@ async def get_signal_type(update: Update, context: CallbackContext):
 
 	# Get the message ID for this signal type
 	message_id = get_user_panel_message_id(
-		update.callback_query.data, user_id=str(user_id)
+		update.callback_query.data,
+		user_categories=await get_user_context(update, context).get_categories(),
 	)
-	user_panel_messages_channel_id = dotenv_values('.env.secret')[
-		'USER_PANEL_MESSAGE_CHANNEL_ID'
-	]
+	user_panel_messages_channel_id = get_secret('USER_PANEL_MESSAGE_CHANNEL_ID')
 
 	await update.callback_query.answer()
 
@@ -94,9 +93,7 @@ async def get_signal_message_id(update: Update, context: CallbackContext):
 	# Format: SAMPLE_SIGNAL_TYPE_MESSAGEID:
 	message_id = int(callback_data.split(':')[1])
 
-	sample_signals_channel_id = dotenv_values('.env.secret')[
-		'SAMPLE_SIGNALS_CHANNEL_ID'
-	]
+	sample_signals_channel_id = get_secret('SAMPLE_SIGNALS_CHANNEL_ID')
 
 	await update.callback_query.answer()
 	# Get the signal type from the callback query
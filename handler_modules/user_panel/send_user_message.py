@@ -2,16 +2,18 @@ from telegram import Update
 from telegram.error import BadRequest
 from telegram.ext import CallbackContext, CallbackQueryHandler
 
-from utils import fixed_keyboards
-from utils.strings import MONTHLY_RESULTS_END
+from utils import fixed_keyboards, strings
+from utils.file_cache import load_json_derived
 from utils.utilities import (
+	USER_PANEL_MESSAGE_IDS_FILE,
 	get_chat_id,
-	get_message_labels,
+	get_locale,
+	get_secret,
+	get_user_context,
 	get_user_panel_message_id,
 	log_user_action_detail,
 	log_user_panel_errors,
 )
-from dotenv import dotenv_values
 
 MONTH_NAMES = [
 	'JANUARY',
@@ -28,76 +30,110 @@ MONTH_NAMES = [
 	'DECEMBER',
 ]
 
+# Messages shown with the keyboard of the same name
+MESSAGES_WITH_OWN_KEYBOARD = [
+	'RESULTS',
+	'OFFERS',
+	'HOW_IT_WORKS',
+	'SELECT_WALLET_ADDRESS',
+	'SAMPLE_SIGNALS_SELECT_TYPE',
+]
+
+# Buttons switching the page of the results keyboard instead of sending a message
+RESULTS_PAGE_KEYBOARDS = {'RESULTS_P1': 'RESULTS', 'RESULTS_P2': 'RESULTS_P2'}
+
+
+def _get_keyboard_name(message_name):
+	"""
+	Get the name of the keyboard a user panel message is sent with, and the action it is logged as.
+	"""
+	if message_name in RESULTS_PAGE_KEYBOARDS:
+		return RESULTS_PAGE_KEYBOARDS[message_name], message_name
+	if message_name in MESSAGES_WITH_OWN_KEYBOARD:
+		return message_name, message_name
+	if message_name.startswith('WALLET_'):
+		return 'SHOW_WALLET_ADDRESS', message_name
+	if any(month in message_name for month in MONTH_NAMES):
+		return 'SHOW_MONTHLY_RESULTS', message_name
+	return 'RETURN_TO_MAIN_MENU', 'RETURN_TO_MAIN_MENU'
+
+
+def _build_user_panel_routes(message_ids):
+	"""
+	Compile the user panel message IDs into the routes of the callback queries.
+
+	Each message name of a locale is mapped to a (message ID, keyboard, log action) tuple. The
+	message ID of the results page buttons is None, as they only switch the keyboard.
+	"""
+	routing_table = {}
+	for message_locale, messages in message_ids.items():
+		keyboards = fixed_keyboards.LOCALIZED_KEYBOARDS.get(message_locale, {})
+		locale_routes = {}
+		for message_name, message_id in messages.items():
+			keyboard_name, log_action = _get_keyboard_name(message_name)
+			if message_name in RESULTS_PAGE_KEYBOARDS:
+				message_id = None
+			locale_routes[message_name] = (
+				message_id,
+				keyboards.get(keyboard_name),
+				log_action,
+			)
+		routing_table[message_locale] = locale_routes
+	return routing_table
+
+
+def get_user_panel_routes():
+	"""
+	Get the routes of the user panel callback queries of the current locale.
+
+	The routes are rebuilt when user_panel_message_ids.json changes, so new messages are routed
+	without a restart.
+
+	Returns:
+	    dict: The (message ID, keyboard, log action) tuples by callback data
+	"""
+	return load_json_derived(USER_PANEL_MESSAGE_IDS_FILE, _build_user_panel_routes).get(
+		get_locale(), {}
+	)
+
+
+def is_user_panel_callback(callback_data) -> bool:
+	"""
+	Check whether a callback query is a user panel message button.
+
+	Args:
+	    callback_data: The data of the callback query
+
+	Returns:
+	    bool: True if the data is a message name in user_panel_message_ids.json
+	"""
+	return isinstance(callback_data, str) and callback_data in get_user_panel_routes()
+
 
 @log_user_panel_errors
 async def send_user_message(update: Update, context: CallbackContext):
 	"""
 	Send a message to the user pressing the button in the user panel.
 	"""
-	user_id = get_chat_id(update)
-	message_id = get_user_panel_message_id(
-		update.callback_query.data, user_id=str(user_id)
-	)
-	user_panel_messages_channel_id = dotenv_values('.env.secret')[
-		'USER_PANEL_MESSAGE_CHANNEL_ID'
-	]
-
-	# Handle RESULTS_P1 and RESULTS_P2 callbacks by updating the reply markup
-	if update.callback_query.data == 'RESULTS_P1':
-		log_user_action_detail(update, 'RESULTS_P1')
-		await update.callback_query.edit_message_reply_markup(
-			reply_markup=fixed_keyboards.RESULTS
-		)
+	message_name = update.callback_query.data
+	message_id, keyboard, log_action = get_user_panel_routes()[message_name]
+	log_user_action_detail(update, log_action)
+
+	# The results page buttons only switch the keyboard of the results message
+	if message_id is None:
+		await update.callback_query.edit_message_reply_markup(reply_markup=keyboard)
 		await update.callback_query.answer()
 		return
-	elif update.callback_query.data == 'RESULTS_P2':
-		log_user_action_detail(update, 'RESULTS_P2')
-		await update.callback_query.edit_message_reply_markup(
-			reply_markup=fixed_keyboards.RESULTS_P2
+
+	# Messages depending on the categories of the user are resolved against them
+	if isinstance(message_id, dict) and 'DEFAULT' in message_id:
+		message_id = get_user_panel_message_id(
+			message_name,
+			user_categories=await get_user_context(update, context).get_categories(),
 		)
-		await update.callback_query.answer()
-		return
 
-	# Keyboard is different for different states
-	if update.callback_query.data == 'RESULTS':
-		log_user_action_detail(update, 'RESULTS')
-		keyboard = fixed_keyboards.RESULTS
-
-	elif update.callback_query.data == 'OFFERS':
-		log_user_action_detail(update, 'OFFERS')
-		keyboard = fixed_keyboards.OFFERS
-	elif update.callback_query.data == 'HOW_IT_WORKS':
-		log_user_action_detail(update, 'HOW_IT_WORKS')
-		keyboard = fixed_keyboards.HOW_IT_WORKS
-	elif update.callback_query.data == 'SELECT_WALLET_ADDRESS':
-		log_user_action_detail(update, 'SELECT_WALLET_ADDRESS')
-		keyboard = fixed_keyboards.SELECT_WALLET_ADDRESS
-	elif update.callback_query.data == 'SAMPLE_SIGNALS_SELECT_TYPE':
-		log_user_action_detail(update, 'SAMPLE_SIGNALS_SELECT_TYPE')
-		keyboard = fixed_keyboards.SAMPLE_SIGNALS_SELECT_TYPE
-
-	# If the user pressed a wallet address button
-	elif update.callback_query.data.startswith('WALLET_'):
-		log_user_action_detail(update, update.callback_query.data)
-		keyboard = fixed_keyboards.SHOW_WALLET_ADDRESS
-
-	# If the user pressed a monthly results button
-	elif any(month in update.callback_query.data for month in MONTH_NAMES):
-		log_user_action_detail(update, update.callback_query.data)
-		keyboard = fixed_keyboards.SHOW_MONTHLY_RESULTS
-
-	elif not (
-		update.callback_query.data == 'SAMPLE_SIGNALS_SELECT_TYPE'
-		or update.callback_query.data == 'CAN_BAG'
-		or update.callback_query.data == 'FUTURES'
-	):
-		log_user_action_detail(update, 'RETURN_TO_MAIN_MENU')
-		keyboard = fixed_keyboards.RETURN_TO_MAIN_MENU
-
-	# Handle sample signals buttons
-	else:
-		log_user_action_detail(update, update.callback_query.data)
-		await update.callback_query.answer()
+	user_id = get_chat_id(update)
+	user_panel_messages_channel_id = get_secret('USER_PANEL_MESSAGE_CHANNEL_ID')
 
 	try:
 		# Handle album messages
@@ -121,7 +157,7 @@ async def send_user_message(update: Update, context: CallbackContext):
 
 			await context.bot.send_message(
 				chat_id=user_id,
-				text=MONTHLY_RESULTS_END,
+				text=strings.MONTHLY_RESULTS_END,
 				reply_markup=keyboard,
 			)
 
@@ -152,10 +188,7 @@ async def send_user_message(update: Update, context: CallbackContext):
 	await update.callback_query.answer()
 
 
-# The pattern for the handler should be all the keys in the user_panel_message_ids.json file
-message_ids = get_message_labels()
-
-send_user_message_handlers = [
-	CallbackQueryHandler(send_user_message, pattern=message_callback_query_data)
-	for message_callback_query_data in message_ids.keys()
-]
+# A single handler routes the buttons of all the messages in user_panel_message_ids.json
+send_user_message_handler = CallbackQueryHandler(
+	send_user_message, pattern=is_user_panel_callback
+)
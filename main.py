@@ -3,7 +3,10 @@ from telegram.ext import (
 	CommandHandler,
 	CallbackQueryHandler,
 )
+import asyncio
 import logging
+import signal
+from typing import Optional
 
 from handler_modules import basic_handlers
 from handler_modules.admin_panel import (
@@ -13,27 +16,75 @@ from handler_modules.admin_panel import (
 	send_message,
 	remove_from_category,
 	export_history,
+	export_unreachable,
 	send_user_logs,
 	clear_user_logs,
+	scheduled_sends,
 )
 from handler_modules.user_panel import promo_code, send_user_message, sample_signals
-from utils.utilities import get_bot_token
+from utils import async_storage, bulk_campaigns, bulk_schedules, log_pipeline
+from utils.config import Config, Locale, Mode
+from utils.rate_limiter import get_rate_limiter
+from utils.utilities import (
+	get_bot_token,
+	get_webhook_secret_token,
+	invalidate_admins,
+	shutdown_storage,
+)
+from utils.webhook_server import WebhookServer, get_webhook_path
 
 # Enable logging
 logging.basicConfig(format='%(message)s', level=logging.INFO)
 
 logging.getLogger('httpx').setLevel(logging.WARNING)
+logging.getLogger('tornado.access').setLevel(logging.WARNING)
 
 logger = logging.getLogger(__name__)
 
 
-def main():
-	# Get the appropriate bot token based on locale
-	token = get_bot_token()
+async def post_init(application: Application) -> None:
+	# Parse the data files before the first update arrives
+	await async_storage.preload()
+
+	# Continue the bulk sends interrupted by the last shutdown
+	await bulk_campaigns.resume_campaigns(application.bot)
+
+	# Register the scheduled bulk sends with the job queue again
+	await bulk_schedules.restore_schedules(application.job_queue)
+
 
-	application = (
-		Application.builder().token(token).read_timeout(30).write_timeout(30).build()
+async def post_stop(application: Application) -> None:
+	# Pause running bulk sends at a checkpoint, so they resume on the next start
+	await bulk_campaigns.stop_all_campaigns()
+
+
+async def post_shutdown() -> None:
+	# Let pending storage I/O finish, then write any changes still pending in the
+	# storage backend before exiting
+	async_storage.shutdown()
+	shutdown_storage()
+
+	# Write the log records still queued
+	log_pipeline.stop()
+
+
+def build_application(locale: Locale) -> Application:
+	# Get the appropriate bot token based on locale
+	token = get_bot_token(locale.value)
+
+	builder = (
+		Application.builder()
+		.token(token)
+		.read_timeout(30)
+		.write_timeout(30)
+		.concurrent_updates(Config.get_concurrent_updates())
+		# Shared by replies and bulk sends, with the replies going first
+		.rate_limiter(get_rate_limiter())
 	)
+	if Config.get_mode() == Mode.WEBHOOK:
+		# The updates are received by the webhook server instead of polling
+		builder.updater(None)
+	application = builder.build()
 
 	# Start/Main menu
 	application.add_handler(CommandHandler('start', basic_handlers.start))
@@ -51,25 +102,130 @@ def main():
 
 	# application.add_handler(CommandHandler('send', send_message.send_message))
 
-	application.add_handler(bulk_send.bulk_send_handler)
-	application.add_handler(set_category.set_category_handler)
-	application.add_handler(add_to_category.add_to_category_handler)
-	application.add_handler(remove_from_category.remove_from_category_handler)
+	# Conversation handlers keep the state of their conversations, so they are created for every
+	# bot rather than shared by the bots of all locales
+	application.add_handler(bulk_send.stop_bulk_send_handler)
+	application.add_handler(scheduled_sends.cancel_scheduled_send_handler)
+	application.add_handler(bulk_send.create_bulk_send_handler())
+	application.add_handler(set_category.create_set_category_handler())
+	application.add_handler(add_to_category.create_add_to_category_handler())
+	application.add_handler(remove_from_category.create_remove_from_category_handler())
 	application.add_handler(export_history.export_history_handler)
+	application.add_handler(export_unreachable.export_unreachable_handler)
+	application.add_handler(scheduled_sends.show_scheduled_sends_handler)
 	application.add_handler(send_user_logs.send_user_logs_handler)
-	application.add_handler(clear_user_logs.clear_user_logs_handler)
+	application.add_handler(clear_user_logs.create_clear_user_logs_handler())
 
 	# User panel handlers are multiple handlers, so we need to add them all
-	application.add_handler(promo_code.check_promo_code_handler)
+	application.add_handler(promo_code.create_check_promo_code_handler())
 
 	for handler in sample_signals.sample_signal_handlers:
 		application.add_handler(handler)
 
-	for handler in send_user_message.send_user_message_handlers:
-		application.add_handler(handler)
+	application.add_handler(send_user_message.send_user_message_handler)
+
+	return application
+
 
-	# Start the bot
-	application.run_polling()
+async def register_webhook(
+	application: Application, locale: Locale, secret_token: str
+) -> None:
+	webhook_url = Config.get_webhook_url()
+	if webhook_url is None:
+		# Registered elsewhere, e.g. for a load balancer, or not at all for local testing
+		return
+
+	await application.bot.set_webhook(
+		webhook_url + get_webhook_path(locale.value), secret_token=secret_token
+	)
+	logger.info(f'Registered the webhook of locale {locale.value}')
+
+
+async def run_application(
+	application: Application,
+	locale: Locale,
+	stop_event: asyncio.Event,
+	secret_token: Optional[str] = None,
+) -> None:
+	# The tasks of the bot, like polling and processing the updates, are started in here and
+	# keep the locale of the bot
+	with Config.use_locale(locale):
+		try:
+			async with application:
+				await post_init(application)
+				if application.updater is not None:
+					await application.updater.start_polling()
+				else:
+					await register_webhook(application, locale, secret_token)
+				await application.start()
+				logger.info(f'Bot of locale {locale.value} started')
+
+				await stop_event.wait()
+
+				if application.updater is not None:
+					await application.updater.stop()
+				await application.stop()
+				await post_stop(application)
+		finally:
+			# When a bot stops, e.g. because it failed to start, the other bots stop as well
+			stop_event.set()
+
+
+async def run(locales: list) -> None:
+	stop_event = asyncio.Event()
+	loop = asyncio.get_running_loop()
+	for stop_signal in (signal.SIGINT, signal.SIGTERM):
+		try:
+			loop.add_signal_handler(stop_signal, stop_event.set)
+		except NotImplementedError:
+			# Not supported on Windows, where Ctrl+C stops the bots with a KeyboardInterrupt
+			pass
+
+	# SIGHUP applies changes to data/admins.json right away. It doesn't exist on Windows.
+	if hasattr(signal, 'SIGHUP'):
+		loop.add_signal_handler(signal.SIGHUP, invalidate_admins)
+
+	# The user interaction and error logs of all the bots are written on a background thread
+	log_pipeline.start()
+
+	applications = []
+	for locale in locales:
+		with Config.use_locale(locale):
+			applications.append(build_application(locale))
+
+	server = None
+	secret_token = None
+	if Config.get_mode() == Mode.WEBHOOK:
+		# A single server on --port receives the updates of all the bots
+		secret_token = get_webhook_secret_token()
+		server = WebhookServer(
+			{locale.value: application for locale, application in zip(locales, applications)},
+			secret_token,
+			Config.get_port(),
+		)
+		server.start()
+
+	try:
+		results = await asyncio.gather(
+			*(
+				run_application(application, locale, stop_event, secret_token)
+				for application, locale in zip(applications, locales)
+			),
+			return_exceptions=True,
+		)
+	finally:
+		if server is not None:
+			await server.stop()
+		await post_shutdown()
+
+	for result in results:
+		if isinstance(result, BaseException):
+			raise result
+
+
+def main():
+	# One bot per locale, all running in this process and sharing the loaded data
+	asyncio.run(run(Config.get_locales()))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,143 @@
+"""
+Async facade over the storage helpers in utils.utilities.
+Runs the helpers that may touch the disk on a dedicated, bounded I/O thread pool, so handlers
+can await them without stalling the updates of other chats.
+"""
+
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from utils import utilities
+from utils.config import Config
+
+_executor: Optional[ThreadPoolExecutor] = None
+_mutation_lock: Optional[asyncio.Lock] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+	"""
+	Get the I/O thread pool, creating it on first use.
+
+	Returns:
+	    ThreadPoolExecutor: The pool with --io-workers threads
+	"""
+	global _executor
+	if _executor is None:
+		_executor = ThreadPoolExecutor(
+			max_workers=Config.get_io_workers(), thread_name_prefix='storage-io'
+		)
+	return _executor
+
+
+async def run_io(func, *args, **kwargs):
+	"""
+	Run a blocking function on the I/O thread pool.
+
+	Args:
+	    func: The function to run
+	    *args: Positional arguments for the function
+	    **kwargs: Keyword arguments for the function
+
+	Returns:
+	    The return value of the function
+	"""
+	loop = asyncio.get_running_loop()
+	# Run in a copy of the current context like asyncio.to_thread, so the function sees the
+	# locale of the bot it runs for
+	context = contextvars.copy_context()
+	return await loop.run_in_executor(
+		get_executor(), functools.partial(context.run, func, *args, **kwargs)
+	)
+
+
+def _run_on_io_executor(func):
+	@functools.wraps(func)
+	async def wrapper(*args, **kwargs):
+		return await run_io(func, *args, **kwargs)
+
+	return wrapper
+
+
+def get_mutation_lock() -> asyncio.Lock:
+	"""
+	Get the lock serializing category mutations started from handlers.
+
+	The store also locks every mutation itself. Waiting on this lock first keeps concurrent
+	updates queued on the event loop instead of holding I/O threads while they wait.
+
+	Returns:
+	    asyncio.Lock: The process-wide mutation lock
+	"""
+	global _mutation_lock
+	if _mutation_lock is None:
+		_mutation_lock = asyncio.Lock()
+	return _mutation_lock
+
+
+def _mutation_on_io_executor(func):
+	@functools.wraps(func)
+	async def wrapper(*args, **kwargs):
+		async with get_mutation_lock():
+			return await run_io(func, *args, **kwargs)
+
+	return wrapper
+
+
+def _preload():
+	# Loading the categories and the history reads their files, which is done once per process
+	utilities.get_category_id_list()
+	utilities.is_user_registered('')
+	utilities.is_user_unreachable('')
+	utilities.get_admins()
+	utilities.get_message_labels()
+
+
+async def preload() -> None:
+	"""
+	Load the storage backend and the cached data files of the current locale.
+	Run once per locale, the files shared by the locales are only parsed the first time.
+
+	Run at startup, so the first updates don't have to wait for the files to be parsed.
+	"""
+	await run_io(_preload)
+
+
+def shutdown() -> None:
+	"""Wait for pending I/O to finish and stop the I/O threads."""
+	global _executor
+	if _executor is not None:
+		_executor.shutdown(wait=True)
+		_executor = None
+
+
+register_user_start = _run_on_io_executor(utilities.register_user_start)
+get_user_history = _run_on_io_executor(utilities.get_user_history)
+get_category_id_list = _run_on_io_executor(utilities.get_category_id_list)
+get_category_label_by_id = _run_on_io_executor(utilities.get_category_label_by_id)
+get_category_version = _run_on_io_executor(utilities.get_category_version)
+describe_segment = _run_on_io_executor(utilities.describe_segment)
+get_categories_for_user = _run_on_io_executor(utilities.get_categories_for_user)
+get_users_by_category_id = _run_on_io_executor(utilities.get_users_by_category_id)
+get_segment_users = _run_on_io_executor(utilities.get_segment_users)
+get_audience_users = _run_on_io_executor(utilities.get_audience_users)
+get_segment_recipients = _run_on_io_executor(utilities.get_segment_recipients)
+get_language_counts = _run_on_io_executor(utilities.get_language_counts)
+add_user_to_category = _mutation_on_io_executor(utilities.add_user_to_category)
+remove_user_from_category = _mutation_on_io_executor(
+	utilities.remove_user_from_category
+)
+set_category_user_list = _mutation_on_io_executor(utilities.set_category_user_list)
+add_user_list_to_category = _mutation_on_io_executor(
+	utilities.add_user_list_to_category
+)
+remove_user_list_from_category = _mutation_on_io_executor(
+	utilities.remove_user_list_from_category
+)
+is_valid_promo_code = _run_on_io_executor(utilities.is_valid_promo_code)
+get_unreachable_users = _run_on_io_executor(utilities.get_unreachable_users)
+split_unreachable_users = _run_on_io_executor(utilities.split_unreachable_users)
+record_delivery_failure = _run_on_io_executor(utilities.record_delivery_failure)
+record_delivery_success = _run_on_io_executor(utilities.record_delivery_success)
@@ -0,0 +1,598 @@
+"""
+Background bulk send campaigns for the bot.
+A campaign delivers a message to the recipients of a category in a task of its own, while a
+progress message in the admin's chat is edited with the counts, throughput and ETA.
+
+Campaigns are checkpointed under data/campaigns/, so a campaign interrupted by a restart resumes
+where it stopped without sending the message to anyone twice.
+"""
+
+import asyncio
+import csv
+import glob
+import io
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Optional
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+from utils import bulk_delivery, fixed_keyboards
+from utils.async_storage import (
+	record_delivery_failure,
+	record_delivery_success,
+	run_io,
+)
+from utils.config import Config, Locale
+from utils.persistence import atomic_write_json
+from utils.rate_limiter import PRIORITY_BULK, get_rate_limiter
+from utils.strings import (
+	BULK_SEND_ERROR_BAD_REQUEST,
+	BULK_SEND_ERROR_FORBIDDEN,
+	BULK_SEND_ERROR_NETWORK,
+	BULK_SEND_ERROR_OTHER,
+	BULK_SEND_ERROR_REPORT,
+	BULK_SEND_ERROR_RETRY_AFTER,
+	BULK_SEND_INTERRUPTED,
+	BULK_SEND_PROGRESS,
+	BULK_SEND_STOPPED,
+	BULK_SEND_SUCCESS,
+	BULK_SEND_SUMMARY,
+)
+from utils.utilities import is_user_unreachable
+
+logger = logging.getLogger(__name__)
+
+CAMPAIGNS_DIR = 'data/campaigns'
+
+# Seconds between edits of the progress message, which are also the checkpoints of the campaign
+PROGRESS_INTERVAL = 5.0
+# Descriptions of the error classes in the error report
+ERROR_CLASS_DESCRIPTIONS = {
+	'FORBIDDEN': BULK_SEND_ERROR_FORBIDDEN,
+	'BAD_REQUEST': BULK_SEND_ERROR_BAD_REQUEST,
+	'RETRY_AFTER': BULK_SEND_ERROR_RETRY_AFTER,
+	'NETWORK': BULK_SEND_ERROR_NETWORK,
+	'OTHER': BULK_SEND_ERROR_OTHER,
+}
+
+
+def classify_error(e: Exception) -> str:
+	"""
+	Get the class of a failed send for the error report.
+
+	Args:
+	    e (Exception): The error of the send
+
+	Returns:
+	    str: 'FORBIDDEN', 'BAD_REQUEST', 'RETRY_AFTER', 'NETWORK' or 'OTHER'
+	"""
+	if isinstance(e, Forbidden):
+		return 'FORBIDDEN'
+	# BadRequest is a subclass of NetworkError, so it has to be checked first
+	if isinstance(e, BadRequest):
+		return 'BAD_REQUEST'
+	if isinstance(e, RetryAfter):
+		return 'RETRY_AFTER'
+	if isinstance(e, NetworkError):
+		return 'NETWORK'
+	return 'OTHER'
+
+
+def format_duration(seconds: float) -> str:
+	"""
+	Format a duration for the progress message, e.g. '1h 02m 03s'.
+
+	Args:
+	    seconds (float): The duration in seconds
+
+	Returns:
+	    str: The formatted duration
+	"""
+	minutes, seconds = divmod(int(seconds), 60)
+	hours, minutes = divmod(minutes, 60)
+	if hours:
+		return f'{hours}h {minutes:02d}m {seconds:02d}s'
+	if minutes:
+		return f'{minutes}m {seconds:02d}s'
+	return f'{seconds}s'
+
+
+class Campaign:
+	"""
+	A bulk send of one message to the users of a category.
+
+	The campaign is stored as a snapshot with the message and the recipients
+	(data/campaigns/<id>.json), next to an append-only log of the recipients that were already
+	handled (data/campaigns/<id>.log). A recipient is recorded in memory as soon as their send
+	succeeded or failed, together with the class and reason of a failure. The recorded
+	recipients are appended to the log and fsynced at every checkpoint, on the I/O threads.
+
+	Attributes:
+	    campaign_id (str): Short unique ID, used in the stop button of the progress message
+	    category_label (str): The label of the category the message is sent to
+	    recipients (list): The chat IDs the message is sent to
+	    result (dict): The number of recipients the message was 'sent' to and 'failed' for so far
+	    errors (list): The (chat ID, error class, reason) of every failed recipient
+	    locale (str): The locale of the bot sending the message
+	"""
+
+	def __init__(
+		self,
+		campaign_id: str,
+		category_label: str,
+		recipients: list,
+		from_chat_id,
+		message_id: int,
+		admin_chat_id,
+		progress_message_id: int,
+		locale: Optional[str] = None,
+	):
+		self.campaign_id = campaign_id
+		self.category_label = category_label
+		self.recipients = recipients
+		self.from_chat_id = from_chat_id
+		self.message_id = message_id
+		self.admin_chat_id = admin_chat_id
+		self.progress_message_id = progress_message_id
+		self.locale = locale if locale is not None else Config.get_locale().value
+		self.result = {'sent': 0, 'failed': 0}
+		self.handled = set()
+		self.errors = []
+		self.started_at = time.monotonic()
+		self._handled_before_start = 0
+		self.task: Optional[asyncio.Task] = None
+		# Set when the campaign is stopped by a shutdown rather than by an admin
+		self.interrupted = False
+		self._log = None
+		# Held while the log is written, which the event loop never waits for
+		self._log_lock = threading.Lock()
+		# Entries recorded since the last checkpoint. The lock is only held to add or take them.
+		self._pending_entries = []
+		self._pending_lock = threading.Lock()
+
+	@property
+	def snapshot_path(self) -> str:
+		return os.path.join(CAMPAIGNS_DIR, f'{self.campaign_id}.json')
+
+	@property
+	def log_path(self) -> str:
+		return os.path.join(CAMPAIGNS_DIR, f'{self.campaign_id}.log')
+
+	@property
+	def remaining(self) -> int:
+		return len(self.recipients) - self.result['sent'] - self.result['failed']
+
+	def to_dict(self) -> dict:
+		return {
+			'campaign_id': self.campaign_id,
+			'category_label': self.category_label,
+			'recipients': self.recipients,
+			'from_chat_id': self.from_chat_id,
+			'message_id': self.message_id,
+			'admin_chat_id': self.admin_chat_id,
+			'progress_message_id': self.progress_message_id,
+			'locale': self.locale,
+		}
+
+	@classmethod
+	def load(cls, snapshot_path: str) -> 'Campaign':
+		"""
+		Load a checkpointed campaign, including the recipients it already handled.
+
+		Args:
+		    snapshot_path (str): The snapshot file of the campaign
+
+		Returns:
+		    Campaign: The campaign, with its counts restored from the log
+		"""
+		with open(snapshot_path, 'r', encoding='utf-8') as f:
+			snapshot = json.load(f)
+		campaign = cls(**snapshot)
+
+		if os.path.exists(campaign.log_path):
+			with open(campaign.log_path, 'rb+') as f:
+				for line in f:
+					try:
+						chat_id, sent, *error = json.loads(line)
+					except ValueError:
+						# A torn write at the end of the log from a crash mid-append
+						continue
+					campaign._mark_handled(chat_id, sent, *error)
+
+				# Terminate a torn last line, so the next entry starts on a line of its own
+				if f.tell() > 0:
+					f.seek(-1, os.SEEK_END)
+					if f.read(1) != b'\n':
+						f.write(b'\n')
+
+		return campaign
+
+	def save(self) -> None:
+		"""Write the snapshot of the campaign."""
+		os.makedirs(CAMPAIGNS_DIR, exist_ok=True)
+		atomic_write_json(self.snapshot_path, self.to_dict())
+
+	def delete(self) -> None:
+		"""Delete the snapshot and the log of the campaign."""
+		self.close()
+		for path in (self.snapshot_path, self.log_path):
+			if os.path.exists(path):
+				os.remove(path)
+
+	def _mark_handled(
+		self, chat_id, sent: bool, error_class: str = 'OTHER', reason: str = ''
+	) -> None:
+		if chat_id not in self.handled:
+			self.handled.add(chat_id)
+			self.result['sent' if sent else 'failed'] += 1
+			if not sent:
+				self.errors.append((chat_id, error_class, reason))
+
+	def record(self, chat_id, error: Optional[Exception] = None) -> None:
+		"""
+		Record that a recipient was handled, so a resumed campaign skips them.
+
+		The entry is queued before the recipient counts as handled, and written to the log by
+		the next checkpoint, so recording doesn't touch the disk on the event loop.
+
+		Args:
+		    chat_id: The recipient
+		    error (Exception, optional): The error if sending failed, None if it succeeded
+		"""
+		if error is None:
+			entry = [chat_id, True]
+		else:
+			entry = [chat_id, False, classify_error(error), str(error)]
+
+		with self._pending_lock:
+			self._pending_entries.append(entry)
+		self._mark_handled(*entry)
+
+	def format_error_report(self) -> str:
+		"""
+		Format the summary of the failed recipients, grouped by error class.
+
+		Returns:
+		    str: The number of failed recipients per error class
+		"""
+		counts = {}
+		for _, error_class, _ in self.errors:
+			counts[error_class] = counts.get(error_class, 0) + 1
+
+		lines = [
+			f'{ERROR_CLASS_DESCRIPTIONS.get(error_class, error_class)}: {count}'
+			for error_class, count in sorted(counts.items(), key=lambda item: -item[1])
+		]
+		return BULK_SEND_ERROR_REPORT.format(
+			category=self.category_label,
+			failed=len(self.errors),
+			errors='\n'.join(lines),
+		)
+
+	def get_error_csv(self) -> bytes:
+		"""
+		Get the failed recipients as a CSV file.
+
+		Returns:
+		    bytes: CSV with the user ID, error class and reason of every failed recipient
+		"""
+		output = io.StringIO()
+		writer = csv.writer(output)
+		writer.writerow(['user_id', 'error_class', 'reason'])
+		writer.writerows(self.errors)
+		return output.getvalue().encode('utf-8')
+
+	def checkpoint(self) -> None:
+		"""
+		Append the recipients recorded since the last checkpoint to the log, and make them durable.
+		"""
+		with self._log_lock:
+			self._write_pending_entries()
+
+	def _write_pending_entries(self) -> None:
+		with self._pending_lock:
+			entries, self._pending_entries = self._pending_entries, []
+		# Nothing is opened once the campaign is closed and every entry was written
+		if not entries:
+			return
+
+		if self._log is None:
+			self._log = open(self.log_path, 'a', encoding='utf-8')
+		self._log.write(
+			''.join(json.dumps(entry, ensure_ascii=False) + '\n' for entry in entries)
+		)
+		self._log.flush()
+		os.fsync(self._log.fileno())
+
+	def close(self) -> None:
+		"""Checkpoint and close the log."""
+		with self._log_lock:
+			self._write_pending_entries()
+			if self._log is not None:
+				self._log.close()
+				self._log = None
+
+	def get_pending_recipients(self) -> list:
+		return [chat_id for chat_id in self.recipients if chat_id not in self.handled]
+
+	def format_progress(self) -> str:
+		"""
+		Format the progress message of the campaign.
+
+		Returns:
+		    str: The counts, throughput and ETA of the campaign
+		"""
+		elapsed = time.monotonic() - self.started_at
+		done = self.result['sent'] + self.result['failed'] - self._handled_before_start
+		rate = done / elapsed if elapsed > 0 else 0.0
+		eta = format_duration(self.remaining / rate) if rate > 0 else '?'
+
+		return BULK_SEND_PROGRESS.format(
+			category=self.category_label,
+			sent=self.result['sent'],
+			failed=self.result['failed'],
+			remaining=self.remaining,
+			rate=rate,
+			eta=eta,
+		)
+
+	def start_clock(self) -> None:
+		"""Start measuring the throughput, ignoring recipients handled before a restart."""
+		self.started_at = time.monotonic()
+		self._handled_before_start = len(self.handled)
+
+
+_campaigns = {}
+
+
+def get_campaign(campaign_id: str) -> Optional[Campaign]:
+	"""
+	Get a running campaign.
+
+	Args:
+	    campaign_id (str): The ID of the campaign
+
+	Returns:
+	    Campaign or None: The campaign, or None if it isn't running
+	"""
+	return _campaigns.get(campaign_id)
+
+
+async def _edit_progress_message(bot, campaign: Campaign, text: str, reply_markup=None):
+	try:
+		await bot.edit_message_text(
+			text,
+			chat_id=campaign.admin_chat_id,
+			message_id=campaign.progress_message_id,
+			reply_markup=reply_markup,
+		)
+	except BadRequest as e:
+		# Editing a message with the same text fails, which is harmless
+		if 'not modified' not in str(e):
+			logger.warning(f'Could not update progress of campaign {campaign.campaign_id}: {e}')
+
+
+async def _report_progress(bot, campaign: Campaign) -> None:
+	keyboard = fixed_keyboards.create_bulk_send_progress_keyboard(campaign.campaign_id)
+	while True:
+		await _edit_progress_message(bot, campaign, campaign.format_progress(), keyboard)
+		logger.info(
+			f'Campaign {campaign.campaign_id}: {campaign.remaining} remaining, '
+			f'queued requests {get_rate_limiter().get_queue_depths()}'
+		)
+		await asyncio.sleep(PROGRESS_INTERVAL)
+		await run_io(campaign.checkpoint)
+
+
+async def _run(bot, campaign: Campaign) -> None:
+	async def send(chat_id):
+		await bot.copy_message(
+			chat_id=chat_id,
+			from_chat_id=campaign.from_chat_id,
+			message_id=campaign.message_id,
+			rate_limit_args=PRIORITY_BULK,
+		)
+		campaign.record(chat_id)
+		# Only users the admin chose to include despite their flag can clear it here
+		if is_user_unreachable(chat_id):
+			await record_delivery_success(chat_id)
+
+	async def record_error(chat_id, e):
+		# Errors are collected and reported once at the end, instead of a message per failure
+		campaign.record(chat_id, e)
+		# Users who blocked the bot are flagged, so later sends skip them
+		await record_delivery_failure(chat_id, e)
+
+	campaign.start_clock()
+	reporter = asyncio.create_task(_report_progress(bot, campaign))
+	stopped = False
+
+	try:
+		# The counts of the campaign are kept by record(), which also covers earlier runs
+		await bulk_delivery.deliver(
+			campaign.get_pending_recipients(), send, on_error=record_error
+		)
+	except asyncio.CancelledError:
+		stopped = True
+	except Exception:
+		logger.exception(f'Campaign {campaign.campaign_id} failed')
+		stopped = True
+	finally:
+		reporter.cancel()
+		del _campaigns[campaign.campaign_id]
+
+	if stopped and campaign.interrupted:
+		# Keep the checkpoint, so the campaign resumes on the next start
+		await run_io(campaign.close)
+		text = BULK_SEND_INTERRUPTED.format(
+			category=campaign.category_label,
+			sent=campaign.result['sent'],
+			failed=campaign.result['failed'],
+			remaining=campaign.remaining,
+		)
+	else:
+		await run_io(campaign.delete)
+		if stopped:
+			text = BULK_SEND_STOPPED.format(
+				category=campaign.category_label,
+				sent=campaign.result['sent'],
+				failed=campaign.result['failed'],
+				remaining=campaign.remaining,
+			)
+		else:
+			text = (
+				BULK_SEND_SUCCESS.format(category=campaign.category_label)
+				+ '\n\n'
+				+ BULK_SEND_SUMMARY.format(
+					sent=campaign.result['sent'],
+					failed=campaign.result['failed'],
+					duration=format_duration(time.monotonic() - campaign.started_at),
+				)
+			)
+
+	await _edit_progress_message(
+		bot, campaign, text, fixed_keyboards.ADMIN_RETURN_TO_MAIN_MENU
+	)
+
+	if campaign.errors and not campaign.interrupted:
+		await _send_error_report(bot, campaign)
+
+
+async def _send_error_report(bot, campaign: Campaign) -> None:
+	try:
+		await bot.send_document(
+			campaign.admin_chat_id,
+			document=campaign.get_error_csv(),
+			filename=f'bulk_send_errors_{campaign.campaign_id}.csv',
+			caption=campaign.format_error_report(),
+		)
+	except Exception as e:
+		logger.error(f'Could not send the error report of campaign {campaign.campaign_id}: {e}')
+
+
+def _start(bot, campaign: Campaign) -> None:
+	_campaigns[campaign.campaign_id] = campaign
+	# The task is kept in the registry rather than the Application, whose shutdown would
+	# otherwise wait for the whole campaign to finish. It runs in the locale of the campaign.
+	with Config.use_locale(Locale(campaign.locale)):
+		campaign.task = asyncio.create_task(
+			_run(bot, campaign), name=f'bulk_send:{campaign.campaign_id}'
+		)
+
+
+async def start_campaign(
+	bot,
+	category_label: str,
+	recipients: list,
+	from_chat_id,
+	message_id: int,
+	admin_chat_id,
+	progress_message_id: int,
+) -> Campaign:
+	"""
+	Checkpoint a new campaign and start sending its message in the background.
+
+	Args:
+	    bot: The bot sending the messages
+	    category_label (str): The label of the category the message is sent to
+	    recipients (list): The chat IDs to send the message to
+	    from_chat_id: The chat containing the message to send
+	    message_id (int): The message to copy to the recipients
+	    admin_chat_id: The chat of the admin who started the campaign
+	    progress_message_id (int): The message in the admin's chat to show the progress in
+
+	Returns:
+	    Campaign: The started campaign
+	"""
+	campaign = Campaign(
+		uuid.uuid4().hex[:8],
+		category_label,
+		list(recipients),
+		from_chat_id,
+		message_id,
+		admin_chat_id,
+		progress_message_id,
+	)
+	await run_io(campaign.save)
+	_start(bot, campaign)
+	return campaign
+
+
+def _load_interrupted_campaigns(locale: str) -> list:
+	campaigns = []
+	for snapshot_path in sorted(glob.glob(os.path.join(CAMPAIGNS_DIR, '*.json'))):
+		try:
+			campaign = Campaign.load(snapshot_path)
+		except (OSError, ValueError, TypeError) as e:
+			logger.error(f'Could not load campaign {snapshot_path}: {e}')
+			continue
+
+		# Campaigns of the other locales are resumed by the bots of their locales
+		if campaign.locale == locale:
+			campaigns.append(campaign)
+	return campaigns
+
+
+async def resume_campaigns(bot) -> list:
+	"""
+	Resume the campaigns of the current locale interrupted by the last shutdown or crash.
+
+	Recipients recorded in a campaign's log are skipped, so nobody gets the message twice.
+
+	Args:
+	    bot: The bot sending the messages
+
+	Returns:
+	    list: The resumed campaigns
+	"""
+	campaigns = await run_io(_load_interrupted_campaigns, Config.get_locale().value)
+	for campaign in campaigns:
+		logger.info(
+			f'Resuming campaign {campaign.campaign_id} to {campaign.category_label} '
+			f'with {campaign.remaining} recipients left'
+		)
+		_start(bot, campaign)
+	return campaigns
+
+
+def stop_campaign(campaign_id: str) -> bool:
+	"""
+	Stop a running campaign of the current locale for good. Messages already sent stay sent.
+
+	Args:
+	    campaign_id (str): The ID of the campaign
+
+	Returns:
+	    bool: True if the campaign was running, False otherwise
+	"""
+	campaign = _campaigns.get(campaign_id)
+	# The campaigns of the other locales can only be stopped from the bots of their locales
+	if (
+		campaign is None
+		or campaign.task is None
+		or campaign.locale != Config.get_locale().value
+	):
+		return False
+
+	campaign.task.cancel()
+	return True
+
+
+async def stop_all_campaigns() -> None:
+	"""
+	Interrupt every running campaign of the current locale, e.g. on shutdown, keeping their
+	checkpoints so they resume on the next start.
+	"""
+	locale = Config.get_locale().value
+	tasks = []
+	for campaign in _campaigns.values():
+		if campaign.task is not None and campaign.locale == locale:
+			campaign.interrupted = True
+			campaign.task.cancel()
+			tasks.append(campaign.task)
+	await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,85 @@
+"""
+Bulk delivery engine for the bot.
+Sends a message to many chats with a bounded number of requests in flight. The sends are
+throttled by the rate limiter of the bot (see utils/rate_limiter.py), behind its replies.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Iterable, Optional
+
+from telegram.error import RetryAfter
+
+from utils.config import Config
+
+logger = logging.getLogger(__name__)
+
+# How often a single recipient is retried after Telegram asked to slow down
+MAX_RETRY_AFTER_ATTEMPTS = 5
+
+
+async def deliver(
+	recipients: Iterable,
+	send: Callable[[object], Awaitable],
+	on_error: Optional[Callable[[object, Exception], Awaitable]] = None,
+	concurrency: Optional[int] = None,
+	result: Optional[dict] = None,
+) -> dict:
+	"""
+	Send a message to every recipient at the highest rate Telegram allows.
+
+	Up to `concurrency` sends are in flight at a time. The send has to go through the rate
+	limiter of the bot with the bulk priority, e.g. `rate_limit_args=PRIORITY_BULK`, which
+	also pauses every send for the time requested by a RetryAfter. The recipient is then
+	retried. Other errors are passed to on_error and the delivery continues.
+
+	Args:
+	    recipients: The chat IDs to send to
+	    send: Coroutine function sending the message to a single chat ID through the bot
+	    on_error: Coroutine function called with the chat ID and the error of a failed send
+	    concurrency (int, optional): Maximum number of sends in flight, --bulk-send-concurrency
+	        by default
+	    result (dict, optional): Dictionary to count the 'sent' and 'failed' recipients in while
+	        the delivery runs, e.g. to report progress
+
+	Returns:
+	    dict: The number of recipients the message was 'sent' to and 'failed' for
+	"""
+	if concurrency is None:
+		concurrency = Config.get_bulk_send_concurrency()
+
+	recipient_iterator = iter(recipients)
+	if result is None:
+		result = {}
+	result.setdefault('sent', 0)
+	result.setdefault('failed', 0)
+
+	async def send_with_retries(chat_id) -> None:
+		for attempt in range(1, MAX_RETRY_AFTER_ATTEMPTS + 1):
+			try:
+				await send(chat_id)
+				result['sent'] += 1
+				return
+
+			except RetryAfter:
+				# The rate limiter of the bot already paused the sends for the requested time
+				logger.warning(f'Flood limit reached while sending to {chat_id}, retrying')
+				if attempt == MAX_RETRY_AFTER_ATTEMPTS:
+					raise
+
+	async def worker() -> None:
+		# The workers share one iterator, so each recipient is sent to exactly once
+		for chat_id in recipient_iterator:
+			try:
+				await send_with_retries(chat_id)
+			except Exception as e:
+				result['failed'] += 1
+				if on_error is not None:
+					try:
+						await on_error(chat_id, e)
+					except Exception:
+						# Failing to report an error must not stop the delivery
+						logger.exception(f'Error reporting the failed send to {chat_id}')
+
+	await asyncio.gather(*(worker() for _ in range(concurrency)))
+	return result
@@ -0,0 +1,301 @@
+"""
+Scheduled bulk sends for the bot.
+A bulk send can be scheduled for a later time, once or repeated daily or weekly. Schedules are
+stored in data/scheduled_sends_<locale>.json and run by the application's job queue. They are registered
+with the job queue again on startup, so they survive restarts.
+"""
+
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from telegram.ext import CallbackContext, JobQueue
+
+from utils import async_storage, bulk_campaigns
+from utils.async_storage import run_io
+from utils.config import Config, Locale
+from utils.persistence import atomic_write_json
+from utils.strings import (
+	BULK_SEND_SCHEDULED_STARTING,
+	SCHEDULE_REPEATED_DAILY,
+	SCHEDULE_REPEATED_WEEKLY,
+	SCHEDULE_TIME,
+)
+
+logger = logging.getLogger(__name__)
+
+# Format of the times admins schedule sends at, always in UTC
+TIME_FORMAT = '%Y-%m-%d %H:%M'
+
+RECURRENCE_INTERVALS = {'daily': timedelta(days=1), 'weekly': timedelta(weeks=1)}
+
+# Schedules of all locales by ID, loaded from the schedules files of the locales on startup
+_schedules = {}
+
+
+def get_schedules_path(locale: str, data_dir: str = 'data') -> str:
+	"""
+	Get the path of the file storing the scheduled sends of a locale.
+
+	Args:
+	    locale (str): The locale code, e.g. 'EN'
+	    data_dir (str): The directory containing the data files
+
+	Returns:
+	    str: The path of the file
+	"""
+	return os.path.join(data_dir, f'scheduled_sends_{locale}.json')
+
+
+def parse_schedule(text: str) -> tuple:
+	"""
+	Parse the time and recurrence of a schedule sent by an admin, e.g. '2025-06-01 03:00 daily'.
+
+	Args:
+	    text (str): The time in UTC as YYYY-MM-DD HH:MM, optionally followed by 'daily' or 'weekly'
+
+	Returns:
+	    tuple: The time to run at as an aware UTC datetime, and the recurrence or None
+
+	Raises:
+	    ValueError: If the text is not in the expected format or the time is in the past
+	"""
+	parts = text.split()
+	recurrence = None
+	if len(parts) == 3:
+		recurrence = parts.pop().lower()
+		if recurrence not in RECURRENCE_INTERVALS:
+			raise ValueError(f'Unknown recurrence {recurrence}')
+
+	run_at = datetime.strptime(' '.join(parts), TIME_FORMAT).replace(tzinfo=timezone.utc)
+	if run_at <= datetime.now(timezone.utc):
+		raise ValueError(f'{run_at} is in the past')
+
+	return run_at, recurrence
+
+
+def format_schedule_time(schedule: dict) -> str:
+	"""
+	Format the next run and the recurrence of a schedule for the admin.
+
+	Args:
+	    schedule (dict): The schedule
+
+	Returns:
+	    str: The time of the next run in UTC, e.g. '2025-06-01 03:00 UTC, repeated daily'
+	"""
+	text = SCHEDULE_TIME.format(
+		time=datetime.fromisoformat(schedule['run_at']).strftime(TIME_FORMAT)
+	)
+	if schedule['recurrence'] == 'daily':
+		text += SCHEDULE_REPEATED_DAILY
+	elif schedule['recurrence'] == 'weekly':
+		text += SCHEDULE_REPEATED_WEEKLY
+	return text
+
+
+def get_schedules() -> list:
+	"""
+	Get the scheduled sends of the current locale, the next one first.
+
+	Returns:
+	    list: The schedules
+	"""
+	locale = Config.get_locale().value
+	return sorted(
+		(schedule for schedule in _schedules.values() if schedule['locale'] == locale),
+		key=lambda schedule: schedule['run_at'],
+	)
+
+
+def _load(locale: str) -> dict:
+	path = get_schedules_path(locale)
+	if not os.path.exists(path):
+		return {}
+
+	with open(path, 'r', encoding='utf-8') as f:
+		return json.load(f)
+
+
+async def _save(locale: str) -> None:
+	# Each locale only writes its own schedules, so the bots of the locales can run in separate
+	# processes. Written from a copy, since the schedules keep changing on the event loop meanwhile.
+	schedules = {
+		schedule_id: schedule
+		for schedule_id, schedule in _schedules.items()
+		if schedule['locale'] == locale
+	}
+	await run_io(
+		atomic_write_json,
+		get_schedules_path(locale),
+		schedules,
+		indent=4,
+		ensure_ascii=False,
+	)
+
+
+def _get_next_run(schedule: dict, now: datetime) -> datetime:
+	run_at = datetime.fromisoformat(schedule['run_at'])
+	if schedule['recurrence'] is not None:
+		# Runs missed while the bot was down are skipped, except for the last one
+		interval = RECURRENCE_INTERVALS[schedule['recurrence']]
+		while run_at + interval <= now:
+			run_at += interval
+	return run_at
+
+
+def _register(job_queue: JobQueue, schedule: dict) -> None:
+	# Runs that were due while the bot was down start right away
+	run_at = max(
+		datetime.fromisoformat(schedule['run_at']), datetime.now(timezone.utc)
+	)
+	job_queue.run_once(
+		_run_scheduled_send,
+		when=run_at,
+		name=f'scheduled_send:{schedule["schedule_id"]}',
+		data=schedule['schedule_id'],
+	)
+
+
+async def _run_scheduled_send(context: CallbackContext) -> None:
+	schedule = _schedules.get(context.job.data)
+	if schedule is None:
+		return
+
+	with Config.use_locale(Locale(schedule['locale'])):
+		await _start_scheduled_send(context, schedule)
+
+
+async def _start_scheduled_send(context: CallbackContext, schedule: dict) -> None:
+	# The schedule is advanced before the send starts, so a crash right after starting it
+	# can't send the message twice. The campaign itself is checkpointed and resumes.
+	if schedule['recurrence'] is not None:
+		now = datetime.now(timezone.utc)
+		next_run = _get_next_run(schedule, now)
+		if next_run <= now:
+			next_run += RECURRENCE_INTERVALS[schedule['recurrence']]
+		schedule['run_at'] = next_run.isoformat()
+		_register(context.job_queue, schedule)
+	else:
+		del _schedules[schedule['schedule_id']]
+	await _save(schedule['locale'])
+
+	try:
+		segment = schedule['segment']
+		recipients = await async_storage.get_segment_recipients(
+			segment['category_id'], segment['steps'], segment['audience']
+		)
+		# Users who blocked the bot would only fail again and use up the rate limit
+		recipients, _ = await async_storage.split_unreachable_users(recipients)
+
+		progress_message = await context.bot.send_message(
+			schedule['admin_chat_id'],
+			BULK_SEND_SCHEDULED_STARTING.format(category=schedule['description']),
+		)
+		await bulk_campaigns.start_campaign(
+			context.bot,
+			schedule['description'],
+			recipients,
+			from_chat_id=schedule['from_chat_id'],
+			message_id=schedule['message_id'],
+			admin_chat_id=schedule['admin_chat_id'],
+			progress_message_id=progress_message.message_id,
+		)
+
+	except Exception:
+		logger.exception(f'Could not start scheduled send {schedule["schedule_id"]}')
+
+
+async def schedule_send(
+	job_queue: JobQueue,
+	segment: dict,
+	description: str,
+	from_chat_id,
+	message_id: int,
+	admin_chat_id,
+	run_at: datetime,
+	recurrence: Optional[str] = None,
+) -> dict:
+	"""
+	Store a scheduled send and register it with the job queue.
+
+	The recipients are looked up when the send runs, so a repeated send reaches the users who
+	are in the segment at that time.
+
+	Args:
+	    job_queue (JobQueue): The job queue of the application
+	    segment (dict): The 'category_id', segment 'steps' and 'audience' filters to send to
+	    description (str): The description of the segment, shown to the admin
+	    from_chat_id: The chat containing the message to send
+	    message_id (int): The message to copy to the recipients
+	    admin_chat_id: The chat of the admin who scheduled the send
+	    run_at (datetime): When to send, as an aware datetime
+	    recurrence (str, optional): 'daily' or 'weekly' to repeat the send, None to send once
+
+	Returns:
+	    dict: The stored schedule
+	"""
+	schedule = {
+		'schedule_id': uuid.uuid4().hex[:8],
+		'segment': segment,
+		'description': description,
+		'from_chat_id': from_chat_id,
+		'message_id': message_id,
+		'admin_chat_id': admin_chat_id,
+		'run_at': run_at.isoformat(),
+		'recurrence': recurrence,
+		'locale': Config.get_locale().value,
+	}
+	_schedules[schedule['schedule_id']] = schedule
+	await _save(schedule['locale'])
+	_register(job_queue, schedule)
+	return schedule
+
+
+async def cancel_schedule(job_queue: JobQueue, schedule_id: str) -> Optional[dict]:
+	"""
+	Remove a scheduled send of the current locale and its job.
+
+	Args:
+	    job_queue (JobQueue): The job queue of the application
+	    schedule_id (str): The ID of the schedule
+
+	Returns:
+	    dict: The removed schedule, or None if it doesn't exist
+	"""
+	schedule = _schedules.get(schedule_id)
+	# The jobs of the other locales are in the job queues of their bots
+	if schedule is None or schedule['locale'] != Config.get_locale().value:
+		return None
+
+	del _schedules[schedule_id]
+
+	for job in job_queue.get_jobs_by_name(f'scheduled_send:{schedule_id}'):
+		job.schedule_removal()
+	await _save(schedule['locale'])
+	return schedule
+
+
+async def restore_schedules(job_queue: JobQueue) -> list:
+	"""
+	Load the stored schedules of the current locale and register them with the job queue,
+	e.g. on startup.
+
+	Args:
+	    job_queue (JobQueue): The job queue of the application
+
+	Returns:
+	    list: The restored schedules
+	"""
+	locale = Config.get_locale().value
+	now = datetime.now(timezone.utc)
+
+	for schedule_id, schedule in (await run_io(_load, locale)).items():
+		schedule['run_at'] = _get_next_run(schedule, now).isoformat()
+		_schedules[schedule_id] = schedule
+		_register(job_queue, schedule)
+
+	return get_schedules()
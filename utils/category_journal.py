@@ -0,0 +1,166 @@
+"""
+Journaled category store for the bot.
+Appends every category change to a per-locale journal next to data/user_lists.json instead of
+rewriting the file, and periodically compacts the journal into a new snapshot of the file.
+"""
+
+import json
+import logging
+import os
+import shutil
+from typing import Optional
+
+from utils.category_store import USER_LISTS_FILE, CategoryStore
+from utils.config import Config
+from utils.persistence import WriteBehindFlusher
+
+logger = logging.getLogger(__name__)
+
+
+class JournaledCategoryStore(CategoryStore):
+	"""
+	Category store that writes changes to an append-only journal.
+
+	Each mutate() block appends one fsynced JSON line with the name of the action and the
+	changes it made. On startup the journals are replayed over the snapshot in user_lists.json.
+	Compaction writes a new snapshot and drops the journal records it contains. Records only
+	set the state of single memberships, so replaying records that already made it into the
+	snapshot, e.g. after a crash during compaction, leaves the categories unchanged.
+	"""
+
+	_instance: Optional['JournaledCategoryStore'] = None
+
+	def __init__(
+		self,
+		path: str = USER_LISTS_FILE,
+		compaction_interval: float = 300.0,
+		compaction_threshold: int = 10000,
+	):
+		self._journals = {}
+		super().__init__(path, compaction_interval, compaction_threshold)
+
+	@classmethod
+	def get_instance(cls) -> 'JournaledCategoryStore':
+		"""
+		Get the shared store, creating it on first use.
+
+		Returns:
+		    JournaledCategoryStore: The process-wide journaled category store
+		"""
+		if cls._instance is None:
+			cls._instance = cls(
+				compaction_interval=Config.get_compaction_interval(),
+				compaction_threshold=Config.get_compaction_threshold(),
+			)
+		return cls._instance
+
+	def _journal_path(self, locale: str) -> str:
+		return os.path.join(os.path.dirname(self.path), f'user_lists_{locale}.journal')
+
+	def _compacting_path(self, locale: str) -> str:
+		return self._journal_path(locale) + '.compacting'
+
+	def _replay(self, path: str, categories) -> int:
+		if not os.path.exists(path):
+			return 0
+
+		replayed = 0
+		valid_length = 0
+		with open(path, 'rb') as f:
+			for line in f:
+				try:
+					record = json.loads(line)
+				except json.JSONDecodeError:
+					# A torn write at the end of the journal from a crash mid-append
+					break
+
+				categories.apply_changes(record['changes'])
+				valid_length += len(line)
+				replayed += 1
+
+		# Drop the torn tail, so new records aren't appended after it
+		if valid_length != os.path.getsize(path):
+			logger.warning(f'Truncating incomplete record at the end of {path}')
+			with open(path, 'r+b') as f:
+				f.truncate(valid_length)
+
+		return replayed
+
+	def _load(self) -> dict:
+		locales = super()._load()
+
+		for locale, categories in locales.items():
+			# Records of a compaction that didn't finish come before the current journal
+			replayed = self._replay(self._compacting_path(locale), categories)
+			replayed += self._replay(self._journal_path(locale), categories)
+
+			if replayed:
+				logger.info(f'Replayed {replayed} journal records for locale {locale}')
+				self._dirty_locales.add(locale)
+				self._flusher.mark_dirty(replayed)
+
+		return locales
+
+	def _append(self, locale: str, record: dict) -> None:
+		journal = self._journals.get(locale)
+		if journal is None:
+			journal = open(self._journal_path(locale), 'ab')
+			self._journals[locale] = journal
+
+		journal.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+		journal.flush()
+		os.fsync(journal.fileno())
+
+	def _record(self, locale: str, action: str, changes: list) -> None:
+		# The changes of each mutate() block are appended as a single record
+		self._append(locale, {'action': action, 'changes': changes})
+		self._dirty_locales.add(locale)
+
+	def _rotate_journal(self, locale: str) -> None:
+		journal = self._journals.pop(locale, None)
+		if journal is not None:
+			journal.close()
+
+		journal_path = self._journal_path(locale)
+		compacting_path = self._compacting_path(locale)
+		if not os.path.exists(journal_path):
+			return
+
+		if os.path.exists(compacting_path):
+			# A previous compaction failed, keep its records ahead of the new ones
+			with open(journal_path, 'rb') as src, open(compacting_path, 'ab') as dst:
+				shutil.copyfileobj(src, dst)
+				dst.flush()
+				os.fsync(dst.fileno())
+			os.remove(journal_path)
+		else:
+			os.replace(journal_path, compacting_path)
+
+	def flush(self) -> None:
+		"""
+		Compact the journals of the changed locales into a new snapshot of the file.
+
+		The journals are moved aside under the lock, so changes made while the snapshot is
+		being written go to fresh journals. The moved journals are only deleted once the
+		snapshot has been written.
+		"""
+		with self._flush_lock:
+			with self._lock:
+				for locale in self._dirty_locales:
+					self._rotate_journal(locale)
+				compacted_locales = set(self._dirty_locales)
+
+			super().flush()
+
+			for locale in compacted_locales:
+				if os.path.exists(self._compacting_path(locale)):
+					os.remove(self._compacting_path(locale))
+
+	def close(self) -> None:
+		"""Stop the compaction thread, compacting any remaining journal records."""
+		super().close()
+
+		with self._lock:
+			for journal in self._journals.values():
+				journal.close()
+			self._journals.clear()
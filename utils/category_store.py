@@ -0,0 +1,468 @@
+"""
+In-memory category store for the bot.
+Loads data/user_lists.json once per process and keeps membership indexes for every locale,
+so category lookups no longer re-read and re-scan the file.
+"""
+
+import json
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+from utils.config import Config
+from utils.persistence import StaleVersionError, WriteBehindFlusher, atomic_write_json
+from utils.segments import SEGMENT_OPERATORS
+
+USER_LISTS_FILE = 'data/user_lists.json'
+
+# The INTERESTED category is the fallback for users who are not in any other category
+INTERESTED_CATEGORY_ID = '0'
+
+
+class LocaleCategories:
+	"""
+	Category membership for a single locale.
+
+	Each category's users are kept in a dict used as an insertion-ordered set, next to a
+	reverse index from user ID to the IDs of the categories containing that user and a
+	map from category label to category ID.
+	"""
+
+	def __init__(self, categories: dict):
+		self.labels = {}
+		self.positions = {}
+		self.members = {}
+		self.label_to_id = {}
+		self.user_categories = {}
+
+		# Version of each category, incremented by the store after every mutate() block that
+		# changed the category or its members
+		self.versions = {}
+
+		# When set to a list, every change is recorded in it as a
+		# ['c', category_id, label], ['+', category_id, user_id] or ['-', category_id, user_id] entry
+		self.changes: Optional[list] = None
+
+		for category_id, category in categories.items():
+			self._create_category(category_id, category['label'])
+			for user_id in category['users']:
+				self._add_member(category_id, user_id)
+
+	def _create_category(self, category_id: str, label: str) -> None:
+		self.labels[category_id] = label
+		self.positions[category_id] = len(self.positions)
+		self.members[category_id] = {}
+		# Labels are looked up first-match-wins, same as scanning the file in order
+		self.label_to_id.setdefault(label, category_id)
+		if self.changes is not None:
+			self.changes.append(['c', category_id, label])
+
+	def _add_member(self, category_id: str, user_id) -> bool:
+		if user_id in self.members[category_id]:
+			return False
+
+		self.members[category_id][user_id] = None
+		self.user_categories.setdefault(user_id, set()).add(category_id)
+		if self.changes is not None:
+			self.changes.append(['+', category_id, user_id])
+		return True
+
+	def _remove_member(self, category_id: str, user_id) -> bool:
+		if user_id not in self.members[category_id]:
+			return False
+
+		del self.members[category_id][user_id]
+		user_categories = self.user_categories[user_id]
+		user_categories.discard(category_id)
+		if not user_categories:
+			del self.user_categories[user_id]
+		if self.changes is not None:
+			self.changes.append(['-', category_id, user_id])
+		return True
+
+	def _in_non_interested_category(self, user_id) -> bool:
+		user_categories = self.user_categories.get(user_id)
+		if not user_categories:
+			return False
+		return len(user_categories) > 1 or INTERESTED_CATEGORY_ID not in user_categories
+
+	def _fall_back_to_interested(self, user_id) -> bool:
+		# Users left without any non-INTERESTED category go back to INTERESTED
+		if INTERESTED_CATEGORY_ID in self.members and not self._in_non_interested_category(
+			user_id
+		):
+			return self._add_member(INTERESTED_CATEGORY_ID, user_id)
+		return False
+
+	def apply_changes(self, changes: list) -> None:
+		"""
+		Apply changes recorded in the changes list, e.g. when replaying a journal.
+
+		Each change sets the state of a single category or membership, so applying changes
+		that are already reflected in the categories leaves them as they are.
+
+		Args:
+		    changes (list): The recorded changes to apply
+		"""
+		for kind, category_id, value in changes:
+			if kind == 'c':
+				if category_id not in self.labels:
+					self._create_category(category_id, value)
+			elif kind == '+':
+				self._add_member(category_id, value)
+			elif kind == '-':
+				self._remove_member(category_id, value)
+
+	def to_dict(self) -> dict:
+		"""
+		Serialize the categories back to the user_lists.json layout.
+
+		Returns:
+		    dict: Mapping of category ID to its label and list of users
+		"""
+		return {
+			category_id: {'label': label, 'users': list(self.members[category_id])}
+			for category_id, label in self.labels.items()
+		}
+
+	def get_category_id_list(self) -> list:
+		return list(self.labels.items())
+
+	def get_category_label(self, category_id: str) -> str:
+		return self.labels[category_id]
+
+	def get_users(self, category_id: str) -> list:
+		return list(self.members[category_id])
+
+	def get_segment_users(self, category_id: str, steps=()) -> list:
+		"""
+		Get the users of a segment combining categories with set operations.
+
+		Args:
+		    category_id (str): The category the segment starts from
+		    steps: (operator, category_id) pairs applied left to right, the operator being one
+		        of SEGMENT_OPERATORS
+
+		Returns:
+		    list: Every user in the segment once, in the order they were added to the categories
+
+		Raises:
+		    ValueError: If an operator is not one of SEGMENT_OPERATORS
+		"""
+		users = dict(self.members[category_id])
+		for operator, step_category_id in steps:
+			members = self.members[step_category_id]
+			if operator == 'UNION':
+				users.update(members)
+			elif operator == 'INTERSECT':
+				users = {user_id: None for user_id in users if user_id in members}
+			elif operator == 'EXCEPT':
+				users = {user_id: None for user_id in users if user_id not in members}
+			else:
+				raise ValueError(f'Unknown segment operator {operator}')
+		return list(users)
+
+	def get_categories_for_user(self, user_id) -> list:
+		category_ids = self.user_categories.get(user_id, ())
+		# Keep the same order the categories have in the file
+		return [
+			self.labels[category_id]
+			for category_id in sorted(category_ids, key=self.positions.__getitem__)
+		]
+
+	def is_user_in_category(self, user_id, category_label: str) -> bool:
+		category_id = self.label_to_id.get(category_label)
+		if category_id is None:
+			return False
+		return user_id in self.members[category_id]
+
+	def is_user_in_non_interested_category(self, user_id) -> bool:
+		return self._in_non_interested_category(user_id)
+
+	def add_user(
+		self, user_id, category_id: Optional[str] = None, category_label: Optional[str] = None
+	) -> None:
+		if category_id is not None:
+			target_category_id = str(category_id)
+			if target_category_id not in self.labels:
+				raise KeyError(f'Category {target_category_id} does not exist')
+
+		elif category_label is not None:
+			target_category_id = self.label_to_id.get(category_label)
+
+			# If no category with the given label exists, create a new one
+			if target_category_id is None:
+				target_category_id = str(len(self.labels))
+				self._create_category(target_category_id, category_label)
+
+		else:
+			raise ValueError('Either category_id or category_label must be provided')
+
+		# If adding to a non-INTERESTED category, remove from INTERESTED
+		if (
+			self._add_member(target_category_id, user_id)
+			and target_category_id != INTERESTED_CATEGORY_ID
+			and INTERESTED_CATEGORY_ID in self.members
+		):
+			self._remove_member(INTERESTED_CATEGORY_ID, user_id)
+
+	def remove_user(self, user_id, category_id: str) -> bool:
+		category_id = str(category_id)
+		if category_id not in self.members:
+			raise KeyError(f'Category {category_id} does not exist')
+
+		if not self._remove_member(category_id, user_id):
+			return False
+
+		if category_id != INTERESTED_CATEGORY_ID:
+			self._fall_back_to_interested(user_id)
+		return True
+
+	def set_users(self, category_id: str, user_list: list) -> dict:
+		if category_id not in self.members:
+			raise KeyError(f'Category {category_id} does not exist')
+
+		users = dict.fromkeys(user_list)
+		members = self.members[category_id]
+		removed_users = [user_id for user_id in members if user_id not in users]
+		for user_id in removed_users:
+			self._remove_member(category_id, user_id)
+
+		added = sum(self._add_member(category_id, user_id) for user_id in users)
+		return {
+			'added': added,
+			'already_present': len(users) - added,
+			'removed': len(removed_users),
+		}
+
+	def add_users(self, category_id: str, user_list: list) -> dict:
+		if category_id not in self.members:
+			raise KeyError(f'Category {category_id} does not exist')
+
+		users = dict.fromkeys(user_list)
+		added = sum(self._add_member(category_id, user_id) for user_id in users)
+
+		# Users added to any other category are no longer only INTERESTED
+		moved_out_of_interested = 0
+		if category_id != INTERESTED_CATEGORY_ID and INTERESTED_CATEGORY_ID in self.members:
+			moved_out_of_interested = sum(
+				self._remove_member(INTERESTED_CATEGORY_ID, user_id) for user_id in users
+			)
+
+		return {
+			'added': added,
+			'already_present': len(users) - added,
+			'moved_out_of_interested': moved_out_of_interested,
+		}
+
+	def remove_users(self, category_id: str, user_list: list) -> dict:
+		if category_id not in self.members:
+			raise KeyError(f'Category {category_id} does not exist')
+
+		users = dict.fromkeys(user_list)
+		removed_users = [
+			user_id for user_id in users if self._remove_member(category_id, user_id)
+		]
+
+		moved_to_interested = 0
+		if category_id != INTERESTED_CATEGORY_ID:
+			moved_to_interested = sum(
+				self._fall_back_to_interested(user_id) for user_id in removed_users
+			)
+
+		return {
+			'removed': len(removed_users),
+			'not_present': len(users) - len(removed_users),
+			'moved_to_interested': moved_to_interested,
+		}
+
+
+class CategoryStore:
+	"""
+	Process-wide store for the categories in data/user_lists.json.
+
+	The file is parsed once, the first time the store is used. Every locale in the file is
+	indexed. Changes are made in memory and written back by a write-behind flusher, which
+	coalesces them into one atomic write per flush. Writes only replace the sections of the
+	locales that were changed, since the bot instances for the other locales share the same file.
+	"""
+
+	_instance: Optional['CategoryStore'] = None
+
+	def __init__(
+		self,
+		path: str = USER_LISTS_FILE,
+		flush_interval: float = 5.0,
+		flush_threshold: int = 100,
+	):
+		self.path = path
+		self._locales: Optional[dict] = None
+		self._dirty_locales = set()
+		self._lock = threading.RLock()
+		self._flush_lock = threading.RLock()
+		self._flusher = WriteBehindFlusher(self.flush, flush_interval, flush_threshold)
+
+	@classmethod
+	def get_instance(cls) -> 'CategoryStore':
+		"""
+		Get the shared store, creating it on first use.
+
+		Returns:
+		    CategoryStore: The process-wide category store
+		"""
+		if cls._instance is None:
+			cls._instance = cls(
+				flush_interval=Config.get_flush_interval(),
+				flush_threshold=Config.get_flush_threshold(),
+			)
+		return cls._instance
+
+	@classmethod
+	def shutdown(cls) -> None:
+		"""Flush and close the shared store, if it was ever used."""
+		if cls._instance is not None:
+			cls._instance.close()
+
+	def _load(self) -> dict:
+		with open(self.path, 'r') as f:
+			user_lists = json.load(f)
+
+		return {
+			locale: LocaleCategories(categories)
+			for locale, categories in user_lists.items()
+		}
+
+	def locale(self, locale: str) -> LocaleCategories:
+		"""
+		Get the categories of a locale. They are changed by mutate() blocks on other threads, so
+		they must only be used while the store is locked, see read().
+
+		Args:
+		    locale (str): The locale code, e.g. 'EN'
+
+		Returns:
+		    LocaleCategories: The indexed categories of the locale
+		"""
+		if self._locales is None:
+			with self._lock:
+				if self._locales is None:
+					self._locales = self._load()
+
+		return self._locales[locale]
+
+	@contextmanager
+	def read(self, locale: str):
+		"""
+		Context manager for reading the categories of a locale.
+
+		The store is locked for the duration of the block, so no mutation changes the categories
+		while they are read. The block should copy what it needs and return quickly.
+
+		Args:
+		    locale (str): The locale code, e.g. 'EN'
+
+		Yields:
+		    LocaleCategories: The indexed categories of the locale
+		"""
+		with self._lock:
+			yield self.locale(locale)
+
+	def get_version(self, locale: str, category_id: str) -> int:
+		"""
+		Get the current version of a category of a locale.
+
+		Args:
+		    locale (str): The locale code, e.g. 'EN'
+		    category_id (str): The ID of the category
+
+		Returns:
+		    int: The version, incremented by every mutation that changed the category or its members
+		"""
+		with self._lock:
+			return self.locale(locale).versions.get(category_id, 0)
+
+	@contextmanager
+	def mutate(
+		self, locale: str, action: str = 'update', expected_versions: Optional[dict] = None
+	):
+		"""
+		Context manager for changing the categories of a locale.
+
+		The store is locked for the duration of the block, so the block is a single
+		read-modify-write. The versions of the categories the block changed are incremented, and
+		the locale is scheduled for writing when the block exits.
+
+		Args:
+		    locale (str): The locale code whose categories are changed
+		    action (str): The name of the change being made, e.g. 'add' or 'promo_code_join'
+		    expected_versions (dict, optional): Only make the change if these categories are still
+		        at these versions, by category ID, e.g. the version an admin confirmed the change
+		        against
+
+		Yields:
+		    LocaleCategories: The indexed categories of the locale
+
+		Raises:
+		    StaleVersionError: If a category is no longer at the expected version
+		"""
+		with self._lock:
+			categories = self.locale(locale)
+			for category_id, expected_version in (expected_versions or {}).items():
+				version = categories.versions.get(category_id, 0)
+				if version != expected_version:
+					raise StaleVersionError(
+						f'Category {category_id} of {locale} is at version {version}, '
+						f'expected {expected_version}'
+					)
+
+			categories.changes = []
+			try:
+				yield categories
+			finally:
+				changes = categories.changes
+				categories.changes = None
+
+				if changes:
+					for category_id in {change[1] for change in changes}:
+						categories.versions[category_id] = (
+							categories.versions.get(category_id, 0) + 1
+						)
+					self._record(locale, action, changes)
+
+		if changes:
+			self._flusher.mark_dirty()
+
+	def _record(self, locale: str, action: str, changes: list) -> None:
+		self._dirty_locales.add(locale)
+
+	def flush(self) -> None:
+		"""
+		Write the changed locales back to the file, leaving other locales as they are on disk.
+		"""
+		with self._flush_lock:
+			with self._lock:
+				dirty_locales = self._dirty_locales
+				self._dirty_locales = set()
+				snapshots = {
+					locale: self._locales[locale].to_dict() for locale in dirty_locales
+				}
+
+			if not snapshots:
+				return
+
+			try:
+				with open(self.path, 'r') as f:
+					user_lists = json.load(f)
+
+				user_lists.update(snapshots)
+				atomic_write_json(self.path, user_lists, indent=4)
+
+			except Exception:
+				# Put the locales back so the next flush writes them again
+				with self._lock:
+					self._dirty_locales.update(dirty_locales)
+				raise
+
+	def close(self) -> None:
+		"""Stop the write-behind flusher, writing any pending changes."""
+		self._flusher.close()
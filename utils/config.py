@@ -3,8 +3,10 @@ Configuration singleton for the bot.
 Handles locale settings and other global configurations.
 """
 
+from contextlib import contextmanager
+from contextvars import ContextVar
 from enum import Enum
-from typing import Optional
+from typing import Iterator, List, Optional
 import argparse
 
 
@@ -15,6 +17,25 @@ class Locale(Enum):
 	TR = 'TR'
 
 
+class Storage(Enum):
+	"""Supported storage backends for categories, user history and promo codes."""
+
+	JSON = 'json'
+	JOURNAL = 'journal'
+	SQLITE = 'sqlite'
+
+
+class Mode(Enum):
+	"""Supported ways of receiving updates from Telegram."""
+
+	POLLING = 'polling'
+	WEBHOOK = 'webhook'
+
+
+# The locale of the bot handling the current update, set for the tasks of each application
+_current_locale: ContextVar[Optional[Locale]] = ContextVar('current_locale', default=None)
+
+
 class Config:
 	"""
 	Singleton configuration class for the bot.
@@ -23,7 +44,22 @@ class Config:
 
 	_instance: Optional['Config'] = None
 	_initialized: bool = False
-	_locale: Locale = Locale.EN
+	_locales: List[Locale] = [Locale.EN]
+	_storage: Storage = Storage.JSON
+	_flush_interval: float = 5.0
+	_flush_threshold: int = 100
+	_compaction_interval: float = 300.0
+	_compaction_threshold: int = 10000
+	_config_ttl: float = 1.0
+	_io_workers: int = 4
+	_concurrent_updates: int = 16
+	_bulk_send_rate: float = 30.0
+	_bulk_send_concurrency: int = 20
+	_mode: Mode = Mode.POLLING
+	_port: int = 8443
+	_webhook_url: Optional[str] = None
+	_log_max_bytes: int = 10 * 1024 * 1024
+	_log_backup_count: int = 5
 
 	def __new__(cls) -> 'Config':
 		"""Ensure only one instance of Config exists."""
@@ -48,34 +84,432 @@ class Config:
 		parser.add_argument(
 			'--locale',
 			type=str,
-			default='EN',
+			nargs='+',
+			default=['EN'],
 			choices=['EN', 'TR'],
-			help='Locale to use (EN or TR)',
+			help='Locales to run (EN and/or TR), one bot per locale in the same process',
+		)
+		parser.add_argument(
+			'--storage',
+			type=str,
+			default='json',
+			choices=[storage.value for storage in Storage],
+			help='Storage backend for categories, user history and promo codes',
+		)
+		parser.add_argument(
+			'--flush-interval',
+			type=float,
+			default=cls._flush_interval,
+			help='Seconds between writes of changed data files',
+		)
+		parser.add_argument(
+			'--flush-threshold',
+			type=int,
+			default=cls._flush_threshold,
+			help='Number of pending changes that triggers an early write',
+		)
+		parser.add_argument(
+			'--compaction-interval',
+			type=float,
+			default=cls._compaction_interval,
+			help='Seconds between compactions of the category journal (journal storage only)',
+		)
+		parser.add_argument(
+			'--compaction-threshold',
+			type=int,
+			default=cls._compaction_threshold,
+			help='Number of journal records that triggers an early compaction (journal storage only)',
+		)
+		parser.add_argument(
+			'--config-ttl',
+			type=float,
+			default=cls._config_ttl,
+			help='Seconds between checks of the data and configuration files for changes',
+		)
+		parser.add_argument(
+			'--io-workers',
+			type=int,
+			default=cls._io_workers,
+			help='Number of threads doing storage I/O for the async handlers',
+		)
+		parser.add_argument(
+			'--concurrent-updates',
+			type=int,
+			default=cls._concurrent_updates,
+			help='Maximum number of updates processed at the same time (1 processes them one by one)',
+		)
+		parser.add_argument(
+			'--bulk-send-rate',
+			type=float,
+			default=cls._bulk_send_rate,
+			help='Maximum number of messages sent per second, shared by replies and bulk messages',
+		)
+		parser.add_argument(
+			'--bulk-send-concurrency',
+			type=int,
+			default=cls._bulk_send_concurrency,
+			help='Maximum number of bulk messages in flight at the same time',
+		)
+		parser.add_argument(
+			'--mode',
+			type=str,
+			default='polling',
+			choices=[mode.value for mode in Mode],
+			help='Receive updates by polling Telegram or through a webhook server',
+		)
+		parser.add_argument(
+			'--port',
+			type=int,
+			default=cls._port,
+			help='Port the webhook server listens on (webhook mode only)',
+		)
+		parser.add_argument(
+			'--webhook-url',
+			type=str,
+			default=None,
+			help='Public base URL of the webhook server to register with Telegram, e.g. '
+			'https://bot.example.com (webhook mode only, not registered if omitted)',
+		)
+		parser.add_argument(
+			'--log-max-bytes',
+			type=int,
+			default=cls._log_max_bytes,
+			help='Size in bytes at which the user interaction and error logs are rotated, '
+			'0 to never rotate them',
+		)
+		parser.add_argument(
+			'--log-backup-count',
+			type=int,
+			default=cls._log_backup_count,
+			help='Number of rotated log files kept per log',
 		)
 		args = parser.parse_args()
 		print(args)
 
 		try:
-			cls._locale = Locale(args.locale)
+			# Duplicates are dropped, the order is kept
+			cls._locales = list(dict.fromkeys(Locale(locale) for locale in args.locale))
 		except ValueError:
 			raise ValueError(f'Invalid locale: {args.locale}')
 
+		if args.flush_interval <= 0 or args.flush_threshold <= 0:
+			raise ValueError('Flush interval and threshold must be positive')
+
+		if args.compaction_interval <= 0 or args.compaction_threshold <= 0:
+			raise ValueError('Compaction interval and threshold must be positive')
+
+		if args.config_ttl < 0:
+			raise ValueError('Config TTL must not be negative')
+
+		if args.io_workers <= 0:
+			raise ValueError('Number of I/O workers must be positive')
+
+		if args.concurrent_updates <= 0:
+			raise ValueError('Number of concurrent updates must be positive')
+
+		if args.bulk_send_rate <= 0 or args.bulk_send_concurrency <= 0:
+			raise ValueError('Bulk send rate and concurrency must be positive')
+
+		if not 0 < args.port < 65536:
+			raise ValueError(f'Invalid port: {args.port}')
+
+		if args.log_max_bytes < 0 or args.log_backup_count < 0:
+			raise ValueError('Log size and backup count must not be negative')
+
+		cls._storage = Storage(args.storage)
+		cls._flush_interval = args.flush_interval
+		cls._flush_threshold = args.flush_threshold
+		cls._compaction_interval = args.compaction_interval
+		cls._compaction_threshold = args.compaction_threshold
+		cls._config_ttl = args.config_ttl
+		cls._io_workers = args.io_workers
+		cls._concurrent_updates = args.concurrent_updates
+		cls._bulk_send_rate = args.bulk_send_rate
+		cls._bulk_send_concurrency = args.bulk_send_concurrency
+		cls._mode = Mode(args.mode)
+		cls._port = args.port
+		cls._webhook_url = args.webhook_url.rstrip('/') if args.webhook_url else None
+		cls._log_max_bytes = args.log_max_bytes
+		cls._log_backup_count = args.log_backup_count
 		cls._initialized = True
 
 	@classmethod
 	def get_locale(cls) -> Locale:
 		"""
-		Get the current locale setting.
+		Get the locale of the bot handling the current update.
+
+		Outside of the tasks of a bot, e.g. in scripts, this is the first locale selected at
+		startup.
+
+		Returns:
+		    The current locale
+
+		Raises:
+		    RuntimeError: If Config hasn't been initialized
+		"""
+		if not cls._initialized:
+			raise RuntimeError('Config must be initialized before use')
+		current_locale = _current_locale.get()
+		return current_locale if current_locale is not None else cls._locales[0]
+
+	@classmethod
+	def get_locales(cls) -> List[Locale]:
+		"""
+		Get the locales selected at startup, one bot is run for each of them.
+
+		Returns:
+		    The selected locales
+
+		Raises:
+		    RuntimeError: If Config hasn't been initialized
+		"""
+		if not cls._initialized:
+			raise RuntimeError('Config must be initialized before use')
+		return list(cls._locales)
+
+	@classmethod
+	@contextmanager
+	def use_locale(cls, locale: Locale) -> Iterator[None]:
+		"""
+		Context manager making a locale the current one.
+
+		Tasks created inside the block keep the locale after the block exits, so the tasks of
+		a bot are started inside it.
+
+		Args:
+		    locale: The locale to use
+		"""
+		token = _current_locale.set(locale)
+		try:
+			yield
+		finally:
+			_current_locale.reset(token)
+
+	@classmethod
+	def get_storage(cls) -> Storage:
+		"""
+		Get the storage backend selected at startup.
+
+		Returns:
+		    The selected storage backend
+
+		Raises:
+		    RuntimeError: If Config hasn't been initialized
+		"""
+		if not cls._initialized:
+			raise RuntimeError('Config must be initialized before use')
+		return cls._storage
+
+	@classmethod
+	def get_flush_interval(cls) -> float:
+		"""
+		Get the interval between write-behind flushes of the data files.
+
+		Returns:
+		    The flush interval in seconds
+
+		Raises:
+		    RuntimeError: If Config hasn't been initialized
+		"""
+		if not cls._initialized:
+			raise RuntimeError('Config must be initialized before use')
+		return cls._flush_interval
+
+	@classmethod
+	def get_flush_threshold(cls) -> int:
+		"""
+		Get the number of pending changes that triggers an early flush of the data files.
+
+		Returns:
+		    The flush threshold
+
+		Raises:
+		    RuntimeError: If Config hasn't been initialized
+		"""
+		if not cls._initialized:
+			raise RuntimeError('Config must be initialized before use')
+		return cls._flush_threshold
+
+	@classmethod
+	def get_compaction_interval(cls) -> float:
+		"""
+		Get the interval between compactions of the category journal.
+
+		Returns:
+		    The compaction interval in seconds
+
+		Raises:
+		    RuntimeError: If Config hasn't been initialized
+		"""
+		if not cls._initialized:
+			raise RuntimeError('Config must be initialized before use')
+		return cls._compaction_interval
+
+	@classmethod
+	def get_compaction_threshold(cls) -> int:
+		"""
+		Get the number of journal records that triggers an early compaction.
+
+		Returns:
+		    The compaction threshold
+
+		Raises:
+		    RuntimeError: If Config hasn't been initialized
+		"""
+		if not cls._initialized:
+			raise RuntimeError('Config must be initialized before use')
+		return cls._compaction_threshold
+
+	@classmethod
+	def get_config_ttl(cls) -> float:
+		"""
+		Get the interval between checks of the data and configuration files for changes.
+
+		Returns:
+		    The config TTL in seconds
+
+		Raises:
+		    RuntimeError: If Config hasn't been initialized
+		"""
+		if not cls._initialized:
+			raise RuntimeError('Config must be initialized before use')
+		return cls._config_ttl
+
+	@classmethod
+	def get_io_workers(cls) -> int:
+		"""
+		Get the number of threads doing storage I/O for the async handlers.
+
+		Returns:
+		    The number of I/O worker threads
+
+		Raises:
+		    RuntimeError: If Config hasn't been initialized
+		"""
+		if not cls._initialized:
+			raise RuntimeError('Config must be initialized before use')
+		return cls._io_workers
+
+	@classmethod
+	def get_concurrent_updates(cls) -> int:
+		"""
+		Get the maximum number of updates processed at the same time.
+
+		Returns:
+		    The maximum number of concurrent updates
+
+		Raises:
+		    RuntimeError: If Config hasn't been initialized
+		"""
+		if not cls._initialized:
+			raise RuntimeError('Config must be initialized before use')
+		return cls._concurrent_updates
+
+	@classmethod
+	def get_bulk_send_rate(cls) -> float:
+		"""
+		Get the maximum number of messages sent per second. Replies and bulk messages share
+		this rate, and replies go first.
+
+		Returns:
+		    The send rate in messages per second
+
+		Raises:
+		    RuntimeError: If Config hasn't been initialized
+		"""
+		if not cls._initialized:
+			raise RuntimeError('Config must be initialized before use')
+		return cls._bulk_send_rate
+
+	@classmethod
+	def get_bulk_send_concurrency(cls) -> int:
+		"""
+		Get the maximum number of bulk messages in flight at the same time.
+
+		Returns:
+		    The bulk send concurrency
+
+		Raises:
+		    RuntimeError: If Config hasn't been initialized
+		"""
+		if not cls._initialized:
+			raise RuntimeError('Config must be initialized before use')
+		return cls._bulk_send_concurrency
+
+	@classmethod
+	def get_mode(cls) -> Mode:
+		"""
+		Get the way updates are received from Telegram.
+
+		Returns:
+		    The selected mode
+
+		Raises:
+		    RuntimeError: If Config hasn't been initialized
+		"""
+		if not cls._initialized:
+			raise RuntimeError('Config must be initialized before use')
+		return cls._mode
+
+	@classmethod
+	def get_port(cls) -> int:
+		"""
+		Get the port the webhook server listens on.
+
+		Returns:
+		    The port
+
+		Raises:
+		    RuntimeError: If Config hasn't been initialized
+		"""
+		if not cls._initialized:
+			raise RuntimeError('Config must be initialized before use')
+		return cls._port
+
+	@classmethod
+	def get_webhook_url(cls) -> Optional[str]:
+		"""
+		Get the public base URL of the webhook server, without a trailing slash.
+
+		Returns:
+		    The URL, or None if the webhooks aren't registered by the bot
+
+		Raises:
+		    RuntimeError: If Config hasn't been initialized
+		"""
+		if not cls._initialized:
+			raise RuntimeError('Config must be initialized before use')
+		return cls._webhook_url
+
+	@classmethod
+	def get_log_max_bytes(cls) -> int:
+		"""
+		Get the size at which the user interaction and error logs are rotated.
+
+		Returns:
+		    The size in bytes, 0 if the logs are never rotated
+
+		Raises:
+		    RuntimeError: If Config hasn't been initialized
+		"""
+		if not cls._initialized:
+			raise RuntimeError('Config must be initialized before use')
+		return cls._log_max_bytes
+
+	@classmethod
+	def get_log_backup_count(cls) -> int:
+		"""
+		Get the number of rotated log files kept per log.
 
 		Returns:
-		    The current locale setting
+		    The number of backups
 
 		Raises:
 		    RuntimeError: If Config hasn't been initialized
 		"""
 		if not cls._initialized:
 			raise RuntimeError('Config must be initialized before use')
-		return cls._locale
+		return cls._log_backup_count
 
 	def __setattr__(self, name: str, value: any) -> None:
 		"""Prevent modification of attributes after initialization."""
@@ -0,0 +1,165 @@
+"""
+Cached loader for the bot's static data and configuration files.
+Parsed contents are kept in memory and only re-parsed when the file's modification time or
+size changes, so edits still apply without a restart.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+from dotenv import dotenv_values
+
+from utils.config import Config
+
+
+class CachedFile:
+	"""
+	A file whose parsed contents are cached in memory.
+
+	The file is revalidated with a stat() call at most once per TTL, and re-parsed only when its
+	modification time or size has changed since it was last parsed.
+	"""
+
+	def __init__(self, path: str, parser: Callable[[str], object], ttl: float):
+		self.path = path
+		self._parser = parser
+		self._ttl = ttl
+		self._signature: Optional[tuple] = None
+		self._value = None
+		self._checked_at = float('-inf')
+		self._lock = threading.Lock()
+		self._derived = {}
+
+	def get(self):
+		"""
+		Get the parsed contents of the file, re-parsing it if it changed.
+
+		Returns:
+		    The parsed contents. They are shared between callers and must not be modified.
+
+		Raises:
+		    FileNotFoundError: If the file doesn't exist
+		"""
+		now = time.monotonic()
+		if now - self._checked_at < self._ttl:
+			return self._value
+
+		with self._lock:
+			stat = os.stat(self.path)
+			signature = (stat.st_mtime_ns, stat.st_size)
+
+			if signature != self._signature:
+				self._value = self._parser(self.path)
+				self._signature = signature
+
+			self._checked_at = now
+			return self._value
+
+	def derive(self, builder: Callable[[object], object]):
+		"""
+		Get a value computed from the parsed contents, rebuilt only when the file changes.
+
+		Args:
+		    builder: Function computing the derived value from the parsed contents
+
+		Returns:
+		    The derived value. It is shared between callers and must not be modified.
+		"""
+		value = self.get()
+		derived = self._derived.get(builder)
+		if derived is None or derived[0] is not value:
+			derived = (value, builder(value))
+			self._derived[builder] = derived
+		return derived[1]
+
+	def invalidate(self) -> None:
+		"""Force the file to be re-parsed the next time it is read."""
+		with self._lock:
+			self._signature = None
+			self._checked_at = float('-inf')
+
+
+def _parse_json(path: str):
+	with open(path, 'r', encoding='utf-8') as f:
+		return json.load(f)
+
+
+_cached_files = {}
+_cached_files_lock = threading.Lock()
+
+
+def _get_cached_file(path: str, parser: Callable[[str], object]) -> CachedFile:
+	key = (path, parser)
+	cached_file = _cached_files.get(key)
+	if cached_file is None:
+		with _cached_files_lock:
+			cached_file = _cached_files.setdefault(
+				key, CachedFile(path, parser, Config.get_config_ttl())
+			)
+	return cached_file
+
+
+def load_json(path: str):
+	"""
+	Load a JSON file through the cache.
+
+	Args:
+	    path (str): The JSON file to load
+
+	Returns:
+	    The parsed JSON data. It is shared between callers and must not be modified.
+
+	Raises:
+	    FileNotFoundError: If the file doesn't exist
+	    json.JSONDecodeError: If the file is not valid JSON
+	"""
+	return _get_cached_file(path, _parse_json).get()
+
+
+def load_json_derived(path: str, builder: Callable[[object], object]):
+	"""
+	Get a value computed from a JSON file, rebuilt only when the file changes.
+
+	Args:
+	    path (str): The JSON file to load
+	    builder: Function computing the derived value from the parsed JSON data
+
+	Returns:
+	    The derived value. It is shared between callers and must not be modified.
+
+	Raises:
+	    FileNotFoundError: If the file doesn't exist
+	    json.JSONDecodeError: If the file is not valid JSON
+	"""
+	return _get_cached_file(path, _parse_json).derive(builder)
+
+
+def load_env(path: str) -> dict:
+	"""
+	Load a dotenv file through the cache.
+
+	Args:
+	    path (str): The dotenv file to load
+
+	Returns:
+	    dict: The variables in the file. They are shared between callers and must not be modified.
+
+	Raises:
+	    FileNotFoundError: If the file doesn't exist
+	"""
+	return _get_cached_file(path, dotenv_values).get()
+
+
+def invalidate(path: str) -> None:
+	"""
+	Force a file to be re-parsed the next time it is loaded.
+
+	Args:
+	    path (str): The file to invalidate
+	"""
+	for (cached_path, _), cached_file in list(_cached_files.items()):
+		if cached_path == path:
+			cached_file.invalidate()
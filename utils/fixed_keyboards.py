@@ -1,41 +1,67 @@
 """
 Keyboard management module for the bot.
 Contains localized keyboards for user messages and English-only keyboards for admin messages.
-All keyboards are exposed as module-level variables.
+Admin keyboards are exposed as module-level variables. Localized keyboards are looked up in the
+locale of the current bot on every access, so they have to be read as attributes of the module,
+e.g. `fixed_keyboards.MAIN_MENU`.
 """
 
 from telegram import InlineKeyboardMarkup, InlineKeyboardButton
 from utils.config import Config
+from utils.segments import SEGMENT_OPERATORS
 from utils.utilities import get_signals_for_type
 from utils.keyboard_constants import (
 	EN_KEYBOARDS,
 	TR_KEYBOARDS,
 	ADMIN_KEYBOARDS,
+	ADMIN_BUTTONS,
 	EN_BUTTONS,
 	TR_BUTTONS,
 )
 
-# Get current locale
-locale = Config.get_locale().value
-
-# Import localized keyboards based on current locale
-keyboards = EN_KEYBOARDS if locale == 'EN' else TR_KEYBOARDS
-button_labels = EN_BUTTONS if locale == 'EN' else TR_BUTTONS
-
-# Expose all localized keyboards as module-level variables
-for name, value in keyboards.items():
-	globals()[name] = value
+LOCALIZED_KEYBOARDS = {'EN': EN_KEYBOARDS, 'TR': TR_KEYBOARDS}
+LOCALIZED_BUTTONS = {'EN': EN_BUTTONS, 'TR': TR_BUTTONS}
 
 # Expose all admin keyboards as module-level variables
 for name, value in ADMIN_KEYBOARDS.items():
 	globals()[name] = value
 
 
+def __getattr__(name: str) -> InlineKeyboardMarkup:
+	# Only called for names that aren't module-level variables, i.e. the localized keyboards
+	keyboards = LOCALIZED_KEYBOARDS[Config.get_locale().value]
+	if name in keyboards:
+		return keyboards[name]
+	raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def get_button_labels() -> dict:
+	"""
+	Get the button labels of the current locale.
+
+	Returns:
+	    dict: The button labels by name
+	"""
+	return LOCALIZED_BUTTONS[Config.get_locale().value]
+
+
+def create_categories_keyboard(category_id_list: list) -> InlineKeyboardMarkup:
+	# Built from the (category ID, label) pairs of the current categories, which the handlers
+	# look up on the I/O threads, so categories added since the start are listed
+	return InlineKeyboardMarkup(
+		[
+			[InlineKeyboardButton(user_category_label, callback_data=user_category_id)]
+			for user_category_id, user_category_label in category_id_list
+		]
+	)
+
+
 def create_sample_signals_pair_select_keyboard(
 	signal_type: str,
 ) -> InlineKeyboardMarkup:
 	# Dynamically generate the keyboard based on the signal type
 	signal_list = get_signals_for_type(signal_type)
+	button_labels = get_button_labels()
 	keyboard = InlineKeyboardMarkup(
 		[
 			[
@@ -69,3 +95,113 @@ def create_sample_signals_pair_select_keyboard(
 	)
 
 	return keyboard
+
+
+def create_bulk_send_confirmation_keyboard(
+	unreachable_count: int,
+) -> InlineKeyboardMarkup:
+	# The segment buttons combine the selected categories with another one. Confirming skips
+	# the unreachable users, and the extra button sends to them as well.
+	keyboard = [
+		[
+			InlineKeyboardButton(ADMIN_BUTTONS['YES'], callback_data='CONFIRM'),
+			InlineKeyboardButton(ADMIN_BUTTONS['NO'], callback_data='CANCEL'),
+		],
+		[
+			InlineKeyboardButton(
+				text=ADMIN_BUTTONS[f'SEGMENT_{operator}'],
+				callback_data=f'SEGMENT_{operator}',
+			)
+			for operator in SEGMENT_OPERATORS
+		],
+		[
+			InlineKeyboardButton(
+				text=ADMIN_BUTTONS['AUDIENCE_FILTER'], callback_data='AUDIENCE_FILTER'
+			)
+		],
+		[
+			InlineKeyboardButton(
+				text=ADMIN_BUTTONS['SCHEDULE_BULK_SEND'],
+				callback_data='SCHEDULE_BULK_SEND',
+			)
+		],
+	]
+
+	if unreachable_count:
+		keyboard.append(
+			[
+				InlineKeyboardButton(
+					text=ADMIN_BUTTONS['INCLUDE_UNREACHABLE'].format(
+						count=unreachable_count
+					),
+					callback_data='CONFIRM_INCLUDE_UNREACHABLE',
+				)
+			]
+		)
+
+	return InlineKeyboardMarkup(keyboard)
+
+
+def create_audience_filter_keyboard(language_counts: dict) -> InlineKeyboardMarkup:
+	# Join date ranges first, then the languages of the history, most common first
+	languages = sorted(language_counts.items(), key=lambda item: -item[1])
+	return InlineKeyboardMarkup(
+		[
+			[
+				InlineKeyboardButton(
+					text=ADMIN_BUTTONS['JOINED_WITHIN'].format(days=days),
+					callback_data=f'AUDIENCE_JOINED:{days}',
+				)
+			]
+			for days in (7, 30, 90)
+		]
+		+ [
+			[
+				InlineKeyboardButton(
+					text=ADMIN_BUTTONS['LANGUAGE'].format(language=language, count=count),
+					callback_data=f'AUDIENCE_LANGUAGE:{language}',
+				)
+				for language, count in languages[row : row + 3]
+			]
+			for row in range(0, min(len(languages), 12), 3)
+		]
+		+ [[InlineKeyboardButton(ADMIN_BUTTONS['CANCEL'], callback_data='CANCEL')]]
+	)
+
+
+def create_scheduled_sends_keyboard(schedules: list) -> InlineKeyboardMarkup:
+	# One button per (schedule ID, description, time) to cancel it, then back to the main menu
+	return InlineKeyboardMarkup(
+		[
+			[
+				InlineKeyboardButton(
+					text=ADMIN_BUTTONS['UNSCHEDULE_BULK_SEND'].format(
+						category=description, time=time
+					),
+					callback_data=f'UNSCHEDULE_BULK_SEND:{schedule_id}',
+				)
+			]
+			for schedule_id, description, time in schedules
+		]
+		+ [
+			[
+				InlineKeyboardButton(
+					ADMIN_BUTTONS['MAIN_MENU'], callback_data='RETURN_TO_MAIN_MENU'
+				)
+			]
+		]
+	)
+
+
+def create_bulk_send_progress_keyboard(campaign_id: str) -> InlineKeyboardMarkup:
+	# The progress message of a running bulk send only offers to stop it
+	return InlineKeyboardMarkup(
+		[
+			[
+				InlineKeyboardButton(
+					text=ADMIN_BUTTONS['STOP_BULK_SEND'],
+					callback_data=f'STOP_BULK_SEND:{campaign_id}',
+				)
+			]
+		]
+	)
@@ -5,8 +5,6 @@ User keyboards are localized (EN/TR), admin keyboards are English-only.
 
 from telegram import InlineKeyboardMarkup, InlineKeyboardButton
 
-from utils.utilities import get_category_id_list
-
 # User Buttons (Localized)
 EN_BUTTONS = {  # Main Menu
     "OFFERS": "💰 CAN VIP offers",
@@ -100,6 +98,8 @@ ADMIN_BUTTONS = {
     "REMOVE_FROM_CATEGORY": "➖ Remove from category list",
     "BULK_SEND": "📨 Bulk message to category",
     "EXPORT_HISTORY": "📊 Export user history",
+    "EXPORT_UNREACHABLE": "🚫 Export unreachable users",
+    "SCHEDULED_SENDS": "⏰ Scheduled bulk messages",
     "EXPORT_LOGS": "📝 Export logs",
     "SEND_USER_LOGS": "📋 Send user panel logs",
     "CLEAR_USER_LOGS": "🗑️ Clear user panel logs",
@@ -109,6 +109,16 @@ ADMIN_BUTTONS = {
     "NO": "❌ Cancel",
     "CANCEL": "❌ Cancel",
     "MAIN_MENU": "🔙 Main menu",  # Added for admin panel
+    "STOP_BULK_SEND": "🛑 Stop sending",
+    "SEGMENT_UNION": "➕ Add category",
+    "SEGMENT_INTERSECT": "✖️ Intersect",
+    "SEGMENT_EXCEPT": "➖ Exclude category",
+    "AUDIENCE_FILTER": "🎯 Filter by join date or language",
+    "JOINED_WITHIN": "🕒 Joined in the last {days} days",
+    "LANGUAGE": "🌐 {language} ({count})",
+    "SCHEDULE_BULK_SEND": "⏰ Schedule for later",
+    "UNSCHEDULE_BULK_SEND": "🗑️ {category}: {time}",
+    "INCLUDE_UNREACHABLE": "📨 Yes, including unreachable users ({count})",
 }
 
 # User Keyboards (Localized)
@@ -665,12 +675,20 @@ ADMIN_KEYBOARDS = {
             [
                 InlineKeyboardButton(
                     ADMIN_BUTTONS["BULK_SEND"], callback_data="START_BULK_SEND"
-                )
+                ),
+                InlineKeyboardButton(
+                    ADMIN_BUTTONS["SCHEDULED_SENDS"],
+                    callback_data="SHOW_SCHEDULED_SENDS",
+                ),
             ],
             [
                 InlineKeyboardButton(
                     ADMIN_BUTTONS["EXPORT_HISTORY"], callback_data="EXPORT_HISTORY"
-                )
+                ),
+                InlineKeyboardButton(
+                    ADMIN_BUTTONS["EXPORT_UNREACHABLE"],
+                    callback_data="EXPORT_UNREACHABLE",
+                ),
             ],
             [
                 InlineKeyboardButton(
@@ -687,12 +705,6 @@ ADMIN_KEYBOARDS = {
             ],
         ]
     ),
-    "CATEGORIES": InlineKeyboardMarkup(
-        [
-            [InlineKeyboardButton(user_category_label, callback_data=user_category_id)]
-            for user_category_id, user_category_label in get_category_id_list()
-        ]
-    ),
     # Add common admin keyboards
     "ADMIN_CONFIRMATION": InlineKeyboardMarkup(
         [
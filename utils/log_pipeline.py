@@ -0,0 +1,255 @@
+"""
+Logging pipeline for the user interaction and user panel error logs.
+The handlers only put the records in a queue. A background thread writes them to
+logs/user_interactions_<locale>.log and logs/user_panel_errors_<locale>.log in batches, and
+rotates the files when they grow past --log-max-bytes, so logging never blocks the event loop.
+"""
+
+import logging
+import os
+import queue
+import threading
+from logging.handlers import QueueHandler, RotatingFileHandler
+from typing import Dict, List, Optional
+
+from utils.config import Config
+
+LOGS_DIR = 'logs'
+
+# Maximum number of records written before the files are flushed
+MAX_BATCH_SIZE = 500
+
+INTERACTIONS_FORMAT = '%(message)s'
+ERRORS_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+# Same format as the console output of the bot, see main.py
+CONSOLE_FORMAT = '%(message)s'
+
+
+def get_user_interactions_logger_name(locale: str) -> str:
+	"""
+	Get the name of the logger of the user interactions of a locale.
+
+	Args:
+	    locale (str): The locale code, e.g. 'EN'
+
+	Returns:
+	    str: The logger name
+	"""
+	return f'user_interactions_{locale}'
+
+
+def get_user_panel_errors_logger_name(locale: str) -> str:
+	"""
+	Get the name of the logger of the user panel errors of a locale.
+
+	Args:
+	    locale (str): The locale code, e.g. 'EN'
+
+	Returns:
+	    str: The logger name
+	"""
+	return f'user_panel_errors_{locale}'
+
+
+def get_log_file(logger_name: str) -> str:
+	"""
+	Get the file the records of a logger are written to.
+
+	Args:
+	    logger_name (str): The name of the logger, e.g. 'user_panel_errors_EN'
+
+	Returns:
+	    str: The path of the log file, e.g. 'logs/user_panel_errors_EN.log'
+	"""
+	return os.path.join(LOGS_DIR, f'{logger_name}.log')
+
+
+class _BatchedRotatingFileHandler(RotatingFileHandler):
+	"""
+	Rotating file handler that is flushed, and checked for rotation, once per batch of records
+	instead of after every record.
+
+	The file is rotated before the first record of a batch is written, so the current log file
+	always holds the latest records.
+	"""
+
+	def __init__(self, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self._rollover_checked = False
+
+	def emit(self, record: logging.LogRecord) -> None:
+		if not self._rollover_checked:
+			self._rollover_checked = True
+			# The file was flushed after the last batch, so its position is its size
+			if (
+				self.maxBytes > 0
+				and self.stream is not None
+				and self.stream.tell() >= self.maxBytes
+			):
+				self.doRollover()
+
+		# Skips the size check of RotatingFileHandler, which flushes the file on every record
+		logging.FileHandler.emit(self, record)
+
+	def flush(self) -> None:
+		# Called by emit for every record, the background thread calls flush_batch instead
+		pass
+
+	def flush_batch(self) -> None:
+		"""Write the buffered records of the batch to the file."""
+		with self.lock:
+			self._rollover_checked = False
+			if self.stream is not None:
+				self.stream.flush()
+
+
+class _BatchWriter:
+	"""
+	Background thread taking all the records waiting in the queue at once, passing them to the
+	handlers, and flushing the files after each batch.
+	"""
+
+	# Put in the queue by stop, the thread returns once the records before it are written
+	_SENTINEL = None
+
+	def __init__(self, log_queue: queue.SimpleQueue, handlers: List[logging.Handler]):
+		self.queue = log_queue
+		self.handlers = handlers
+		self._thread: Optional[threading.Thread] = None
+
+	def start(self) -> None:
+		"""Start the background thread."""
+		self._thread = threading.Thread(target=self._run, name='log_pipeline', daemon=True)
+		self._thread.start()
+
+	def stop(self) -> None:
+		"""Write the records still in the queue and wait for the background thread to end."""
+		self.queue.put(self._SENTINEL)
+		self._thread.join()
+		self._thread = None
+
+	def _run(self) -> None:
+		while True:
+			batch = [self.queue.get()]
+			while len(batch) < MAX_BATCH_SIZE and batch[-1] is not self._SENTINEL:
+				try:
+					batch.append(self.queue.get_nowait())
+				except queue.Empty:
+					break
+
+			for record in batch:
+				if record is not self._SENTINEL:
+					for handler in self.handlers:
+						handler.handle(record)
+
+			for handler in self.handlers:
+				if isinstance(handler, _BatchedRotatingFileHandler):
+					handler.flush_batch()
+				else:
+					handler.flush()
+
+			if batch[-1] is self._SENTINEL:
+				return
+
+
+_writer: Optional[_BatchWriter] = None
+_loggers: List[logging.Logger] = []
+_file_handlers: Dict[str, _BatchedRotatingFileHandler] = {}
+
+
+def start() -> None:
+	"""
+	Route the user interaction and user panel error logs of every locale through the queue and
+	start writing them. Called once at startup, before the bots handle any update.
+
+	The records are also written to the console by the background thread, so the loggers
+	don't propagate to the root logger while the pipeline runs.
+	"""
+	global _writer
+	if _writer is not None:
+		return
+
+	os.makedirs(LOGS_DIR, exist_ok=True)
+
+	log_queue = queue.SimpleQueue()
+	console_handler = logging.StreamHandler()
+	console_handler.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+	handlers = [console_handler]
+
+	for locale in Config.get_locales():
+		for logger_name, log_format in (
+			(get_user_interactions_logger_name(locale.value), INTERACTIONS_FORMAT),
+			(get_user_panel_errors_logger_name(locale.value), ERRORS_FORMAT),
+		):
+			# Opened on the first record, so no empty files are created
+			file_handler = _BatchedRotatingFileHandler(
+				get_log_file(logger_name),
+				maxBytes=Config.get_log_max_bytes(),
+				backupCount=Config.get_log_backup_count(),
+				encoding='utf-8',
+				delay=True,
+			)
+			file_handler.setFormatter(logging.Formatter(log_format))
+			# The background thread passes every record to every handler
+			file_handler.addFilter(logging.Filter(logger_name))
+			handlers.append(file_handler)
+			_file_handlers[logger_name] = file_handler
+
+			logger = logging.getLogger(logger_name)
+			logger.setLevel(logging.INFO)
+			logger.addHandler(QueueHandler(log_queue))
+			logger.propagate = False
+			_loggers.append(logger)
+
+	_writer = _BatchWriter(log_queue, handlers)
+	_writer.start()
+
+
+def stop() -> None:
+	"""
+	Write the records still in the queue and close the log files. Called once on shutdown,
+	later records are only written to the console.
+	"""
+	global _writer
+	if _writer is None:
+		return
+
+	for logger in _loggers:
+		for handler in list(logger.handlers):
+			if isinstance(handler, QueueHandler):
+				logger.removeHandler(handler)
+		logger.propagate = True
+	_loggers.clear()
+
+	_writer.stop()
+	for handler in _writer.handlers:
+		handler.close()
+	_file_handlers.clear()
+	_writer = None
+
+
+def truncate_log(logger_name: str) -> None:
+	"""
+	Empty the log file of a logger. Blocks on the file, so it's run on the I/O threads.
+
+	While the pipeline runs, the file is truncated through its handler, under the lock the
+	background thread holds while writing a record, so the open stream keeps writing at the
+	start of the emptied file.
+
+	Args:
+	    logger_name (str): The name of the logger, e.g. 'user_panel_errors_EN'
+	"""
+	handler = _file_handlers.get(logger_name)
+	if handler is None:
+		open(get_log_file(logger_name), 'w').close()
+		return
+
+	handler.acquire()
+	try:
+		if handler.stream is not None:
+			handler.stream.seek(0)
+			handler.stream.truncate()
+		else:
+			open(handler.baseFilename, 'w').close()
+	finally:
+		handler.release()
@@ -0,0 +1,207 @@
+"""
+One-shot migration of the JSON data files to the SQLite storage backend.
+
+Copies data/user_lists.json, the user history (data/user_history_<locale>.jsonl, or the older
+data/user_history.json), data/promo_codes.json and the unreachable users
+(data/unreachable_users_<locale>.jsonl) into the database used by
+`python main.py --storage sqlite`, then verifies the row counts of every table against the
+source files.
+
+Usage:
+    python -m utils.migrate_to_sqlite [--data-dir data] [--database data/bot.db] [--overwrite]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from utils.sqlite_store import DATABASE_FILE, connect
+from utils.reachability import get_unreachable_path, read_unreachable_file
+from utils.user_history import get_history_path, read_history_file
+
+
+def load_json(path: str, default):
+	"""
+	Load a JSON file, falling back to a default if it doesn't exist.
+
+	Args:
+	    path (str): The file to load
+	    default: The value to return if the file doesn't exist
+
+	Returns:
+	    The parsed JSON data or the default
+	"""
+	if not os.path.exists(path):
+		return default
+
+	with open(path, 'r', encoding='utf-8') as f:
+		return json.load(f)
+
+
+def migrate(data_dir: str, database: str) -> dict:
+	"""
+	Copy the JSON data files into the database.
+
+	Args:
+	    data_dir (str): The directory containing the JSON data files
+	    database (str): The database file to write
+
+	Returns:
+	    dict: The expected row count of every table, computed from the source files
+	"""
+	user_lists = load_json(os.path.join(data_dir, 'user_lists.json'), {})
+	user_history = load_json(os.path.join(data_dir, 'user_history.json'), {})
+	promo_codes = load_json(os.path.join(data_dir, 'promo_codes.json'), [])
+
+	# Locales that already moved to a JSONL history file use it instead of user_history.json
+	for locale in set(user_history) | set(user_lists):
+		if os.path.exists(get_history_path(locale, data_dir)):
+			user_history[locale] = read_history_file(get_history_path(locale, data_dir))
+
+	expected = {}
+	conn = connect(database)
+
+	try:
+		conn.execute('BEGIN')
+
+		for locale, categories in user_lists.items():
+			for position, (category_id, category) in enumerate(categories.items()):
+				conn.execute(
+					'INSERT INTO categories (locale, category_id, label, position) VALUES (?, ?, ?, ?)',
+					(locale, category_id, category['label'], position),
+				)
+				conn.executemany(
+					'INSERT OR IGNORE INTO category_members (locale, category_id, user_id) VALUES (?, ?, ?)',
+					[(locale, category_id, str(user_id)) for user_id in category['users']],
+				)
+
+			expected[('categories', locale)] = len(categories)
+			# Duplicate users in a category collapse into a single row
+			expected[('category_members', locale)] = sum(
+				len({str(user_id) for user_id in category['users']})
+				for category in categories.values()
+			)
+
+		for locale, entries in user_history.items():
+			conn.executemany(
+				'INSERT OR IGNORE INTO user_history (locale, user_id, first_name, last_name, language, username, start_time) '
+				'VALUES (?, ?, ?, ?, ?, ?, ?)',
+				[
+					(
+						locale,
+						str(entry['user_id']),
+						entry.get('first_name') or '',
+						entry.get('last_name') or '',
+						entry.get('language'),
+						entry.get('username') or '',
+						entry.get('start_time'),
+					)
+					for entry in entries
+				],
+			)
+			expected[('user_history', locale)] = len(
+				{str(entry['user_id']) for entry in entries}
+			)
+
+		conn.executemany(
+			'INSERT OR IGNORE INTO promo_codes (code) VALUES (?)',
+			[(code,) for code in promo_codes],
+		)
+		expected[('promo_codes', None)] = len(set(promo_codes))
+
+		for locale in set(user_history) | set(user_lists):
+			unreachable_users = read_unreachable_file(
+				get_unreachable_path(locale, data_dir)
+			)
+			conn.executemany(
+				'INSERT INTO unreachable_users (locale, user_id, reason, flagged_at) VALUES (?, ?, ?, ?)',
+				[
+					(locale, user_id, flag['reason'], flag['flagged_at'])
+					for user_id, flag in unreachable_users.items()
+				],
+			)
+			expected[('unreachable_users', locale)] = len(unreachable_users)
+
+		conn.execute('COMMIT')
+
+	except BaseException:
+		conn.execute('ROLLBACK')
+		raise
+
+	finally:
+		conn.close()
+
+	return expected
+
+
+def verify(database: str, expected: dict) -> list:
+	"""
+	Compare the row counts in the database with the counts expected from the source files.
+
+	Args:
+	    database (str): The database file to check
+	    expected (dict): Mapping of (table, locale) to the expected row count
+
+	Returns:
+	    list: Descriptions of every mismatch, empty if the migration is complete
+	"""
+	conn = connect(database)
+	mismatches = []
+
+	try:
+		for (table, locale), expected_count in expected.items():
+			if locale is None:
+				actual_count = conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+			else:
+				actual_count = conn.execute(
+					f'SELECT COUNT(*) FROM {table} WHERE locale = ?', (locale,)
+				).fetchone()[0]
+
+			print(f'{table} [{locale or "-"}]: expected {expected_count}, found {actual_count}')
+			if actual_count != expected_count:
+				mismatches.append(
+					f'{table} [{locale or "-"}]: expected {expected_count}, found {actual_count}'
+				)
+
+	finally:
+		conn.close()
+
+	return mismatches
+
+
+def main():
+	parser = argparse.ArgumentParser(
+		description='Migrate the JSON data files to the SQLite storage backend.'
+	)
+	parser.add_argument(
+		'--data-dir', default='data', help='Directory containing the JSON data files'
+	)
+	parser.add_argument(
+		'--database', default=DATABASE_FILE, help='SQLite database file to create'
+	)
+	parser.add_argument(
+		'--overwrite',
+		action='store_true',
+		help='Replace the database if it already exists',
+	)
+	args = parser.parse_args()
+
+	if os.path.exists(args.database):
+		if not args.overwrite:
+			sys.exit(
+				f'{args.database} already exists. Use --overwrite to replace it.'
+			)
+		os.remove(args.database)
+
+	expected = migrate(args.data_dir, args.database)
+	mismatches = verify(args.database, expected)
+
+	if mismatches:
+		sys.exit('Migration verification failed:\n' + '\n'.join(mismatches))
+
+	print(f'Migration to {args.database} completed successfully.')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,119 @@
+"""
+Persistence helpers for the bot's data files.
+Provides atomic JSON writes and a write-behind flusher that coalesces changes into periodic writes.
+"""
+
+import atexit
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class StaleVersionError(Exception):
+	"""Raised when a category changed since the version a mutation expected."""
+
+
+def atomic_write_json(path: str, data, **dump_kwargs) -> None:
+	"""
+	Write JSON data to a file atomically.
+
+	The data is written to a temporary file in the same directory, flushed and fsynced, then
+	renamed over the target, so readers never see a partially written file.
+
+	Args:
+	    path (str): The file to write
+	    data: The JSON-serializable data to write
+	    **dump_kwargs: Extra keyword arguments passed to json.dump
+	"""
+	directory = os.path.dirname(os.path.abspath(path))
+	fd, temp_path = tempfile.mkstemp(
+		dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp'
+	)
+
+	try:
+		with os.fdopen(fd, 'w', encoding='utf-8') as f:
+			json.dump(data, f, **dump_kwargs)
+			f.flush()
+			os.fsync(f.fileno())
+
+		os.replace(temp_path, path)
+
+	except BaseException:
+		os.unlink(temp_path)
+		raise
+
+
+class WriteBehindFlusher:
+	"""
+	Coalesces changes and flushes them on a background thread.
+
+	Changes are reported with mark_dirty(). The flush callback runs once the flush interval has
+	passed since the last flush, or as soon as the number of pending changes reaches the
+	threshold, whichever comes first. A final flush always runs on close() and at interpreter exit.
+	"""
+
+	def __init__(self, flush: Callable[[], None], interval: float, threshold: int):
+		self._flush = flush
+		self._interval = interval
+		self._threshold = threshold
+		self._pending = 0
+		self._lock = threading.Lock()
+		self._wakeup = threading.Event()
+		self._closed = False
+
+		self._thread = threading.Thread(
+			target=self._run, name='write-behind-flusher', daemon=True
+		)
+		self._thread.start()
+		atexit.register(self.close)
+
+	def mark_dirty(self, changes: int = 1) -> None:
+		"""
+		Record pending changes, waking the flusher early if the threshold is reached.
+
+		Args:
+		    changes (int): The number of changes to record
+		"""
+		with self._lock:
+			self._pending += changes
+			threshold_reached = self._pending >= self._threshold
+
+		if threshold_reached:
+			self._wakeup.set()
+
+	def flush(self) -> None:
+		"""Flush pending changes immediately, if there are any."""
+		with self._lock:
+			if self._pending == 0:
+				return
+			self._pending = 0
+
+		try:
+			self._flush()
+		except Exception:
+			# Keep the changes pending so the next flush retries them
+			with self._lock:
+				self._pending += 1
+			logger.exception('Write-behind flush failed')
+
+	def _run(self) -> None:
+		while not self._closed:
+			self._wakeup.wait(self._interval)
+			self._wakeup.clear()
+			self.flush()
+
+	def close(self) -> None:
+		"""Stop the background thread and flush any remaining changes."""
+		if self._closed:
+			return
+
+		self._closed = True
+		self._wakeup.set()
+		self._thread.join()
+		self.flush()
+		atexit.unregister(self.close)
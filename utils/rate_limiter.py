@@ -0,0 +1,245 @@
+"""
+Outbound rate limiting for the bot.
+Every message the bot sends takes a token from a single process-wide token bucket, which keeps
+the bot under Telegram's broadcast limit. Requests wait in a priority queue for their token, so
+interactive replies always go out before the messages of a running bulk send.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+from datetime import timedelta
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from utils.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Priority classes of outgoing requests, lower values go first. Requests without a priority,
+# e.g. the replies of the handlers, are interactive.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: 'interactive', PRIORITY_BULK: 'bulk'}
+
+
+class TokenBucket:
+	"""
+	Token bucket limiting the rate of outgoing messages.
+
+	Tokens are added at a fixed rate up to the capacity, and every message takes one. When
+	Telegram answers with RetryAfter, the bucket is paused, so every sender waits.
+	"""
+
+	def __init__(self, rate: float, capacity: Optional[float] = None):
+		self.rate = rate
+		self.capacity = capacity if capacity is not None else rate
+		self._tokens = self.capacity
+		self._updated_at: Optional[float] = None
+		self._paused_until = 0.0
+		self._lock: Optional[asyncio.Lock] = None
+
+	async def acquire(self) -> None:
+		"""Wait until a message may be sent, and take a token for it."""
+		if self._lock is None:
+			self._lock = asyncio.Lock()
+
+		loop = asyncio.get_running_loop()
+		async with self._lock:
+			while True:
+				now = loop.time()
+				if now < self._paused_until:
+					await asyncio.sleep(self._paused_until - now)
+					continue
+
+				if self._updated_at is not None:
+					self._tokens = min(
+						self.capacity, self._tokens + (now - self._updated_at) * self.rate
+					)
+				self._updated_at = now
+
+				if self._tokens >= 1:
+					self._tokens -= 1
+					return
+
+				await asyncio.sleep((1 - self._tokens) / self.rate)
+
+	def pause(self, seconds: float) -> None:
+		"""
+		Stop handing out tokens for a while, e.g. after a RetryAfter from Telegram.
+
+		Args:
+		    seconds (float): How long to pause
+		"""
+		loop = asyncio.get_running_loop()
+		self._paused_until = max(self._paused_until, loop.time() + seconds)
+		# Start again from an empty bucket, so the senders don't burst right after the pause
+		self._tokens = 0
+		self._updated_at = self._paused_until
+
+
+def get_retry_after_seconds(e: RetryAfter) -> float:
+	"""
+	Get how long Telegram asked the bot to wait.
+
+	Args:
+	    e (RetryAfter): The error returned by Telegram
+
+	Returns:
+	    float: The time to wait in seconds
+	"""
+	retry_after = e.retry_after
+	if isinstance(retry_after, timedelta):
+		return retry_after.total_seconds()
+	return float(retry_after)
+
+
+class PriorityRateLimiter(BaseRateLimiter[int]):
+	"""
+	Rate limiter of the bot, handing out the tokens of a shared token bucket by priority.
+
+	The priority class of a request is passed as `rate_limit_args` to the methods of the bot,
+	e.g. `bot.copy_message(..., rate_limit_args=PRIORITY_BULK)`. A single dispatcher takes the
+	tokens from the bucket and gives each one to the waiting request of the highest priority,
+	in the order the requests arrived within a class. Requests that don't send to a chat, like
+	answering callback queries or fetching updates, are not limited.
+	"""
+
+	def __init__(self, rate: float):
+		self._token_bucket = TokenBucket(rate)
+		self._waiting: List[list] = []
+		self._counter = itertools.count()
+		self._wakeup: Optional[asyncio.Event] = None
+		self._dispatcher: Optional[asyncio.Task] = None
+
+	async def initialize(self) -> None:
+		"""Start handing out tokens, called when the bot is initialized."""
+		self._start_dispatcher()
+
+	async def shutdown(self) -> None:
+		"""Stop handing out tokens, called when the bot is shut down."""
+		if self._dispatcher is not None:
+			self._dispatcher.cancel()
+			try:
+				await self._dispatcher
+			except asyncio.CancelledError:
+				pass
+			self._dispatcher = None
+
+		for _, _, future in self._waiting:
+			future.cancel()
+		self._waiting.clear()
+
+	def _start_dispatcher(self) -> None:
+		if self._dispatcher is None or self._dispatcher.done():
+			self._wakeup = asyncio.Event()
+			self._dispatcher = asyncio.create_task(self._dispatch())
+
+	async def _dispatch(self) -> None:
+		while True:
+			if not self._waiting:
+				self._wakeup.clear()
+				await self._wakeup.wait()
+				continue
+
+			await self._token_bucket.acquire()
+
+			# Popped only once the token is available, so a request of a higher priority that
+			# arrived in the meantime goes first. A token taken for canceled requests is lost.
+			while self._waiting:
+				_, _, future = heapq.heappop(self._waiting)
+				if not future.done():
+					future.set_result(None)
+					break
+
+	async def _acquire(self, priority: int) -> None:
+		self._start_dispatcher()
+		future = asyncio.get_running_loop().create_future()
+		heapq.heappush(self._waiting, [priority, next(self._counter), future])
+		self._wakeup.set()
+		await future
+
+	def pause(self, seconds: float) -> None:
+		"""
+		Stop sending for a while, e.g. after a RetryAfter from Telegram.
+
+		Args:
+		    seconds (float): How long to pause
+		"""
+		self._token_bucket.pause(seconds)
+
+	def get_queue_depths(self) -> Dict[str, int]:
+		"""
+		Get the number of requests waiting to be sent, per priority class.
+
+		Returns:
+		    dict: The number of waiting requests by the name of their class, e.g.
+		        {'interactive': 0, 'bulk': 20}
+		"""
+		depths = {name: 0 for name in PRIORITY_NAMES.values()}
+		for priority, _, future in self._waiting:
+			if not future.done():
+				name = PRIORITY_NAMES.get(priority, str(priority))
+				depths[name] = depths.get(name, 0) + 1
+		return depths
+
+	async def process_request(
+		self,
+		callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict[str, Any], None]]],
+		args: Any,
+		kwargs: Dict[str, Any],
+		endpoint: str,
+		data: Dict[str, Any],
+		rate_limit_args: Optional[int],
+	) -> Union[bool, Dict[str, Any], None]:
+		"""
+		Wait for a token if the request sends to a chat, then make the request.
+
+		A RetryAfter from Telegram pauses every request and is raised again, so the caller can
+		decide whether to retry.
+
+		Args:
+		    callback: The coroutine function making the request
+		    args: The positional arguments of the callback
+		    kwargs: The keyword arguments of the callback
+		    endpoint (str): The endpoint of the request, e.g. 'sendMessage'
+		    data (dict): The parameters passed to the method of the bot
+		    rate_limit_args (int, optional): The priority class of the request, interactive if
+		        not given
+
+		Returns:
+		    The result of the callback
+		"""
+		if 'chat_id' not in data:
+			return await callback(*args, **kwargs)
+
+		priority = PRIORITY_INTERACTIVE if rate_limit_args is None else rate_limit_args
+		await self._acquire(priority)
+
+		try:
+			return await callback(*args, **kwargs)
+		except RetryAfter as e:
+			logger.warning(f'Flood limit reached on {endpoint}, pausing for {e.retry_after}s')
+			self.pause(get_retry_after_seconds(e))
+			raise
+
+
+# Telegram limits every bot on its own, so each locale has its own rate limiter
+_rate_limiters: Dict[str, PriorityRateLimiter] = {}
+
+
+def get_rate_limiter() -> PriorityRateLimiter:
+	"""
+	Get the rate limiter of the bot of the current locale, creating it on first use.
+
+	Returns:
+	    PriorityRateLimiter: The rate limiter allowing --bulk-send-rate messages per second
+	"""
+	locale = Config.get_locale().value
+	if locale not in _rate_limiters:
+		_rate_limiters[locale] = PriorityRateLimiter(Config.get_bulk_send_rate())
+	return _rate_limiters[locale]
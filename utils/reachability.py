@@ -0,0 +1,236 @@
+"""
+Reachability tracking for the bot.
+Flags users the bot can no longer send messages to, e.g. because they blocked it, so bulk sends
+skip them. The flags are kept in memory and every change is appended to a JSONL log per locale
+(data/unreachable_users_<locale>.jsonl).
+"""
+
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Optional
+
+from telegram.error import BadRequest, Forbidden
+
+logger = logging.getLogger(__name__)
+
+# BadRequest errors that mean the chat is gone for good, not that the message was rejected
+PERMANENT_BAD_REQUESTS = ('chat not found', 'user not found', 'peer_id_invalid')
+
+
+def is_permanent_failure(e: Exception) -> bool:
+	"""
+	Check if a failed send means the user can't be reached anymore.
+
+	Args:
+	    e (Exception): The error of the send
+
+	Returns:
+	    bool: True if the user blocked the bot, deleted their account or the chat doesn't exist
+	"""
+	if isinstance(e, Forbidden):
+		return True
+	if isinstance(e, BadRequest):
+		message = str(e).lower()
+		return any(reason in message for reason in PERMANENT_BAD_REQUESTS)
+	return False
+
+
+def get_unreachable_path(locale: str, data_dir: str = 'data') -> str:
+	"""
+	Get the path of the JSONL log of unreachable users of a locale.
+
+	Args:
+	    locale (str): The locale code, e.g. 'EN'
+	    data_dir (str): The directory containing the data files
+
+	Returns:
+	    str: The path of the log
+	"""
+	return os.path.join(data_dir, f'unreachable_users_{locale}.jsonl')
+
+
+def read_unreachable_file(path: str) -> dict:
+	"""
+	Replay a JSONL log of unreachable users.
+
+	Args:
+	    path (str): The log file
+
+	Returns:
+	    dict: Mapping of the IDs of the flagged users to their 'reason' and 'flagged_at', empty
+	        if the file doesn't exist
+	"""
+	unreachable = {}
+	if not os.path.exists(path):
+		return unreachable
+
+	with open(path, 'r', encoding='utf-8') as f:
+		for line in f:
+			try:
+				record = json.loads(line)
+			except json.JSONDecodeError:
+				# A torn write at the end of the file from a crash mid-append
+				logger.warning(f'Skipping incomplete entry in {path}')
+				continue
+
+			user_id = str(record['user_id'])
+			if record['unreachable']:
+				unreachable[user_id] = {
+					'reason': record.get('reason', ''),
+					'flagged_at': record.get('time'),
+				}
+			else:
+				unreachable.pop(user_id, None)
+
+	return unreachable
+
+
+class UnreachableUsers:
+	"""
+	Unreachable users of a single locale.
+
+	The flags are loaded once, so checking a user needs no disk access. Flagging a user and
+	clearing their flag each append a single line to the log.
+	"""
+
+	_instances: dict = {}
+
+	def __init__(self, locale: str, data_dir: str = 'data'):
+		self.locale = locale
+		self.path = get_unreachable_path(locale, data_dir)
+		self._unreachable: Optional[dict] = None
+		self._file = None
+		self._lock = threading.Lock()
+
+	@classmethod
+	def get_instance(cls, locale: str) -> 'UnreachableUsers':
+		"""
+		Get the shared unreachable users of a locale, creating them on first use.
+
+		Args:
+		    locale (str): The locale code, e.g. 'EN'
+
+		Returns:
+		    UnreachableUsers: The process-wide unreachable users of the locale
+		"""
+		if locale not in cls._instances:
+			cls._instances[locale] = cls(locale)
+		return cls._instances[locale]
+
+	@classmethod
+	def shutdown(cls) -> None:
+		"""Close the logs of every locale."""
+		for unreachable_users in cls._instances.values():
+			unreachable_users.close()
+
+	def _load(self) -> dict:
+		if self._unreachable is None:
+			with self._lock:
+				if self._unreachable is None:
+					self._unreachable = read_unreachable_file(self.path)
+
+					# Terminate a torn last line, so the next entry starts on a line of its own
+					if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+						with open(self.path, 'rb+') as f:
+							f.seek(-1, os.SEEK_END)
+							if f.read(1) != b'\n':
+								f.write(b'\n')
+		return self._unreachable
+
+	def _append(self, record: dict) -> None:
+		if self._file is None:
+			self._file = open(self.path, 'a', encoding='utf-8')
+
+		self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+		self._file.flush()
+		os.fsync(self._file.fileno())
+
+	def is_unreachable(self, user_id) -> bool:
+		"""
+		Check if a user is flagged as unreachable.
+
+		Args:
+		    user_id: The ID of the user to check
+
+		Returns:
+		    bool: True if the user is flagged, False otherwise
+		"""
+		return str(user_id) in self._load()
+
+	def get_all(self) -> dict:
+		"""
+		Get every flagged user.
+
+		Returns:
+		    dict: Mapping of user IDs to their 'reason' and 'flagged_at'
+		"""
+		return dict(self._load())
+
+	def flag(self, user_id, reason: str) -> bool:
+		"""
+		Flag a user as unreachable.
+
+		Args:
+		    user_id: The ID of the user to flag
+		    reason (str): Why sending to the user failed
+
+		Returns:
+		    bool: True if the user was flagged, False if they already were
+		"""
+		user_id = str(user_id)
+		unreachable = self._load()
+
+		with self._lock:
+			if user_id in unreachable:
+				return False
+
+			flagged_at = datetime.now().isoformat()
+			self._append(
+				{
+					'user_id': user_id,
+					'unreachable': True,
+					'reason': reason,
+					'time': flagged_at,
+				}
+			)
+			unreachable[user_id] = {'reason': reason, 'flagged_at': flagged_at}
+
+		return True
+
+	def clear(self, user_id) -> bool:
+		"""
+		Clear the flag of a user who can be reached again.
+
+		Args:
+		    user_id: The ID of the user
+
+		Returns:
+		    bool: True if the flag was cleared, False if the user wasn't flagged
+		"""
+		user_id = str(user_id)
+		unreachable = self._load()
+
+		with self._lock:
+			if user_id not in unreachable:
+				return False
+
+			self._append(
+				{
+					'user_id': user_id,
+					'unreachable': False,
+					'time': datetime.now().isoformat(),
+				}
+			)
+			del unreachable[user_id]
+
+		return True
+
+	def close(self) -> None:
+		"""Close the log."""
+		with self._lock:
+			if self._file is not None:
+				self._file.close()
+				self._file = None
@@ -0,0 +1,10 @@
+"""
+Set operations combining categories into a segment for bulk sends.
+Kept free of other imports, so every storage backend can use them.
+"""
+
+# Symbols of the segment operators, used when describing a segment to the admin
+SEGMENT_SYMBOLS = {'UNION': '∪', 'INTERSECT': '∩', 'EXCEPT': '−'}
+
+# Set operations combining categories into a segment, applied left to right
+SEGMENT_OPERATORS = tuple(SEGMENT_SYMBOLS)
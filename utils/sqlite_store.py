@@ -0,0 +1,725 @@
+"""
+SQLite storage backend for the bot.
+Keeps category membership, user history, promo codes and unreachable users in indexed tables
+of data/bot.db, as an alternative to the JSON files under data/.
+"""
+
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional
+
+from utils.persistence import StaleVersionError
+from utils.segments import SEGMENT_OPERATORS
+
+DATABASE_FILE = 'data/bot.db'
+
+# The INTERESTED category is the fallback for users who are not in any other category
+INTERESTED_CATEGORY_ID = '0'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS categories (
+	locale TEXT NOT NULL,
+	category_id TEXT NOT NULL,
+	label TEXT NOT NULL,
+	position INTEGER NOT NULL,
+	PRIMARY KEY (locale, category_id)
+);
+CREATE INDEX IF NOT EXISTS categories_label ON categories (locale, label, position);
+
+CREATE TABLE IF NOT EXISTS category_members (
+	locale TEXT NOT NULL,
+	category_id TEXT NOT NULL,
+	user_id TEXT NOT NULL,
+	UNIQUE (locale, category_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS category_members_user ON category_members (locale, user_id);
+
+CREATE TABLE IF NOT EXISTS user_history (
+	locale TEXT NOT NULL,
+	user_id TEXT NOT NULL,
+	first_name TEXT NOT NULL DEFAULT '',
+	last_name TEXT NOT NULL DEFAULT '',
+	language TEXT,
+	username TEXT NOT NULL DEFAULT '',
+	start_time TEXT,
+	PRIMARY KEY (locale, user_id)
+);
+CREATE INDEX IF NOT EXISTS user_history_start_time ON user_history (locale, start_time);
+CREATE INDEX IF NOT EXISTS user_history_language ON user_history (locale, language);
+
+CREATE TABLE IF NOT EXISTS promo_codes (
+	code TEXT PRIMARY KEY
+);
+
+CREATE TABLE IF NOT EXISTS unreachable_users (
+	locale TEXT NOT NULL,
+	user_id TEXT NOT NULL,
+	reason TEXT NOT NULL DEFAULT '',
+	flagged_at TEXT,
+	PRIMARY KEY (locale, user_id)
+);
+"""
+
+HISTORY_FIELDS = (
+	'user_id',
+	'first_name',
+	'last_name',
+	'language',
+	'username',
+	'start_time',
+)
+
+
+def connect(path: str = DATABASE_FILE) -> sqlite3.Connection:
+	"""
+	Open the database and make sure the schema exists.
+
+	Args:
+	    path (str): The database file
+
+	Returns:
+	    sqlite3.Connection: A connection usable from any thread, guarded by the caller
+	"""
+	conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+	conn.execute('PRAGMA journal_mode=WAL')
+	conn.execute('PRAGMA synchronous=NORMAL')
+	conn.executescript(SCHEMA)
+	return conn
+
+
+class SqliteLocaleCategories:
+	"""
+	Category membership for a single locale, backed by the categories and category_members tables.
+	Exposes the same methods as category_store.LocaleCategories.
+	"""
+
+	def __init__(self, conn: sqlite3.Connection, locale: str):
+		self.conn = conn
+		self.locale = locale
+
+		# The IDs of the categories changed through this object, for their versions
+		self.changed_categories = set()
+
+	def _record_change(self, category_id: str, rowcount: int) -> int:
+		if rowcount > 0:
+			self.changed_categories.add(category_id)
+		return rowcount
+
+	def _category_exists(self, category_id: str) -> bool:
+		return (
+			self.conn.execute(
+				'SELECT 1 FROM categories WHERE locale = ? AND category_id = ?',
+				(self.locale, category_id),
+			).fetchone()
+			is not None
+		)
+
+	def _require_category(self, category_id: str) -> None:
+		if not self._category_exists(category_id):
+			raise KeyError(f'Category {category_id} does not exist')
+
+	def _add_member(self, category_id: str, user_id) -> bool:
+		cursor = self.conn.execute(
+			'INSERT OR IGNORE INTO category_members (locale, category_id, user_id) VALUES (?, ?, ?)',
+			(self.locale, category_id, str(user_id)),
+		)
+		return self._record_change(category_id, cursor.rowcount) == 1
+
+	def _remove_member(self, category_id: str, user_id) -> bool:
+		cursor = self.conn.execute(
+			'DELETE FROM category_members WHERE locale = ? AND category_id = ? AND user_id = ?',
+			(self.locale, category_id, str(user_id)),
+		)
+		return self._record_change(category_id, cursor.rowcount) == 1
+
+	def _fall_back_to_interested(self, user_id) -> bool:
+		# Users left without any non-INTERESTED category go back to INTERESTED
+		if self._category_exists(
+			INTERESTED_CATEGORY_ID
+		) and not self.is_user_in_non_interested_category(user_id):
+			return self._add_member(INTERESTED_CATEGORY_ID, user_id)
+		return False
+
+	def to_dict(self) -> dict:
+		"""
+		Serialize the categories to the user_lists.json layout.
+
+		Returns:
+		    dict: Mapping of category ID to its label and list of users
+		"""
+		return {
+			category_id: {'label': label, 'users': self.get_users(category_id)}
+			for category_id, label in self.get_category_id_list()
+		}
+
+	def get_category_id_list(self) -> list:
+		return self.conn.execute(
+			'SELECT category_id, label FROM categories WHERE locale = ? ORDER BY position',
+			(self.locale,),
+		).fetchall()
+
+	def get_category_label(self, category_id: str) -> str:
+		row = self.conn.execute(
+			'SELECT label FROM categories WHERE locale = ? AND category_id = ?',
+			(self.locale, category_id),
+		).fetchone()
+		if row is None:
+			raise KeyError(f'Category {category_id} does not exist')
+		return row[0]
+
+	def get_users(self, category_id: str) -> list:
+		self._require_category(category_id)
+		return [
+			row[0]
+			for row in self.conn.execute(
+				'SELECT user_id FROM category_members WHERE locale = ? AND category_id = ? ORDER BY rowid',
+				(self.locale, category_id),
+			)
+		]
+
+	def get_segment_users(self, category_id: str, steps=()) -> list:
+		# Compound SELECTs are evaluated left to right and deduplicate the users, and every
+		# SELECT reads a single category from the membership index
+		member_query = 'SELECT user_id FROM category_members WHERE locale = ? AND category_id = ?'
+		self._require_category(category_id)
+		query = member_query
+		params = [self.locale, category_id]
+
+		for operator, step_category_id in steps:
+			if operator not in SEGMENT_OPERATORS:
+				raise ValueError(f'Unknown segment operator {operator}')
+			self._require_category(step_category_id)
+			query += f' {operator} {member_query}'
+			params += [self.locale, step_category_id]
+
+		return [row[0] for row in self.conn.execute(query, params)]
+
+	def get_categories_for_user(self, user_id) -> list:
+		return [
+			row[0]
+			for row in self.conn.execute(
+				'SELECT c.label FROM category_members m '
+				'JOIN categories c ON c.locale = m.locale AND c.category_id = m.category_id '
+				'WHERE m.locale = ? AND m.user_id = ? ORDER BY c.position',
+				(self.locale, str(user_id)),
+			)
+		]
+
+	def _get_category_id_by_label(self, category_label: str) -> Optional[str]:
+		# Labels are looked up first-match-wins, same as scanning the JSON file in order
+		row = self.conn.execute(
+			'SELECT category_id FROM categories WHERE locale = ? AND label = ? ORDER BY position LIMIT 1',
+			(self.locale, category_label),
+		).fetchone()
+		return row[0] if row else None
+
+	def is_user_in_category(self, user_id, category_label: str) -> bool:
+		category_id = self._get_category_id_by_label(category_label)
+		if category_id is None:
+			return False
+		return (
+			self.conn.execute(
+				'SELECT 1 FROM category_members WHERE locale = ? AND category_id = ? AND user_id = ?',
+				(self.locale, category_id, str(user_id)),
+			).fetchone()
+			is not None
+		)
+
+	def is_user_in_non_interested_category(self, user_id) -> bool:
+		return (
+			self.conn.execute(
+				'SELECT 1 FROM category_members WHERE locale = ? AND user_id = ? AND category_id != ? LIMIT 1',
+				(self.locale, str(user_id), INTERESTED_CATEGORY_ID),
+			).fetchone()
+			is not None
+		)
+
+	def add_user(
+		self, user_id, category_id: Optional[str] = None, category_label: Optional[str] = None
+	) -> None:
+		if category_id is not None:
+			target_category_id = str(category_id)
+			self._require_category(target_category_id)
+
+		elif category_label is not None:
+			target_category_id = self._get_category_id_by_label(category_label)
+
+			# If no category with the given label exists, create a new one
+			if target_category_id is None:
+				category_count = self.conn.execute(
+					'SELECT COUNT(*), COALESCE(MAX(position) + 1, 0) FROM categories WHERE locale = ?',
+					(self.locale,),
+				).fetchone()
+				target_category_id = str(category_count[0])
+				self.conn.execute(
+					'INSERT INTO categories (locale, category_id, label, position) VALUES (?, ?, ?, ?)',
+					(self.locale, target_category_id, category_label, category_count[1]),
+				)
+				self.changed_categories.add(target_category_id)
+
+		else:
+			raise ValueError('Either category_id or category_label must be provided')
+
+		# If adding to a non-INTERESTED category, remove from INTERESTED
+		if (
+			self._add_member(target_category_id, user_id)
+			and target_category_id != INTERESTED_CATEGORY_ID
+		):
+			self._remove_member(INTERESTED_CATEGORY_ID, user_id)
+
+	def remove_user(self, user_id, category_id: str) -> bool:
+		category_id = str(category_id)
+		self._require_category(category_id)
+
+		if not self._remove_member(category_id, user_id):
+			return False
+
+		if category_id != INTERESTED_CATEGORY_ID:
+			self._fall_back_to_interested(user_id)
+		return True
+
+	def set_users(self, category_id: str, user_list: list) -> dict:
+		self._require_category(category_id)
+
+		users = dict.fromkeys(str(user_id) for user_id in user_list)
+		removed = self.conn.executemany(
+			'DELETE FROM category_members WHERE locale = ? AND category_id = ? AND user_id = ?',
+			[
+				(self.locale, category_id, user_id)
+				for user_id in self.get_users(category_id)
+				if user_id not in users
+			],
+		).rowcount
+		added = self.conn.executemany(
+			'INSERT OR IGNORE INTO category_members (locale, category_id, user_id) VALUES (?, ?, ?)',
+			[(self.locale, category_id, user_id) for user_id in users],
+		).rowcount
+		self._record_change(category_id, removed + added)
+
+		return {
+			'added': added,
+			'already_present': len(users) - added,
+			'removed': removed,
+		}
+
+	def add_users(self, category_id: str, user_list: list) -> dict:
+		self._require_category(category_id)
+
+		users = dict.fromkeys(str(user_id) for user_id in user_list)
+		added = self._record_change(
+			category_id,
+			self.conn.executemany(
+				'INSERT OR IGNORE INTO category_members (locale, category_id, user_id) VALUES (?, ?, ?)',
+				[(self.locale, category_id, user_id) for user_id in users],
+			).rowcount,
+		)
+
+		# Users added to any other category are no longer only INTERESTED
+		moved_out_of_interested = 0
+		if category_id != INTERESTED_CATEGORY_ID:
+			moved_out_of_interested = self._record_change(
+				INTERESTED_CATEGORY_ID,
+				self.conn.executemany(
+					'DELETE FROM category_members WHERE locale = ? AND category_id = ? AND user_id = ?',
+					[(self.locale, INTERESTED_CATEGORY_ID, user_id) for user_id in users],
+				).rowcount,
+			)
+
+		return {
+			'added': added,
+			'already_present': len(users) - added,
+			'moved_out_of_interested': moved_out_of_interested,
+		}
+
+	def remove_users(self, category_id: str, user_list: list) -> dict:
+		self._require_category(category_id)
+
+		users = dict.fromkeys(str(user_id) for user_id in user_list)
+		removed_users = [
+			user_id for user_id in users if self._remove_member(category_id, user_id)
+		]
+
+		moved_to_interested = 0
+		if category_id != INTERESTED_CATEGORY_ID and self._category_exists(
+			INTERESTED_CATEGORY_ID
+		):
+			# Users left without any category go back to INTERESTED
+			moved_to_interested = self._record_change(
+				INTERESTED_CATEGORY_ID,
+				self.conn.executemany(
+					'INSERT OR IGNORE INTO category_members (locale, category_id, user_id) '
+					'SELECT ?, ?, ? WHERE NOT EXISTS '
+					'(SELECT 1 FROM category_members WHERE locale = ? AND user_id = ?)',
+					[
+						(self.locale, INTERESTED_CATEGORY_ID, user_id, self.locale, user_id)
+						for user_id in removed_users
+					],
+				).rowcount,
+			)
+
+		return {
+			'removed': len(removed_users),
+			'not_present': len(users) - len(removed_users),
+			'moved_to_interested': moved_to_interested,
+		}
+
+
+class SqliteStore:
+	"""
+	Process-wide SQLite store for categories, user history and promo codes.
+
+	Every mutate() block runs in its own transaction, so changes are durable as soon as the
+	block exits and no background flushing is needed. The threads share one connection, so
+	reads are locked as well, and never see the uncommitted changes of a transaction.
+	"""
+
+	_instance: Optional['SqliteStore'] = None
+
+	def __init__(self, path: str = DATABASE_FILE):
+		self.path = path
+		self.conn = connect(path)
+		self._lock = threading.RLock()
+		self._registered_users = {}
+		self._unreachable_users = {}
+		self._versions = {}
+
+	@classmethod
+	def get_instance(cls) -> 'SqliteStore':
+		"""
+		Get the shared store, opening the database on first use.
+
+		Returns:
+		    SqliteStore: The process-wide SQLite store
+		"""
+		if cls._instance is None:
+			cls._instance = cls()
+		return cls._instance
+
+	@classmethod
+	def shutdown(cls) -> None:
+		"""Close the shared store, if it was ever opened."""
+		if cls._instance is not None:
+			cls._instance.close()
+			cls._instance = None
+
+	def locale(self, locale: str) -> SqliteLocaleCategories:
+		"""
+		Get the categories of a locale. They share the connection with the transactions of other
+		threads, so they must only be used while the store is locked, see read().
+
+		Args:
+		    locale (str): The locale code, e.g. 'EN'
+
+		Returns:
+		    SqliteLocaleCategories: The categories of the locale
+		"""
+		return SqliteLocaleCategories(self.conn, locale)
+
+	@contextmanager
+	def read(self, locale: str):
+		"""
+		Context manager for reading the categories of a locale.
+
+		The store is locked for the duration of the block, so the reads never see the
+		uncommitted changes of a mutate() block running on another thread.
+
+		Args:
+		    locale (str): The locale code, e.g. 'EN'
+
+		Yields:
+		    SqliteLocaleCategories: The categories of the locale
+		"""
+		with self._lock:
+			yield self.locale(locale)
+
+	def get_version(self, locale: str, category_id: str) -> int:
+		"""
+		Get the current version of a category of a locale.
+
+		Args:
+		    locale (str): The locale code, e.g. 'EN'
+		    category_id (str): The ID of the category
+
+		Returns:
+		    int: The version, incremented by every mutation that changed the category or its members
+		"""
+		return self._versions.get((locale, category_id), 0)
+
+	@contextmanager
+	def mutate(
+		self, locale: str, action: str = 'update', expected_versions: Optional[dict] = None
+	):
+		"""
+		Context manager for changing the categories of a locale inside a single transaction.
+
+		Args:
+		    locale (str): The locale code whose categories are changed
+		    action (str): The name of the change being made, e.g. 'add' or 'promo_code_join'
+		    expected_versions (dict, optional): Only make the change if these categories are still
+		        at these versions, by category ID
+
+		Yields:
+		    SqliteLocaleCategories: The categories of the locale
+
+		Raises:
+		    StaleVersionError: If a category is no longer at the expected version
+		"""
+		with self._lock:
+			for category_id, expected_version in (expected_versions or {}).items():
+				version = self.get_version(locale, category_id)
+				if version != expected_version:
+					raise StaleVersionError(
+						f'Category {category_id} of {locale} is at version {version}, '
+						f'expected {expected_version}'
+					)
+
+			categories = SqliteLocaleCategories(self.conn, locale)
+			self.conn.execute('BEGIN IMMEDIATE')
+			try:
+				yield categories
+			except BaseException:
+				self.conn.execute('ROLLBACK')
+				raise
+			self.conn.execute('COMMIT')
+
+			for category_id in categories.changed_categories:
+				self._versions[(locale, category_id)] = (
+					self.get_version(locale, category_id) + 1
+				)
+
+	def _get_registered_users(self, locale: str) -> set:
+		if locale not in self._registered_users:
+			with self._lock:
+				if locale not in self._registered_users:
+					self._registered_users[locale] = {
+						row[0]
+						for row in self.conn.execute(
+							'SELECT user_id FROM user_history WHERE locale = ?', (locale,)
+						)
+					}
+		return self._registered_users[locale]
+
+	def is_user_registered(self, locale: str, user_id) -> bool:
+		"""
+		Check if a user is in the history of a locale, without querying the database.
+
+		Args:
+		    locale (str): The locale code
+		    user_id: The ID of the user to check
+
+		Returns:
+		    bool: True if the user is registered, False otherwise
+		"""
+		return str(user_id) in self._get_registered_users(locale)
+
+	def register_user(self, locale: str, user: dict) -> bool:
+		"""
+		Add a user to the history of a locale if they aren't already in it.
+
+		Args:
+		    locale (str): The locale code
+		    user (dict): The history entry, with the keys in HISTORY_FIELDS
+
+		Returns:
+		    bool: True if the user was added, False if they were already registered
+		"""
+		with self._lock:
+			cursor = self.conn.execute(
+				'INSERT OR IGNORE INTO user_history (locale, user_id, first_name, last_name, language, username, start_time) '
+				'VALUES (?, ?, ?, ?, ?, ?, ?)',
+				(locale, *(user.get(field) for field in HISTORY_FIELDS)),
+			)
+			self._get_registered_users(locale).add(str(user['user_id']))
+			return cursor.rowcount == 1
+
+	def get_user_history(self, locale: str) -> list:
+		"""
+		Get the history entries of a locale in registration order.
+
+		Args:
+		    locale (str): The locale code
+
+		Returns:
+		    list: List of history entry dictionaries
+		"""
+		with self._lock:
+			rows = self.conn.execute(
+				f'SELECT {", ".join(HISTORY_FIELDS)} FROM user_history WHERE locale = ? ORDER BY rowid',
+				(locale,),
+			)
+			return [dict(zip(HISTORY_FIELDS, row)) for row in rows]
+
+	def get_users_started_between(
+		self, locale: str, start: Optional[str] = None, end: Optional[str] = None
+	) -> list:
+		"""
+		Get the users of a locale who started the bot in a time range, using the start time index.
+
+		Args:
+		    locale (str): The locale code
+		    start (str, optional): ISO timestamp the range starts at, inclusive. Open if None.
+		    end (str, optional): ISO timestamp the range ends at, exclusive. Open if None.
+
+		Returns:
+		    list: The IDs of the users in the range, in start time order
+		"""
+		query = 'SELECT user_id FROM user_history WHERE locale = ? AND start_time IS NOT NULL'
+		params = [locale]
+		if start is not None:
+			query += ' AND start_time >= ?'
+			params.append(start)
+		if end is not None:
+			query += ' AND start_time < ?'
+			params.append(end)
+
+		with self._lock:
+			rows = self.conn.execute(query + ' ORDER BY start_time, user_id', params)
+			return [row[0] for row in rows]
+
+	def get_users_by_language(self, locale: str, language: str) -> list:
+		"""
+		Get the users of a locale with a language, using the language index.
+
+		Args:
+		    locale (str): The locale code
+		    language (str): The language code, e.g. 'tr'
+
+		Returns:
+		    list: The IDs of the users with the language
+		"""
+		with self._lock:
+			rows = self.conn.execute(
+				'SELECT user_id FROM user_history WHERE locale = ? AND language = ?',
+				(locale, language),
+			)
+			return [row[0] for row in rows]
+
+	def get_language_counts(self, locale: str) -> dict:
+		"""
+		Get the number of users of a locale per language.
+
+		Args:
+		    locale (str): The locale code
+
+		Returns:
+		    dict: Mapping of language codes to their number of users
+		"""
+		with self._lock:
+			rows = self.conn.execute(
+				'SELECT language, COUNT(*) FROM user_history '
+				"WHERE locale = ? AND language IS NOT NULL AND language != '' GROUP BY language",
+				(locale,),
+			)
+			return dict(rows.fetchall())
+
+	def is_valid_promo_code(self, promo_code: str) -> bool:
+		"""
+		Check if a promo code exists in the promo_codes table.
+
+		Args:
+		    promo_code (str): The promo code to check
+
+		Returns:
+		    bool: True if the promo code is valid, False otherwise
+		"""
+		with self._lock:
+			return (
+				self.conn.execute(
+					'SELECT 1 FROM promo_codes WHERE code = ?', (promo_code,)
+				).fetchone()
+				is not None
+			)
+
+	def _get_unreachable_users(self, locale: str) -> dict:
+		if locale not in self._unreachable_users:
+			with self._lock:
+				if locale not in self._unreachable_users:
+					self._unreachable_users[locale] = {
+						user_id: {'reason': reason, 'flagged_at': flagged_at}
+						for user_id, reason, flagged_at in self.conn.execute(
+							'SELECT user_id, reason, flagged_at FROM unreachable_users '
+							'WHERE locale = ?',
+							(locale,),
+						)
+					}
+		return self._unreachable_users[locale]
+
+	def is_user_unreachable(self, locale: str, user_id) -> bool:
+		"""
+		Check if a user is flagged as unreachable, without querying the database.
+
+		Args:
+		    locale (str): The locale code
+		    user_id: The ID of the user to check
+
+		Returns:
+		    bool: True if the user is flagged, False otherwise
+		"""
+		return str(user_id) in self._get_unreachable_users(locale)
+
+	def get_unreachable_users(self, locale: str) -> dict:
+		"""
+		Get every flagged user of a locale.
+
+		Args:
+		    locale (str): The locale code
+
+		Returns:
+		    dict: Mapping of user IDs to their 'reason' and 'flagged_at'
+		"""
+		return dict(self._get_unreachable_users(locale))
+
+	def flag_unreachable(self, locale: str, user_id, reason: str) -> bool:
+		"""
+		Flag a user of a locale as unreachable.
+
+		Args:
+		    locale (str): The locale code
+		    user_id: The ID of the user to flag
+		    reason (str): Why sending to the user failed
+
+		Returns:
+		    bool: True if the user was flagged, False if they already were
+		"""
+		with self._lock:
+			flagged_at = datetime.now().isoformat()
+			cursor = self.conn.execute(
+				'INSERT OR IGNORE INTO unreachable_users (locale, user_id, reason, flagged_at) '
+				'VALUES (?, ?, ?, ?)',
+				(locale, str(user_id), reason, flagged_at),
+			)
+			if cursor.rowcount == 1:
+				self._get_unreachable_users(locale)[str(user_id)] = {
+					'reason': reason,
+					'flagged_at': flagged_at,
+				}
+			return cursor.rowcount == 1
+
+	def clear_unreachable(self, locale: str, user_id) -> bool:
+		"""
+		Clear the flag of a user of a locale who can be reached again.
+
+		Args:
+		    locale (str): The locale code
+		    user_id: The ID of the user
+
+		Returns:
+		    bool: True if the flag was cleared, False if the user wasn't flagged
+		"""
+		with self._lock:
+			cursor = self.conn.execute(
+				'DELETE FROM unreachable_users WHERE locale = ? AND user_id = ?',
+				(locale, str(user_id)),
+			)
+			self._get_unreachable_users(locale).pop(str(user_id), None)
+			return cursor.rowcount == 1
+
+	def flush(self) -> None:
+		"""Changes are committed per transaction, so there is nothing to flush."""
+
+	def close(self) -> None:
+		"""Close the database connection."""
+		with self._lock:
+			self.conn.close()
@@ -79,28 +79,68 @@ ADMIN_STRINGS = {
 	'BULK_SEND_ERROR_REPLY': '⚠️ Error: The command /bulksend can only be used in reply to a message. Please make sure you reply to a message with the command and try again.',
 	'BULK_SEND_PROMPT': '📨 Send the message you wish to be sent to users in a category.',
 	'BULK_SEND_CATEGORY_SELECTED': '❓ Category {category} selected successfully. Are you sure you want to send the provided message to all {count} users in this category?',
-	'BULK_SEND_ERROR_USER': '⚠️ Error: Message sending failed for user ID {user_id}: {error}',
+	'BULK_SEND_SEGMENT_SELECTED': '❓ Segment {category} selected successfully. Are you sure you want to send the provided message to all {count} users in this segment?',
+	'BULK_SEND_SEGMENT_HINT': '🧮 Use the buttons below to add users of another category, keep only the users who are also in another category, or exclude the users of another category. Every user gets the message once.',
+	'BULK_SEND_SEGMENT_UNION': '➕ Select the category whose users are added to {category}:',
+	'BULK_SEND_SEGMENT_INTERSECT': '✖️ Select the category to intersect {category} with. Only the users in both are kept:',
+	'BULK_SEND_SEGMENT_EXCEPT': '➖ Select the category whose users are excluded from {category}:',
+	'BULK_SEND_AUDIENCE_PROMPT': '🎯 Select a filter for the users of {category}. Only the users matching it are kept:',
+	'AUDIENCE_JOINED_WITHIN': 'joined in the last {days} days',
+	'AUDIENCE_LANGUAGE': 'language {language}',
+	'BULK_SEND_SCHEDULE_PROMPT': '⏰ Send the time to send the message at, in UTC, as YYYY-MM-DD HH:MM. To repeat the send, add daily or weekly after the time, e.g. 2025-06-01 03:00 daily.',
+	'BULK_SEND_SCHEDULE_INVALID': '⚠️ The time has to be in the future, in the format YYYY-MM-DD HH:MM, optionally followed by daily or weekly. Please try again.',
+	'BULK_SEND_SCHEDULED': '⏰ The message to {category} is scheduled for {time}.',
+	'BULK_SEND_SCHEDULED_STARTING': '⏰ Starting the scheduled send to {category}...',
+	'SCHEDULE_TIME': '{time} UTC',
+	'SCHEDULE_REPEATED_DAILY': ', repeated daily',
+	'SCHEDULE_REPEATED_WEEKLY': ', repeated weekly',
+	'BULK_SEND_UNREACHABLE_SKIPPED': '🚫 {count} users in this segment are flagged as unreachable because they blocked the bot or deleted their account, and will be skipped.',
+	'BULK_SEND_ERROR_REPORT': '⚠️ The message to segment {category} could not be sent to {failed} users:\n\n{errors}\n\nThe attached file lists every user and the reason.',
+	'BULK_SEND_ERROR_FORBIDDEN': '🚫 Blocked the bot or deleted their account',
+	'BULK_SEND_ERROR_BAD_REQUEST': '❌ Chat not found or message rejected',
+	'BULK_SEND_ERROR_RETRY_AFTER': '⏳ Flood limit still reached after retrying',
+	'BULK_SEND_ERROR_NETWORK': '📡 Network error',
+	'BULK_SEND_ERROR_OTHER': '⚠️ Other error',
 	'BULK_SEND_SUCCESS': '✅ Message sent to all users in category {category} successfully!',
+	'BULK_SEND_PROGRESS': '📤 Sending the message to category {category}...\n\n✅ Sent: {sent}\n⚠️ Failed: {failed}\n⏳ Remaining: {remaining}\n🚀 {rate:.1f} messages/s, about {eta} left',
+	'BULK_SEND_SUMMARY': '✅ Sent: {sent}\n⚠️ Failed: {failed}\n⏱️ Took {duration}',
+	'BULK_SEND_STOPPED': '🛑 Bulk send to category {category} stopped.\n\n✅ Sent: {sent}\n⚠️ Failed: {failed}\n⏳ Not sent: {remaining}',
+	'BULK_SEND_INTERRUPTED': '⏸️ Bulk send to category {category} paused by a restart of the bot. It continues when the bot is back.\n\n✅ Sent: {sent}\n⚠️ Failed: {failed}\n⏳ Remaining: {remaining}',
+	'BULK_SEND_NOT_RUNNING': '⚠️ This bulk send is no longer running.',
+	# Scheduled Sends Messages
+	'SCHEDULED_SENDS_LIST': '⏰ Scheduled bulk sends:\n\n{schedules}\n\nPress a button below to cancel a scheduled send.',
+	'SCHEDULED_SENDS_ENTRY': '• {category}: {time}',
+	'SCHEDULED_SENDS_EMPTY': '⏰ No bulk sends are scheduled.',
+	'SCHEDULED_SEND_CANCELED': '✅ The scheduled send to {category} was canceled.',
+	'SCHEDULED_SEND_NOT_FOUND': '⚠️ This scheduled send no longer exists.',
 	# Category Management Messages
 	'CATEGORY_ERROR_REPLY': "⚠️ You have to use this command in reply to a list of user ID's.",
 	'CATEGORY_SELECT_PROMPT': '📈 Please select a category to set the user list for:\n\nUse /cancel to cancel the operation.',
 	'CATEGORY_USER_LIST_PROMPT': '📋 Send the list of user IDs you want to set for the category.',
 	'CATEGORY_CONFIRM_SET': '❓ Are you sure you want to set the user list for category {category}?',
 	'CATEGORY_SET_SUCCESS': '✅ Category {category} set successfully!',
+	'CATEGORY_SET_CHANGED': '⚠️ Category {category} was changed by someone else since you selected it. Are you sure you still want to replace its user list?',
+	'CATEGORY_SET_SUMMARY': '➕ Added: {added}\n✔️ Already in the category: {already_present}\n➖ Removed: {removed}',
 	# Add to Category Messages
 	'ADD_TO_CATEGORY_SELECT_PROMPT': '📈 Please select a category to add the user list to:\n\nUse /cancel to cancel the operation.',
 	'ADD_TO_CATEGORY_USER_LIST_PROMPT': '📋 Send the list of user IDs you want to add to a category.',
 	'ADD_TO_CATEGORY_CONFIRM': '❓ Are you sure you want to add the user list to category {category}?',
 	'ADD_TO_CATEGORY_SUCCESS': '✅ Selected list added to category {category} successfully!',
+	'ADD_TO_CATEGORY_SUMMARY': '➕ Added: {added}\n✔️ Already in the category: {already_present}\n↗️ Moved out of INTERESTED: {moved_out_of_interested}',
 	# Remove from Category Messages
 	'REMOVE_FROM_CATEGORY_SELECT_PROMPT': '📈 Please select a category to remove the user list from:\n\nUse /cancel to cancel the operation.',
 	'REMOVE_FROM_CATEGORY_USER_LIST_PROMPT': '📋 Send the list of user IDs you want to remove from a category.',
 	'REMOVE_FROM_CATEGORY_CONFIRM': '❓ Are you sure you want to remove the user list from category {category}?',
 	'REMOVE_FROM_CATEGORY_SUCCESS': '✅ Selected list removed from category {category} successfully!',
+	'REMOVE_FROM_CATEGORY_SUMMARY': '➖ Removed: {removed}\n✖️ Not in the category: {not_present}\n↩️ Moved back to INTERESTED: {moved_to_interested}',
 	# Export History Messages
 	'EXPORT_HISTORY_START': '📊 Preparing to export history...',
 	'EXPORT_HISTORY_SUCCESS': '✅ History exported successfully!',
 	'EXPORT_HISTORY_ERROR': '⚠️ Error exporting history: {error}',
+	# Export Unreachable Users Messages
+	'EXPORT_UNREACHABLE_SUCCESS': '✅ {count} unreachable users exported successfully!',
+	'EXPORT_UNREACHABLE_EMPTY': '✅ No users are flagged as unreachable.',
+	'EXPORT_UNREACHABLE_ERROR': '⚠️ Error exporting unreachable users: {error}',
 	# Send Message Messages
 	'SEND_MESSAGE_PROMPT': '📨 Send the message you want to forward:',
 	'SEND_MESSAGE_SUCCESS': '✅ Message sent successfully to user {user_id}',
@@ -1,22 +1,24 @@
 """
 String management module for the bot.
 Contains localized strings for user messages and English-only strings for admin messages.
-All strings are exposed as module-level variables.
+Admin strings are exposed as module-level variables. Localized strings are looked up in the
+locale of the current bot on every access, so they have to be read as attributes of the
+module, e.g. `strings.USER_WELCOME`, rather than imported by name.
 """
 
 from utils.config import Config
 from utils.string_constants import EN_STRINGS, TR_STRINGS, ADMIN_STRINGS
 
-# Get current locale
-locale = Config.get_locale().value
-
-# Import localized strings based on current locale
-strings = EN_STRINGS if locale == 'EN' else TR_STRINGS
-
-# Expose all localized strings as module-level variables
-for name, value in strings.items():
-	globals()[name] = value
+LOCALIZED_STRINGS = {'EN': EN_STRINGS, 'TR': TR_STRINGS}
 
 # Expose all admin strings as module-level variables
 for name, value in ADMIN_STRINGS.items():
 	globals()[name] = value
+
+
+def __getattr__(name: str) -> str:
+	# Only called for names that aren't module-level variables, i.e. the localized strings
+	strings = LOCALIZED_STRINGS[Config.get_locale().value]
+	if name in strings:
+		return strings[name]
+	raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
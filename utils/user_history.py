@@ -0,0 +1,305 @@
+"""
+User history storage for the bot.
+Keeps the registered users in memory and appends new registrations to an append-only
+JSONL file per locale (data/user_history_<locale>.jsonl). Start times and languages are
+indexed, so audiences can be looked up without scanning the history.
+"""
+
+import bisect
+import json
+import logging
+import os
+import threading
+from typing import Optional
+
+# The history used to be a single JSON file with a list of entries per locale
+LEGACY_USER_HISTORY_FILENAME = 'user_history.json'
+
+logger = logging.getLogger(__name__)
+
+
+def get_history_path(locale: str, data_dir: str = 'data') -> str:
+	"""
+	Get the path of the JSONL history file of a locale.
+
+	Args:
+	    locale (str): The locale code, e.g. 'EN'
+	    data_dir (str): The directory containing the data files
+
+	Returns:
+	    str: The path of the history file
+	"""
+	return os.path.join(data_dir, f'user_history_{locale}.jsonl')
+
+
+def read_history_file(path: str) -> list:
+	"""
+	Read the entries of a JSONL history file.
+
+	Args:
+	    path (str): The history file
+
+	Returns:
+	    list: The history entries in registration order, empty if the file doesn't exist
+	"""
+	if not os.path.exists(path):
+		return []
+
+	entries = []
+	with open(path, 'r', encoding='utf-8') as f:
+		for line in f:
+			try:
+				entries.append(json.loads(line))
+			except json.JSONDecodeError:
+				# A torn write at the end of the file from a crash mid-append
+				logger.warning(f'Skipping incomplete entry in {path}')
+
+	return entries
+
+
+def import_legacy_history(locale: str, data_dir: str = 'data') -> int:
+	"""
+	Import the entries of a locale from the old user_history.json into its JSONL history file.
+
+	Nothing is imported if the JSONL file already exists. Duplicate entries for the same user
+	are dropped, keeping the first one.
+
+	Args:
+	    locale (str): The locale code to import
+	    data_dir (str): The directory containing the data files
+
+	Returns:
+	    int: The number of imported entries
+	"""
+	path = get_history_path(locale, data_dir)
+	legacy_path = os.path.join(data_dir, LEGACY_USER_HISTORY_FILENAME)
+	if os.path.exists(path) or not os.path.exists(legacy_path):
+		return 0
+
+	with open(legacy_path, 'r', encoding='utf-8') as f:
+		legacy_entries = json.load(f).get(locale, [])
+
+	seen_user_ids = set()
+	lines = []
+	for entry in legacy_entries:
+		user_id = str(entry['user_id'])
+		if user_id not in seen_user_ids:
+			seen_user_ids.add(user_id)
+			lines.append(json.dumps(entry, ensure_ascii=False))
+
+	# Write the whole file at once, so a crash can't leave a partial import behind
+	temp_path = path + '.import'
+	with open(temp_path, 'w', encoding='utf-8') as f:
+		f.write(''.join(line + '\n' for line in lines))
+		f.flush()
+		os.fsync(f.fileno())
+	os.replace(temp_path, path)
+
+	logger.info(f'Imported {len(lines)} {locale} history entries from {legacy_path}')
+	return len(lines)
+
+
+class UserHistory:
+	"""
+	Registration history of a single locale.
+
+	The entries are loaded once, so checking whether a user is registered or reading the history
+	needs no disk access. New registrations are appended to the JSONL file as a single line.
+
+	The users are also indexed by start time, in a list of (start_time, user_id) pairs kept sorted
+	for range lookups, and by language, in a dict of sets for equality lookups. Start times are
+	ISO timestamps in UTC, as sent by Telegram, so they sort correctly as strings.
+	"""
+
+	_instances: dict = {}
+
+	def __init__(self, locale: str, data_dir: str = 'data'):
+		self.locale = locale
+		self.data_dir = data_dir
+		self.path = get_history_path(locale, data_dir)
+		self._registered: Optional[set] = None
+		self._entries = []
+		self._by_start_time = []
+		self._by_language = {}
+		self._file = None
+		self._lock = threading.Lock()
+
+	@classmethod
+	def get_instance(cls, locale: str) -> 'UserHistory':
+		"""
+		Get the shared history of a locale, creating it on first use.
+
+		Args:
+		    locale (str): The locale code, e.g. 'EN'
+
+		Returns:
+		    UserHistory: The process-wide history of the locale
+		"""
+		if locale not in cls._instances:
+			cls._instances[locale] = cls(locale)
+		return cls._instances[locale]
+
+	@classmethod
+	def shutdown(cls) -> None:
+		"""Close the history files of every locale."""
+		for history in cls._instances.values():
+			history.close()
+
+	def _index(self, user_id: str, entry: dict) -> None:
+		# Only used for new registrations, the loaded history is indexed in bulk by _load
+		if entry.get('start_time'):
+			bisect.insort(self._by_start_time, (entry['start_time'], user_id))
+		if entry.get('language'):
+			self._by_language.setdefault(entry['language'], set()).add(user_id)
+
+	def _load(self) -> set:
+		if self._registered is None:
+			with self._lock:
+				# Another thread may have loaded the history while this one waited for the lock
+				if self._registered is None:
+					self._load_locked()
+		return self._registered
+
+	def _load_locked(self) -> None:
+		import_legacy_history(self.locale, self.data_dir)
+		registered = set()
+		entries = []
+		by_start_time = []
+		by_language = {}
+		for entry in read_history_file(self.path):
+			user_id = str(entry['user_id'])
+			if user_id not in registered:
+				registered.add(user_id)
+				entries.append(entry)
+				if entry.get('start_time'):
+					by_start_time.append((entry['start_time'], user_id))
+				if entry.get('language'):
+					by_language.setdefault(entry['language'], set()).add(user_id)
+
+		# Sorted once, instead of inserting every entry of the history in order
+		by_start_time.sort()
+		self._entries = entries
+		self._by_start_time = by_start_time
+		self._by_language = by_language
+
+		# Terminate a torn last line, so the next entry starts on a line of its own
+		if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+			with open(self.path, 'rb+') as f:
+				f.seek(-1, os.SEEK_END)
+				if f.read(1) != b'\n':
+					f.write(b'\n')
+
+		# Set last, so the history only counts as loaded once it is indexed
+		self._registered = registered
+
+	def is_registered(self, user_id) -> bool:
+		"""
+		Check if a user is registered.
+
+		Args:
+		    user_id: The ID of the user to check
+
+		Returns:
+		    bool: True if the user is registered, False otherwise
+		"""
+		return str(user_id) in self._load()
+
+	def register(self, entry: dict) -> bool:
+		"""
+		Append a user to the history if they aren't already registered.
+
+		Args:
+		    entry (dict): The history entry, including its 'user_id'
+
+		Returns:
+		    bool: True if the user was added, False if they were already registered
+		"""
+		user_id = str(entry['user_id'])
+		if user_id in self._load():
+			return False
+
+		with self._lock:
+			if user_id in self._registered:
+				return False
+
+			if self._file is None:
+				self._file = open(self.path, 'a', encoding='utf-8')
+
+			self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+			self._file.flush()
+			os.fsync(self._file.fileno())
+			self._registered.add(user_id)
+			self._entries.append(entry)
+			self._index(user_id, entry)
+
+		return True
+
+	def get_users_started_between(
+		self, start: Optional[str] = None, end: Optional[str] = None
+	) -> list:
+		"""
+		Get the users who started the bot in a time range, using the start time index.
+
+		Args:
+		    start (str, optional): ISO timestamp the range starts at, inclusive. Open if None.
+		    end (str, optional): ISO timestamp the range ends at, exclusive. Open if None.
+
+		Returns:
+		    list: The IDs of the users in the range, in start time order
+		"""
+		self._load()
+		with self._lock:
+			# A start time sorts before every (start time, user ID) pair with that start time
+			low = 0 if start is None else bisect.bisect_left(self._by_start_time, (start,))
+			high = (
+				len(self._by_start_time)
+				if end is None
+				else bisect.bisect_left(self._by_start_time, (end,))
+			)
+			return [user_id for _, user_id in self._by_start_time[low:high]]
+
+	def get_users_by_language(self, language: str) -> list:
+		"""
+		Get the users with a language, using the language index.
+
+		Args:
+		    language (str): The language code, e.g. 'tr'
+
+		Returns:
+		    list: The IDs of the users with the language
+		"""
+		self._load()
+		with self._lock:
+			return list(self._by_language.get(language, ()))
+
+	def get_language_counts(self) -> dict:
+		"""
+		Get the number of users per language.
+
+		Returns:
+		    dict: Mapping of language codes to their number of users
+		"""
+		self._load()
+		with self._lock:
+			return {
+				language: len(user_ids) for language, user_ids in self._by_language.items()
+			}
+
+	def get_entries(self) -> list:
+		"""
+		Get all history entries of the locale, from memory.
+
+		Returns:
+		    list: The history entries in registration order. The entries are shared with the
+		        history and must not be modified.
+		"""
+		self._load()
+		with self._lock:
+			return list(self._entries)
+
+	def close(self) -> None:
+		"""Close the history file."""
+		with self._lock:
+			if self._file is not None:
+				self._file.close()
+				self._file = None
@@ -1,29 +1,58 @@
 import json
-from functools import wraps
-from datetime import datetime
+from contextlib import contextmanager
+from functools import cached_property, partial, wraps
+from datetime import datetime, timedelta, timezone
+from typing import Optional
 import logging
-from dotenv import dotenv_values
 from telegram import error, Update
 from telegram.ext import ConversationHandler, CallbackContext
-import os
 
-from utils.config import Config
+from utils.config import Config, Storage
+from utils.category_store import CategoryStore
+from utils.category_journal import JournaledCategoryStore
+from utils.sqlite_store import SqliteStore
+from utils.user_history import UserHistory
+from utils.reachability import UnreachableUsers, is_permanent_failure
+from utils.segments import SEGMENT_SYMBOLS
+from utils import file_cache
+from utils.file_cache import load_env, load_json, load_json_derived
+from utils.log_pipeline import (
+	get_user_interactions_logger_name,
+	get_user_panel_errors_logger_name,
+)
+
+
+def get_locale() -> str:
+	"""
+	Get the locale of the bot handling the current update.
 
-locale = Config.get_locale().value
+	Returns:
+	    str: The locale code, e.g. 'EN'
+	"""
+	return Config.get_locale().value
 
 
-def get_bot_token() -> str:
+def get_bot_token(locale: Optional[str] = None) -> str:
 	"""
-	Get the appropriate bot token based on the current locale.
+	Get the appropriate bot token based on the locale.
+
+	Args:
+	    locale (str, optional): The locale code, the current locale by default
 
 	Returns:
-	    str: The bot token for the current locale
+	    str: The bot token for the locale
 
 	Raises:
-	    ValueError: If the token for the current locale is not found
+	    ValueError: If the token for the locale is not found
 	"""
+	if locale is None:
+		locale = get_locale()
+
 	# Load environment variables
-	env_vars = dotenv_values('.env.secret')
+	try:
+		env_vars = load_env('.env.secret')
+	except FileNotFoundError:
+		env_vars = {}
 
 	token_key = f'BOT_TOKEN_{locale}'
 	if token_key not in env_vars:
@@ -32,6 +61,43 @@ def get_bot_token() -> str:
 	return env_vars[token_key]
 
 
+def get_webhook_secret_token() -> str:
+	"""
+	Get the secret token the webhooks are registered with.
+
+	Returns:
+	    str: The WEBHOOK_SECRET_TOKEN from .env.secret
+
+	Raises:
+	    ValueError: If the secret token is not found
+	"""
+	try:
+		env_vars = load_env('.env.secret')
+	except FileNotFoundError:
+		env_vars = {}
+
+	if 'WEBHOOK_SECRET_TOKEN' not in env_vars:
+		raise ValueError('WEBHOOK_SECRET_TOKEN not found in .env.secret')
+
+	return env_vars['WEBHOOK_SECRET_TOKEN']
+
+
+def get_secret(name: str) -> str:
+	"""
+	Get a value from the .env.secret file.
+
+	Args:
+	    name: The name of the variable
+
+	Returns:
+	    str: The value of the variable
+
+	Raises:
+	    KeyError: If the variable is not in .env.secret
+	"""
+	return load_env('.env.secret')[name]
+
+
 def get_localized_message_id(message_name: str) -> int:
 	"""
 	Get a message ID based on the current locale and message name.
@@ -45,42 +111,36 @@ def get_localized_message_id(message_name: str) -> int:
 	Raises:
 	    KeyError: If the message name doesn't exist for the current locale
 	"""
-	message_ids_file = 'data/user_panel_message_ids.json'
-
-	with open(message_ids_file, 'r', encoding='utf-8') as f:
-		message_ids = json.load(f)
+	message_ids = load_json('data/user_panel_message_ids.json')
 
-	return message_ids[locale][message_name]
+	return message_ids[get_locale()][message_name]
 
 
 def register_user_start(start_message):
 	"""
-	Register a new user in the history JSON file in the correct locale when they first start using the bot.
+	Register a new user in the history of the correct locale when they first start using the bot.
 
 	Args:
 	    start_message: The message object containing user information from the /start command
 
-	The function creates a history file if it doesn't exist, extracts user information like name,
-	language, ID etc. and adds it to the history if the user isn't already registered.
+	The function extracts user information like name, language, ID etc. and appends it to the
+	history if the user isn't already registered. Registered users are looked up in memory, so
+	a /start from an already registered user doesn't touch the disk.
 	"""
-	history_file = 'data/user_history.json'
-
-	# Create the history file if it doesn't exist
-	if not os.path.exists(history_file):
-		with open(history_file, 'w', encoding='utf-8') as f:
-			json.dump({'EN': [], 'TR': []}, f, indent=4, ensure_ascii=False)
+	user_id = str(start_message.from_user.id)
+	if is_user_registered(user_id):
+		return
 
 	# Extract user information from the message
 	user_first_name = start_message.from_user.first_name
 	user_last_name = start_message.from_user.last_name
 	user_language = start_message.from_user.language_code
-	user_id = start_message.from_user.id
 	user_username = start_message.from_user.username
 	start_date = start_message.date.isoformat()
 
 	# Create a new user entry with extracted information
 	new_user = {
-		'user_id': str(user_id),
+		'user_id': user_id,
 		'first_name': user_first_name if user_first_name else '',
 		'last_name': user_last_name if user_last_name else '',
 		'language': user_language,
@@ -88,35 +148,220 @@ def register_user_start(start_message):
 		'start_time': start_date,
 	}
 
-	# Load existing history or create empty dict if file doesn't exist
-	history = {'EN': [], 'TR': []}
-	if os.path.exists(history_file):
-		with open(history_file, 'r', encoding='utf-8') as f:
-			history = json.load(f)
+	if Config.get_storage() == Storage.SQLITE:
+		SqliteStore.get_instance().register_user(get_locale(), new_user)
+	else:
+		UserHistory.get_instance(get_locale()).register(new_user)
+
+
+def is_user_registered(user_id):
+	"""
+	Check if a user is registered in the history of the current locale.
+
+	Args:
+	    user_id: The ID of the user to check
+
+	Returns:
+	    bool: True if the user is registered, False otherwise
+	"""
+	if Config.get_storage() == Storage.SQLITE:
+		return SqliteStore.get_instance().is_user_registered(get_locale(), user_id)
+	return UserHistory.get_instance(get_locale()).is_registered(user_id)
+
 
-	# Add new user if not already present in either locale
-	if len(history[locale]) == 0 or not any(
-		entry['user_id'] == str(user_id) for entry in history[locale]
-	):
-		# Add to the appropriate locale
-		history[locale].append(new_user)
+def get_user_history():
+	"""
+	Get the registration history of the current locale.
+
+	Returns:
+	    list: List of user history entries for the current locale
+	"""
+	if Config.get_storage() == Storage.SQLITE:
+		return SqliteStore.get_instance().get_user_history(get_locale())
+	return UserHistory.get_instance(get_locale()).get_entries()
+
+
+def get_audience_users(joined_within_days=None, language=None):
+	"""
+	Get the users of the current locale matching audience filters on their history entry.
+
+	The filters are looked up in the start time and language indexes of the history, without
+	scanning it. Users matching every given filter are returned.
+
+	Args:
+	    joined_within_days (int, optional): Only users who started the bot in the last this many
+	        days
+	    language (str, optional): Only users with this language code, e.g. 'tr'
+
+	Returns:
+	    set: The IDs of the matching users
+	"""
+	locale = get_locale()
+	if Config.get_storage() == Storage.SQLITE:
+		history = SqliteStore.get_instance()
+		get_users_started_between = partial(history.get_users_started_between, locale)
+		get_users_by_language = partial(history.get_users_by_language, locale)
+	else:
+		history = UserHistory.get_instance(locale)
+		get_users_started_between = history.get_users_started_between
+		get_users_by_language = history.get_users_by_language
+
+	audiences = []
+	if joined_within_days is not None:
+		# Start times are stored as ISO timestamps in UTC, as sent by Telegram
+		start = datetime.now(timezone.utc) - timedelta(days=joined_within_days)
+		audiences.append(set(get_users_started_between(start.isoformat())))
+	if language is not None:
+		audiences.append(set(get_users_by_language(language)))
+
+	if not audiences:
+		raise ValueError('At least one audience filter must be provided')
+	return set.intersection(*audiences)
+
+
+def get_language_counts():
+	"""
+	Get the number of users of the current locale per language.
 
-		# Write updated history back to file
-		with open(history_file, 'w', encoding='utf-8') as f:
-			json.dump(history, f, indent=4, ensure_ascii=False)
+	Returns:
+	    dict: Mapping of language codes to their number of users
+	"""
+	if Config.get_storage() == Storage.SQLITE:
+		return SqliteStore.get_instance().get_language_counts(get_locale())
+	return UserHistory.get_instance(get_locale()).get_language_counts()
+
+
+def is_user_unreachable(user_id):
+	"""
+	Check if a user of the current locale is flagged as unreachable.
+
+	Args:
+	    user_id: The ID of the user to check
+
+	Returns:
+	    bool: True if sending to the user failed permanently, False otherwise
+	"""
+	if Config.get_storage() == Storage.SQLITE:
+		return SqliteStore.get_instance().is_user_unreachable(get_locale(), user_id)
+	return UnreachableUsers.get_instance(get_locale()).is_unreachable(user_id)
+
+
+def get_unreachable_users():
+	"""
+	Get the users of the current locale who are flagged as unreachable.
+
+	Returns:
+	    dict: Mapping of user IDs to the 'reason' of the failed send and when it was 'flagged_at'
+	"""
+	if Config.get_storage() == Storage.SQLITE:
+		return SqliteStore.get_instance().get_unreachable_users(get_locale())
+	return UnreachableUsers.get_instance(get_locale()).get_all()
+
+
+def split_unreachable_users(user_ids):
+	"""
+	Split a list of recipients into the reachable and the unreachable users.
+
+	Args:
+	    user_ids: The IDs of the recipients
+
+	Returns:
+	    tuple: The list of reachable user IDs and the list of unreachable user IDs, in their
+	        original order
+	"""
+	reachable, unreachable = [], []
+	for user_id in user_ids:
+		(unreachable if is_user_unreachable(user_id) else reachable).append(user_id)
+	return reachable, unreachable
+
+
+def record_delivery_failure(user_id, e):
+	"""
+	Record a failed send to a user, flagging them as unreachable if the failure is permanent.
+
+	Args:
+	    user_id: The ID of the user the send failed for
+	    e (Exception): The error of the send
+
+	Returns:
+	    bool: True if the user was flagged, False otherwise
+	"""
+	if not is_permanent_failure(e):
+		return False
+
+	if Config.get_storage() == Storage.SQLITE:
+		return SqliteStore.get_instance().flag_unreachable(get_locale(), user_id, str(e))
+	return UnreachableUsers.get_instance(get_locale()).flag(user_id, str(e))
+
+
+def record_delivery_success(user_id):
+	"""
+	Record that a user was reached, clearing their unreachable flag if they had one.
+
+	Args:
+	    user_id: The ID of the user
+
+	Returns:
+	    bool: True if a flag was cleared, False otherwise
+	"""
+	# The flags are cached in memory, so reachable users are checked without touching the disk
+	if not is_user_unreachable(user_id):
+		return False
+
+	if Config.get_storage() == Storage.SQLITE:
+		return SqliteStore.get_instance().clear_unreachable(get_locale(), user_id)
+	return UnreachableUsers.get_instance(get_locale()).clear(user_id)
+
+
+def get_store():
+	"""
+	Get the storage backend selected at startup with the --storage argument.
+
+	Returns:
+	    CategoryStore, JournaledCategoryStore or SqliteStore: The process-wide store
+	"""
+	if Config.get_storage() == Storage.SQLITE:
+		return SqliteStore.get_instance()
+	if Config.get_storage() == Storage.JOURNAL:
+		return JournaledCategoryStore.get_instance()
+	return CategoryStore.get_instance()
+
+
+def shutdown_storage():
+	"""
+	Write any pending changes and close the storage backend.
+	"""
+	CategoryStore.shutdown()
+	JournaledCategoryStore.shutdown()
+	SqliteStore.shutdown()
+	UserHistory.shutdown()
+	UnreachableUsers.shutdown()
+
+
+@contextmanager
+def read_categories():
+	"""
+	Context manager for reading the categories of the current locale from the storage backend.
+
+	The store is locked while the block runs, so the categories aren't changed by a mutation on
+	another thread while they are read.
+
+	Yields:
+	    LocaleCategories or SqliteLocaleCategories: The categories and membership indexes for the current locale
+	"""
+	with get_store().read(get_locale()) as categories:
+		yield categories
 
 
 def get_user_lists():
 	"""
-	Load and return the full user lists from the JSON file.
+	Return the full user lists for the current locale.
 
 	Returns:
 	    dict: Dictionary containing all user lists and their metadata for the current locale
 	"""
-	with open('data/user_lists.json', 'r') as f:
-		user_lists = json.load(f)
-
-	return user_lists[locale]
+	with read_categories() as categories:
+		return categories.to_dict()
 
 
 def get_category_id_list():
@@ -126,11 +371,8 @@ def get_category_id_list():
 	Returns:
 	    list: List of tuples (category_id, label) for all categories
 	"""
-	user_lists = get_user_lists()
-	return [
-		(category_id, user_lists[category_id]['label'])
-		for category_id in user_lists.keys()
-	]
+	with read_categories() as categories:
+		return categories.get_category_id_list()
 
 
 def get_categories_for_user(user_id):
@@ -143,12 +385,8 @@ def get_categories_for_user(user_id):
 	Returns:
 	    list: List of category labels the user belongs to
 	"""
-	user_lists = get_user_lists()
-	return [
-		category['label']
-		for category in user_lists.values()
-		if user_id in category['users']
-	]
+	with read_categories() as categories:
+		return categories.get_categories_for_user(user_id)
 
 
 def add_user_to_category(user_id, category_id=None, category_label=None):
@@ -172,49 +410,13 @@ def add_user_to_category(user_id, category_id=None, category_label=None):
 	Raises:
 	    ValueError: If neither category_id nor category_label is provided
 	"""
-	with open('data/user_lists.json', 'r') as f:
-		user_lists = json.load(f)
-
-	# If category_id is provided, use it to find the category
-	if category_id is not None:
-		category = user_lists[locale].get(str(category_id))
-		target_category_id = str(category_id)
-
-	# If category_label is provided, find or create the category with that label
-	elif category_label is not None:
-		# Find the category with the given label
-		category_id_found = None
-		for cat_id, cat in user_lists[locale].items():
-			if cat['label'] == category_label:
-				category = cat
-				category_id_found = cat_id
-				break
-
-		# If no category with the given label exists, create a new one
-		if category_id_found is None:
-			new_category_id = str(len(user_lists[locale]))
-			user_lists[locale][new_category_id] = {'label': category_label, 'users': []}
-			category = user_lists[locale][new_category_id]
-			target_category_id = new_category_id
-		else:
-			target_category_id = category_id_found
-
-	else:
-		raise ValueError('Either category_id or category_label must be provided')
-
-	# Only add if user isn't already in the category
-	if user_id not in category['users']:
-		category['users'].append(user_id)
+	# Joining by label is how promo codes add users to their category
+	action = 'add' if category_label is None else 'promo_code_join'
 
-		# If adding to a non-INTERESTED category, remove from INTERESTED
-		if target_category_id != '0':
-			# Remove from INTERESTED category if present
-			interested_category = user_lists[locale].get('0')
-			if interested_category and user_id in interested_category['users']:
-				interested_category['users'].remove(user_id)
-
-	with open('data/user_lists.json', 'w') as f:
-		json.dump(user_lists, f, indent=4)
+	with get_store().mutate(get_locale(), action) as categories:
+		categories.add_user(
+			user_id, category_id=category_id, category_label=category_label
+		)
 
 
 def remove_user_from_category(user_id, category_id):
@@ -227,30 +429,8 @@ def remove_user_from_category(user_id, category_id):
 	    user_id: The ID of the user to remove
 	    category_id: The ID of the category to remove the user from
 	"""
-	with open('data/user_lists.json', 'r') as f:
-		user_lists = json.load(f)
-
-	# Only remove if user is in the category
-	if user_id in user_lists[locale][str(category_id)]['users']:
-		user_lists[locale][str(category_id)]['users'].remove(user_id)
-
-		# If we removed from a non-INTERESTED category, check if user should be added to INTERESTED
-		if str(category_id) != '0':
-			# Check if user is in any other non-INTERESTED category
-			in_other_category = False
-			for cat_id, cat in user_lists[locale].items():
-				if cat_id != '0' and user_id in cat['users']:
-					in_other_category = True
-					break
-
-			# If not in any other category, add to INTERESTED
-			if not in_other_category:
-				interested_category = user_lists[locale].get('0')
-				if interested_category and user_id not in interested_category['users']:
-					interested_category['users'].append(user_id)
-
-		with open('data/user_lists.json', 'w') as f:
-			json.dump(user_lists, f, indent=4)
+	with get_store().mutate(get_locale(), 'remove') as categories:
+		categories.remove_user(user_id, category_id)
 
 
 def get_category_label_by_id(category_id):
@@ -263,8 +443,8 @@ def get_category_label_by_id(category_id):
 	Returns:
 	    str: The label of the category
 	"""
-	user_lists = get_user_lists()
-	return user_lists[category_id]['label']
+	with read_categories() as categories:
+		return categories.get_category_label(category_id)
 
 
 def get_users_by_category_id(category_id):
@@ -277,25 +457,107 @@ def get_users_by_category_id(category_id):
 	Returns:
 	    list: List of user IDs in the category
 	"""
-	user_lists = get_user_lists()
-	return user_lists[category_id]['users']
+	with read_categories() as categories:
+		return categories.get_users(category_id)
+
+
+def get_segment_users(category_id, steps=()):
+	"""
+	Get the users of a segment combining categories with set operations.
+
+	Every user is in the result once, even if they are in several of the combined categories.
+
+	Args:
+	    category_id: The ID of the category the segment starts from
+	    steps: (operator, category_id) pairs applied left to right, the operator being one of
+	        SEGMENT_OPERATORS
+
+	Returns:
+	    list: List of user IDs in the segment
+	"""
+	with read_categories() as categories:
+		return categories.get_segment_users(category_id, steps)
+
+
+def get_segment_recipients(category_id, steps=(), audience=None):
+	"""
+	Get the users of a segment who match its audience filters.
+
+	Args:
+	    category_id: The ID of the category the segment starts from
+	    steps: (operator, category_id) pairs applied left to right
+	    audience (dict, optional): Keyword arguments for get_audience_users, e.g. {'language': 'tr'}
+
+	Returns:
+	    list: List of user IDs in the segment, each of them once
+	"""
+	users_in_segment = get_segment_users(category_id, steps)
+
+	if audience:
+		# The filters are looked up in the history indexes, then applied to the segment
+		audience_users = get_audience_users(**audience)
+		users_in_segment = [
+			user_id for user_id in users_in_segment if user_id in audience_users
+		]
+
+	return users_in_segment
+
+
+def describe_segment(category_id, steps=()):
+	"""
+	Describe a segment with the labels of its categories, e.g. 'VIP ∪ PROMO_X − OLDVIP'.
+
+	Args:
+	    category_id: The ID of the category the segment starts from
+	    steps: (operator, category_id) pairs applied left to right
+
+	Returns:
+	    str: The description of the segment
+	"""
+	with read_categories() as categories:
+		description = categories.get_category_label(category_id)
+		for operator, step_category_id in steps:
+			description += (
+				f' {SEGMENT_SYMBOLS[operator]} {categories.get_category_label(step_category_id)}'
+			)
+	return description
+
+
+def get_category_version(category_id):
+	"""
+	Get the version of a category of the current locale, for optimistic mutations.
+
+	Args:
+	    category_id: The ID of the category
+
+	Returns:
+	    int: The version, incremented by every change of the category or its members
+	"""
+	return get_store().get_version(get_locale(), category_id)
 
 
-def set_category_user_list(category_id, user_list):
+def set_category_user_list(category_id, user_list, expected_version=None):
 	"""
 	Replace the entire user list for a category.
 
 	Args:
 	    category_id: The ID of the category to update
 	    user_list: The new list of users
-	"""
-	with open('data/user_lists.json', 'r') as f:
-		user_lists = json.load(f)
+	    expected_version (int, optional): Only replace the list if the category is still at
+	        this version, as returned by get_category_version()
+
+	Returns:
+	    dict: The number of users 'added', 'already_present' and 'removed'
 
-	user_lists[locale][category_id]['users'] = user_list
+	Raises:
+	    StaleVersionError: If the category changed since the expected version
+	"""
+	expected_versions = None
+	if expected_version is not None:
+		expected_versions = {category_id: expected_version}
 
-	with open('data/user_lists.json', 'w') as f:
-		json.dump(user_lists, f, indent=4)
+	with get_store().mutate(get_locale(), 'set', expected_versions) as categories:
+		return categories.set_users(category_id, user_list)
 
 
 def add_user_list_to_category(category_id, user_list):
@@ -306,56 +568,57 @@ def add_user_list_to_category(category_id, user_list):
 	Args:
 	    category_id: The ID of the category to add users to
 	    user_list: List of user IDs to add
-	"""
-	with open('data/user_lists.json', 'r') as f:
-		user_lists = json.load(f)
-
-	# Add each user if they're not already in the category
-	for user in user_list:
-		if user not in user_lists[locale][category_id]['users']:
-			user_lists[locale][category_id]['users'].append(user)
-
-		# If the user is in INTERESTED, remove them
-		if user in user_lists[locale]['0']['users']:
-			user_lists[locale]['0']['users'].remove(user)
 
-	with open('data/user_lists.json', 'w') as f:
-		json.dump(user_lists, f, indent=4)
+	Returns:
+	    dict: The number of users 'added', 'already_present' and 'moved_out_of_interested'
+	"""
+	with get_store().mutate(get_locale(), 'add_list') as categories:
+		return categories.add_users(category_id, user_list)
 
 
 def remove_user_list_from_category(category_id, user_list):
 	"""
-	Remove multiple users from a category.
+	Remove multiple users from a category. Users left without any other category are moved
+	back to INTERESTED.
 
 	Args:
 	    category_id: The ID of the category to remove users from
 	    user_list: List of user IDs to remove
+
+	Returns:
+	    dict: The number of users 'removed', 'not_present' and 'moved_to_interested'
 	"""
-	with open('data/user_lists.json', 'r') as f:
-		user_lists = json.load(f)
+	with get_store().mutate(get_locale(), 'remove_list') as categories:
+		return categories.remove_users(category_id, user_list)
 
-	# Remove each user if they're in the category
-	for user in user_list:
-		if user in user_lists[locale][category_id]['users']:
-			user_lists[locale][category_id]['users'].remove(user)
 
-			# If we removed from a non-INTERESTED category, check if user should be added to INTERESTED
-			if category_id != '0':
-				# Check if user is in any other non-INTERESTED category
-				in_other_category = False
-				for cat_id, cat in user_lists[locale].items():
-					if cat_id != '0' and user in cat['users']:
-						in_other_category = True
-						break
+ADMINS_FILE = 'data/admins.json'
 
-				# If not in any other category, add to INTERESTED
-				if not in_other_category:
-					interested_category = user_lists[locale].get('0')
-					if interested_category and user not in interested_category['users']:
-						interested_category['users'].append(user)
 
-	with open('data/user_lists.json', 'w') as f:
-		json.dump(user_lists, f, indent=4)
+def _build_admin_sets(admins):
+	return {
+		admin_locale: frozenset(admin_ids) for admin_locale, admin_ids in admins.items()
+	}
+
+
+def get_admins():
+	"""
+	Get the admins of the current locale.
+
+	The set is built once from data/admins.json and rebuilt only when the file changes.
+
+	Returns:
+	    frozenset: The IDs of the admins of the current locale
+	"""
+	return load_json_derived(ADMINS_FILE, _build_admin_sets)[get_locale()]
+
+
+def invalidate_admins():
+	"""
+	Drop the cached admin sets, so the next admin check re-reads data/admins.json without
+	waiting for the --config-ttl check. Called when the bot receives SIGHUP.
+	"""
+	file_cache.invalidate(ADMINS_FILE)
 
 
 def is_user_admin(user_id):
@@ -368,9 +631,95 @@ def is_user_admin(user_id):
 	Returns:
 	    bool: True if user is an admin, False otherwise
 	"""
-	with open('data/admins.json', 'r') as f:
-		admins = json.load(f)
-	return user_id in admins[locale]
+	return user_id in get_admins()
+
+
+class UserContext:
+	"""
+	State of the user behind a single update.
+
+	Every property is resolved on first access and then kept for the rest of the update, so
+	handlers and decorators can read it repeatedly without looking it up again. The categories
+	are looked up in the store on the I/O threads, so they are awaited with get_categories().
+	Call invalidate() after changing the categories or registration of the user.
+	"""
+
+	def __init__(self, user_id):
+		self.user_id = user_id
+		self.locale = get_locale()
+		self._categories: Optional[frozenset] = None
+
+	@cached_property
+	def is_admin(self) -> bool:
+		return self.user_id in get_admins()
+
+	@cached_property
+	def is_registered(self) -> bool:
+		# Looked up in memory, the history is loaded on startup
+		return is_user_registered(str(self.user_id))
+
+	async def get_categories(self) -> frozenset:
+		"""
+		Get the labels of the categories the user is in.
+
+		Returns:
+		    frozenset: The category labels
+		"""
+		if self._categories is None:
+			# Imported here, since async_storage wraps the functions of this module on import
+			from utils import async_storage
+
+			self._categories = frozenset(
+				await async_storage.get_categories_for_user(str(self.user_id))
+			)
+		return self._categories
+
+	async def is_in_category(self, category_label) -> bool:
+		"""
+		Check if the user is in a category with the specified label.
+
+		Args:
+		    category_label (str): The label of the category to check
+
+		Returns:
+		    bool: True if the user is in the category, False otherwise
+		"""
+		return category_label in await self.get_categories()
+
+	async def is_in_non_interested_category(self) -> bool:
+		"""
+		Check if the user is in any category other than INTERESTED.
+
+		Returns:
+		    bool: True if the user is in any non-INTERESTED category, False otherwise
+		"""
+		# Derived from the categories, so they are only looked up once per update
+		return any(label != 'INTERESTED' for label in await self.get_categories())
+
+	def invalidate(self) -> None:
+		"""Drop the resolved categories and registration status, so they are looked up again."""
+		self._categories = None
+		self.__dict__.pop('is_registered', None)
+
+
+def get_user_context(update, context):
+	"""
+	Get the user context of an update, creating it on first use.
+
+	The user context is attached to the callback context, which lives for a single update.
+
+	Args:
+	    update: The Telegram update object
+	    context: The callback context object
+
+	Returns:
+	    UserContext: The user context of the update
+	"""
+	user_context = getattr(context, 'user_context', None)
+	if user_context is None:
+		user_context = UserContext(get_chat_id(update))
+		context.user_context = user_context
+	return user_context
 
 
 def admin_required(func):
@@ -384,9 +733,9 @@ def admin_required(func):
 	    wrapper: The wrapped function that checks admin status
 	"""
 
+	@wraps(func)
 	async def wrapper(update, context):
-		chat_id = get_chat_id(update)
-		if not is_user_admin(chat_id):
+		if not get_user_context(update, context).is_admin:
 			context.user_data.clear()
 			return ConversationHandler.END
 		return await func(update, context)
@@ -414,7 +763,35 @@ def get_chat_id(update):
 	return chat_id
 
 
-def get_user_panel_message_id(message_name, user_id=None):
+USER_PANEL_MESSAGE_IDS_FILE = 'data/user_panel_message_ids.json'
+
+
+def _build_message_routes(message_ids):
+	"""
+	Compile the user panel message IDs into a routing table.
+
+	Messages whose ID is a dictionary with a 'DEFAULT' key become a (routes, default) pair, where
+	routes maps each category label to its (rank, message ID). The rank is the position of the
+	label in the dictionary, so the first matching label in the file wins.
+	"""
+	routing_table = {}
+	for message_locale, messages in message_ids.items():
+		locale_routes = {}
+		for message_name, message_id_value in messages.items():
+			if isinstance(message_id_value, dict) and 'DEFAULT' in message_id_value:
+				routes = {
+					category_label: (rank, category_message_id)
+					for rank, (category_label, category_message_id) in enumerate(
+						message_id_value.items()
+					)
+					if category_label != 'DEFAULT'
+				}
+				locale_routes[message_name] = (routes, message_id_value['DEFAULT'])
+		routing_table[message_locale] = locale_routes
+	return routing_table
+
+
+def get_user_panel_message_id(message_name, user_id=None, user_categories=None):
 	"""
 	Get the message ID for a user panel message by name.
 
@@ -423,37 +800,39 @@ def get_user_panel_message_id(message_name, user_id=None):
 	and return the corresponding message ID. If the user is not in any of the specified categories,
 	the default message ID will be returned.
 
+	The category-specific entries are compiled into a routing table when the file is loaded, and
+	are resolved against the categories of the user in a single pass.
+
 	Args:
 	    message_name (str): The name of the message
 	    user_id (str, optional): The ID of the user requesting the message
+	    user_categories (optional): The category labels of the user, if already known, e.g. from
+	        the UserContext of the update
 
 	Returns:
 	    int or dict: The message ID or album info dictionary
 	"""
-	with open('data/user_panel_message_ids.json', 'r') as f:
-		message_ids = json.load(f)
+	locale = get_locale()
+	route = load_json_derived(USER_PANEL_MESSAGE_IDS_FILE, _build_message_routes)[
+		locale
+	].get(message_name)
 
-	message_id_value = message_ids[locale][message_name]
+	if route is None or (user_id is None and user_categories is None):
+		return load_json(USER_PANEL_MESSAGE_IDS_FILE)[locale][message_name]
 
-	# If the message ID is a dictionary with a DEFAULT key and user_id is provided,
-	# check if the user is in any of the categories specified in the dictionary
-	if (
-		isinstance(message_id_value, dict)
-		and 'DEFAULT' in message_id_value
-		and user_id is not None
-	):
-		# Check each category in the dictionary (except DEFAULT)
-		for category_label, category_message_id in message_id_value.items():
-			if category_label != 'DEFAULT' and is_user_in_category(
-				user_id, category_label
-			):
-				return category_message_id
+	if user_categories is None:
+		user_categories = get_categories_for_user(str(user_id))
 
-		# If the user is not in any of the specified categories, return the default message ID
-		return message_id_value['DEFAULT']
+	routes, default_message_id = route
+	best_route = None
+	for category_label in user_categories:
+		category_route = routes.get(category_label)
+		if category_route is not None and (
+			best_route is None or category_route[0] < best_route[0]
+		):
+			best_route = category_route
 
-	# Otherwise, return the message ID as is
-	return message_id_value
+	return best_route[1] if best_route is not None else default_message_id
 
 
 def get_update_type(update):
@@ -480,10 +859,9 @@ def get_message_labels():
 	Returns:
 	    dict: Dictionary containing all message labels
 	"""
-	with open('data/user_panel_message_ids.json', 'r') as f:
-		message_ids = json.load(f)
+	message_ids = load_json('data/user_panel_message_ids.json')
 
-	return message_ids[locale]
+	return message_ids[get_locale()]
 
 
 def is_valid_promo_code(promo_code: str) -> bool:
@@ -496,10 +874,12 @@ def is_valid_promo_code(promo_code: str) -> bool:
 	Returns:
 	    bool: True if the promo code is valid, False otherwise
 	"""
+	if Config.get_storage() == Storage.SQLITE:
+		return SqliteStore.get_instance().is_valid_promo_code(promo_code)
+
 	try:
-		with open('data/promo_codes.json', 'r') as f:
-			valid_promo_codes = json.load(f)
-			return promo_code in valid_promo_codes
+		valid_promo_codes = load_json('data/promo_codes.json')
+		return promo_code in valid_promo_codes
 
 	except FileNotFoundError:
 		# If the promo codes file does not exist, return False
@@ -513,15 +893,14 @@ def is_valid_promo_code(promo_code: str) -> bool:
 def get_sample_signals_data():
 	"""
 	Load and return the sample signals data from the JSON file.
-	This function should be called each time the data is needed to ensure it's always up-to-date.
+	The file is cached and re-read when it changes, so edits apply without a restart.
 
 	Returns:
 	    dict: Dictionary containing sample signals data for the current locale
 	"""
-	with open('data/sample_signals.json', 'r', encoding='utf-8') as f:
-		sample_signals = json.load(f)
+	sample_signals = load_json('data/sample_signals.json')
 
-	return sample_signals[locale]
+	return sample_signals[get_locale()]
 
 
 def get_signals_for_type(signal_type: str) -> list:
@@ -542,6 +921,11 @@ def get_signals_for_type(signal_type: str) -> list:
 	return signals
 
 
+def _get_user_interactions_logger() -> logging.Logger:
+	# Written to the file by the log pipeline, see utils/log_pipeline.py
+	return logging.getLogger(get_user_interactions_logger_name(get_locale()))
+
+
 def handle_telegram_errors(func):
 	"""
 	Decorator that handles common Telegram errors and cleans up user data.
@@ -587,7 +971,10 @@ def handle_telegram_errors(func):
 def log_user_panel_errors(func):
 	"""
 	Decorator that logs errors occurring in user panel functions using the logger module.
-	Logs are written to logs/user_panel_errors.log
+	Logs are written to logs/user_panel_errors_<locale>.log
+
+	The outcome is also recorded against the user: a user who blocked the bot is flagged as
+	unreachable, and a flagged user who was answered successfully is unflagged.
 
 	Args:
 	    func: The async function to wrap with error logging
@@ -595,26 +982,29 @@ def log_user_panel_errors(func):
 	Returns:
 	    wrapper: The wrapped function with error logging
 	"""
-	logger = logging.getLogger(locale)
-
-	# Create logs directory if it doesn't exist
-	os.makedirs('logs', exist_ok=True)
-
-	# Configure file handler
-	file_handler = logging.FileHandler(f'logs/user_panel_errors_{locale}.log')
-	file_handler.setFormatter(
-		logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-	)
-	logger.addHandler(file_handler)
 
 	@wraps(func)
 	async def wrapper(update: Update, context: CallbackContext, *args, **kwargs):
+		# Imported here, since async_storage wraps the functions of this module on import
+		from utils import async_storage
+
 		try:
-			return await func(update, context, *args, **kwargs)
+			result = await func(update, context, *args, **kwargs)
 		except Exception as e:
+			# Only permanent failures are written, on the I/O threads, so other errors don't
+			# touch the disk
+			if is_permanent_failure(e):
+				await async_storage.record_delivery_failure(update.effective_user.id, e)
+			logger = logging.getLogger(get_user_panel_errors_logger_name(get_locale()))
 			logger.error(
 				f'User panel error occurred in {func.__name__} for user {update.effective_user.id}: {str(e)}'
 			)
+			return None
+
+		# Only flagged users are written, so this is an in-memory check for everyone else
+		if is_user_unreachable(update.effective_user.id):
+			await async_storage.record_delivery_success(update.effective_user.id)
+		return result
 
 	return wrapper
 
@@ -630,23 +1020,8 @@ def is_user_in_category(user_id, category_label):
 	Returns:
 	    bool: True if the user is in the category, False otherwise
 	"""
-	user_id = str(user_id)
-
-	with open('data/user_lists.json', 'r') as f:
-		user_lists = json.load(f)
-
-	# Find the category with the given label
-	category = next(
-		(cat for cat in user_lists[locale].values() if cat['label'] == category_label),
-		None,
-	)
-
-	# If the category doesn't exist, the user is not in it
-	if category is None:
-		return False
-
-	# Check if the user is in the category
-	return user_id in category['users']
+	with read_categories() as categories:
+		return categories.is_user_in_category(str(user_id), category_label)
 
 
 def is_user_in_non_interested_category(user_id):
@@ -659,42 +1034,21 @@ def is_user_in_non_interested_category(user_id):
 	Returns:
 	    bool: True if the user is in any non-INTERESTED category, False otherwise
 	"""
-	with open('data/user_lists.json', 'r') as f:
-		user_lists = json.load(f)
-
-	# Check if user is in any category other than INTERESTED (category_id='0')
-	for category_id, category in user_lists[locale].items():
-		if category_id != '0' and str(user_id) in category['users']:
-			return True
-	return False
+	with read_categories() as categories:
+		return categories.is_user_in_non_interested_category(str(user_id))
 
 
 def log_user_interaction(func):
 	"""
 	Decorator that logs user interactions to logs/user_interactions_<locale>.log
 	"""
-	logger = logging.getLogger(f'user_interactions_{locale}')
-
-	# Create logs directory if it doesn't exist
-	os.makedirs('logs', exist_ok=True)
-
-	# Configure file handler if not already added
-	log_file = f'logs/user_interactions_{locale}.log'
-	if not any(
-		isinstance(h, logging.FileHandler)
-		and h.baseFilename == os.path.abspath(log_file)
-		for h in logger.handlers
-	):
-		file_handler = logging.FileHandler(log_file)
-		file_handler.setFormatter(logging.Formatter('%(message)s'))
-		logger.addHandler(file_handler)
 
 	@wraps(func)
 	async def wrapper(update, context, *args, **kwargs):
 		user = update.effective_user
 		user_id = user.id if user else 'unknown'
 		username = user.username if user and user.username else 'unknown'
-		logger.info(
+		_get_user_interactions_logger().info(
 			f'{datetime.now().isoformat()} | {func.__name__} | user_id={user_id} | username={username}'
 		)
 		return await func(update, context, *args, **kwargs)
@@ -707,25 +1061,9 @@ def log_user_action_detail(update, action):
 	Log detailed user action (button/section/etc.) with time, function, user info, and action.
 	Logs are appended to logs/user_interactions_<locale>.log (not overwritten on restart).
 	"""
-	logger = logging.getLogger(f'user_interactions_{locale}')
-
-	# Create logs directory if it doesn't exist
-	os.makedirs('logs', exist_ok=True)
-
-	# Configure file handler if not already added
-	log_file = f'logs/user_interactions_{locale}.log'
-	if not any(
-		isinstance(h, logging.FileHandler)
-		and h.baseFilename == os.path.abspath(log_file)
-		for h in logger.handlers
-	):
-		file_handler = logging.FileHandler(log_file)
-		file_handler.setFormatter(logging.Formatter('%(message)s'))
-		logger.addHandler(file_handler)
-
 	user = update.effective_user
 	user_id = user.id if user else 'unknown'
 	username = user.username if user and user.username else 'unknown'
-	logger.info(
+	_get_user_interactions_logger().info(
 		f'{datetime.now().isoformat()} | action={action} | user_id={user_id} | username={username}'
 	)
@@ -0,0 +1,121 @@
+"""
+Webhook server for the bot.
+Receives the updates of the bots of every locale on a single port, at /webhook/<locale>, and
+puts them in the update queue of the bot. GET /health reports whether the bots are running, for
+load balancers and monitoring.
+"""
+
+import hmac
+import json
+import logging
+from http import HTTPStatus
+from typing import Dict, Optional
+
+import tornado.web
+from tornado.httpserver import HTTPServer
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+HEALTH_PATH = '/health'
+
+# Header Telegram sends the secret token in, set when registering the webhook
+SECRET_TOKEN_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+def get_webhook_path(locale: str) -> str:
+	"""
+	Get the path the updates of the bot of a locale are posted to.
+
+	Args:
+	    locale (str): The locale code, e.g. 'EN'
+
+	Returns:
+	    str: The path, e.g. '/webhook/EN'
+	"""
+	return f'/webhook/{locale}'
+
+
+class _UpdateHandler(tornado.web.RequestHandler):
+	def initialize(self, applications: Dict[str, Application], secret_token: str) -> None:
+		self.applications = applications
+		self.secret_token = secret_token
+
+	async def post(self, locale: str) -> None:
+		application = self.applications.get(locale)
+		if application is None:
+			raise tornado.web.HTTPError(HTTPStatus.NOT_FOUND)
+
+		secret_token = self.request.headers.get(SECRET_TOKEN_HEADER, '')
+		if not hmac.compare_digest(secret_token, self.secret_token):
+			logger.warning(f'Rejected an update for {locale} with a wrong secret token')
+			raise tornado.web.HTTPError(HTTPStatus.FORBIDDEN)
+
+		if not application.running:
+			# Telegram retries the update later, e.g. once the bot finished starting
+			raise tornado.web.HTTPError(HTTPStatus.SERVICE_UNAVAILABLE)
+
+		try:
+			update = Update.de_json(json.loads(self.request.body), application.bot)
+		except Exception as e:
+			logger.error(f'Could not parse an update for {locale}: {e}')
+			raise tornado.web.HTTPError(HTTPStatus.BAD_REQUEST) from e
+
+		# Processed by the bot like a polled update, in its own locale
+		await application.update_queue.put(update)
+
+
+class _HealthHandler(tornado.web.RequestHandler):
+	def initialize(self, applications: Dict[str, Application]) -> None:
+		self.applications = applications
+
+	def get(self) -> None:
+		bots = {
+			locale: application.running for locale, application in self.applications.items()
+		}
+		healthy = all(bots.values())
+		self.set_status(HTTPStatus.OK if healthy else HTTPStatus.SERVICE_UNAVAILABLE)
+		self.write({'status': 'ok' if healthy else 'unavailable', 'bots': bots})
+
+
+class WebhookServer:
+	"""
+	HTTP server receiving the updates of the bots from Telegram.
+
+	Updates are only accepted with the secret token the webhooks were registered with, so
+	nobody else can post updates to the bots.
+	"""
+
+	def __init__(self, applications: Dict[str, Application], secret_token: str, port: int):
+		"""
+		Args:
+		    applications (dict): The applications of the bots by locale code
+		    secret_token (str): The secret token the webhooks are registered with
+		    port (int): The port to listen on
+		"""
+		self.port = port
+		self._app = tornado.web.Application(
+			[
+				(
+					get_webhook_path(r'(\w+)'),
+					_UpdateHandler,
+					{'applications': applications, 'secret_token': secret_token},
+				),
+				(HEALTH_PATH, _HealthHandler, {'applications': applications}),
+			]
+		)
+		self._server: Optional[HTTPServer] = None
+
+	def start(self) -> None:
+		"""Start listening on all interfaces."""
+		self._server = HTTPServer(self._app)
+		self._server.listen(self.port)
+		logger.info(f'Webhook server listening on port {self.port}')
+
+	async def stop(self) -> None:
+		"""Stop accepting connections and close the open ones."""
+		if self._server is not None:
+			self._server.stop()
+			await self._server.close_all_connections()
+			self._server = None